@@ -6,6 +6,7 @@ from configs import Config
 from application.extensions import db, migrate, security, cors, jwt, ma, cache
 from application.blueprints import create_all_api_resource_blueprint
 from application.core.models import User, Role
+from application.instrumentation import init_sql_instrumentation
 from .routes import home_bp
 from .errors import error_bp
 
@@ -39,7 +40,10 @@ def create_app(main_file: str, config_obj: Config) -> Flask:
 
     with app.app_context():
         import application.commands
+        import application.benchmarks
         import application.models
+        import application.stats
+        init_sql_instrumentation(app, db.engine)
         db.create_all()
 
 
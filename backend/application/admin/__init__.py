@@ -1,13 +1,15 @@
 from flask import Blueprint
 from flask_restful import Api
+from application.representations import register_json_representation
 
 admin = Blueprint('admin', __name__)
 
 
-from .resources import AdminCategoryListAPI, AdminCategoryAPI, AdminServiceListAPI, AdminServiceMgmtAPI, AdminProviderListAPI, AdminProviderMgmtAPI, AdminCustomerMgmtAPI, AdminCustomerListAPI, AdminPaymentsListAPI
+from .resources import AdminCategoryListAPI, AdminCategoryAPI, AdminServiceListAPI, AdminServiceMgmtAPI, AdminProviderListAPI, AdminProviderMgmtAPI, AdminCustomerMgmtAPI, AdminCustomerListAPI, AdminPaymentsListAPI, AdminCacheStatsAPI
 
 
 api = Api(admin)
+register_json_representation(api)
 
 api.add_resource(AdminCategoryListAPI, '/categories')
 api.add_resource(AdminCategoryAPI, '/categories/<int:cat_id>')
@@ -22,4 +24,7 @@ api.add_resource(AdminCustomerListAPI, '/customers')
 api.add_resource(AdminCustomerMgmtAPI, '/customers/<int:cust_id>')
 
 
-api.add_resource(AdminPaymentsListAPI, '/payments')
\ No newline at end of file
+api.add_resource(AdminPaymentsListAPI, '/payments')
+
+
+api.add_resource(AdminCacheStatsAPI, '/cache-stats')
\ No newline at end of file
@@ -36,4 +36,17 @@ class Category(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.now)
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
 
-    providers = db.relationship('Provider', back_populates='category', lazy='dynamic')
\ No newline at end of file
+    providers = db.relationship('Provider', back_populates='category', lazy='dynamic')
+    stats = db.relationship('CategoryStats', uselist=False, viewonly=True)
+
+
+class CategoryStats(db.Model):
+    __tablename__ = 'category_stats'
+
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.id', name='fk__category_stats__categories__category_id'), primary_key=True)
+    active_providers = db.Column(db.Integer, nullable=False, default=0)
+    active_services = db.Column(db.Integer, nullable=False, default=0)  # active services of active providers
+    total_bookings = db.Column(db.Integer, nullable=False, default=0)   # active or completed bookings
+    total_revenue = db.Column(db.Integer, nullable=False, default=0)    # final admin amount of paid payments
+
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
\ No newline at end of file
@@ -1,5 +1,6 @@
 from flask_restful.reqparse import RequestParser
 from application.enums import UserStatusEnum, ProviderServiceStatusEnum
+from application.serializers import parse_fields
 
 
 
@@ -12,6 +13,7 @@ admin_service_query_args_parser.add_argument(
     help='status should not be allowed to take other choices', 
     default=ProviderServiceStatusEnum.APPROVE.value
 )
+admin_service_query_args_parser.add_argument('fields', type=parse_fields, location='args')
 
 
 
@@ -23,4 +25,5 @@ admin_provider_query_args_parser.add_argument(
     choices=[UserStatusEnum.APPROVE.value, UserStatusEnum.PENDING.value, UserStatusEnum.BLOCK.value], 
     help='status should not be allowed to take other choices', 
     default=UserStatusEnum.APPROVE.value
-)
\ No newline at end of file
+)
+admin_provider_query_args_parser.add_argument('fields', type=parse_fields, location='args')
@@ -5,19 +5,29 @@ from marshmallow import ValidationError
 from sqlalchemy.exc import SQLAlchemyError
 import time
 from datetime import datetime
-from application.extensions import db
-from .models import Admin, Category
+from application.extensions import db, cache
+from .models import Admin, Category, CategoryStats
 from application.customers.models import Booking, Customer, Payment
 from application.providers.models import Provider, Service
 
 from .schemas import CategorySchema, CreateCategorySchema
 from .parsers import admin_provider_query_args_parser, admin_service_query_args_parser
-from application.providers.schemas import ProviderSchema, ServiceSchema
-from application.customers.schemas import PaymentSchema
+from application.providers.schemas import ProviderSchema, ServiceSchema, provider_load_options, service_load_options
+from application.customers.schemas import PaymentSchema, payment_load_options
 
 from application.enums import BookingStatusEnum, ProviderServiceStatusEnum, UserRoleEnum, UserStatusEnum, PaymentStatusEnum
-from application.utils import error_response, success_response
+from application.utils import error_response, success_response, keyset_paginate, keyset_response_data, parse_bool
 from application.decorators import role_required
+from application.serializers import get_schema, get_row_serializer, dump_rows, parse_fields, schema_fields, requested_extras
+from application.caching import invalidate_category, invalidate_service, invalidate_provider
+from application.identity import invalidate_identity
+
+
+category_rows = get_row_serializer(CategorySchema, exclude=['providers', 'short_description', 'long_description'])
+category_schema = get_schema(CategorySchema, exclude=['providers'])
+service_schema = get_schema(ServiceSchema)
+provider_schema = get_schema(ProviderSchema, exclude=['services'])
+payment_schema = get_schema(PaymentSchema)
 
 
 class AdminCategoryListAPI(Resource):
@@ -27,50 +37,27 @@ class AdminCategoryListAPI(Resource):
     def get(self):
         page = request.args.get('page', default=1, type=int)
         per_page = current_app.config.get('ITEMS_PER_PAGE', 6)
+        fields = parse_fields(request.args.get('fields'))
 
         try:
+            rows = category_rows
+            if fields is not None:
+                only = schema_fields(fields, 'active_providers', 'active_services', 'total_bookings')
+                rows = get_row_serializer(CategorySchema, exclude=['providers', 'short_description', 'long_description'], only=only)
+
             paginated_data = (
                 db.session.query(
-                    Category,
-                    db.func.coalesce(
-                        db.func.count(
-                            db.distinct(
-                                db.case((db.and_(Provider.is_approved==True, Provider.is_blocked==False), Provider.id))
-                            )
-                        ), 0
-                    ).label('active_providers'),
-                    db.func.coalesce(
-                        db.func.count(
-                            db.distinct(
-                                db.case((db.and_(Service.is_approved==True, Service.is_blocked==False, Service.is_active==True, Provider.is_approved==True, Provider.is_blocked==False), Service.id))
-                            )
-                        ), 0
-                    ).label('active_services'),
-                    db.func.coalesce(
-                        db.func.count(
-                            db.distinct(
-                                db.case((Booking.status.in_([BookingStatusEnum.ACTIVE.value, BookingStatusEnum.COMPLETE.value]), Booking.id))
-                            )
-                        ), 0
-                    ).label('total_bookings'),
+                    *rows.columns,
+                    db.func.coalesce(CategoryStats.active_providers, 0).label('active_providers'),
+                    db.func.coalesce(CategoryStats.active_services, 0).label('active_services'),
+                    db.func.coalesce(CategoryStats.total_bookings, 0).label('total_bookings'),
                 )
-                .outerjoin(Provider, Category.providers)
-                .outerjoin(Service, Provider.services)
-                .outerjoin(Booking, Service.bookings)
-                .group_by(Category.id)
+                .outerjoin(CategoryStats, Category.stats)
                 .order_by(Category.created_at.desc())
                 .paginate(page=page, per_page=per_page, error_out=False)
             )
             
-            schema = CategorySchema(exclude=['providers', 'short_description', 'long_description'])
-            categories = []
-            
-            for category_obj, active_providers, active_services, total_bookings in paginated_data:
-                category = schema.dump(category_obj)
-                category['active_providers'] = active_providers
-                category['active_services'] = active_services
-                category['total_bookings'] = total_bookings
-                categories.append(category)
+            categories = rows.dump(paginated_data, *requested_extras(fields, 'active_providers', 'active_services', 'total_bookings'))
             
             data = {
                 'no_of_categories': paginated_data.total,
@@ -82,6 +69,8 @@ class AdminCategoryListAPI(Resource):
 
             return success_response(data=data)
 
+        except ValueError as e:
+            return error_response(str(e), status_code=400)
         except SQLAlchemyError as e:
             return error_response('Something went wrong while fetching categories')
         except Exception as e:
@@ -122,6 +111,7 @@ class AdminCategoryListAPI(Resource):
             admin.categories.append(new_category)
             db.session.add(new_category)
             db.session.commit()
+            invalidate_category(new_category.id)
             time.sleep(5)
             return success_response(status_code=201)
         except ValidationError as e:
@@ -144,38 +134,12 @@ class AdminCategoryAPI(Resource):
             category, *stats = (
                 db.session.query(
                     Category,
-                    db.func.coalesce(
-                        db.func.count(
-                            db.distinct(
-                                db.case((db.and_(Provider.is_approved==True, Provider.is_blocked==False), Provider.id))
-                            )
-                        ), 0
-                    ).label('active_providers'),
-                    db.func.coalesce(
-                        db.func.count(
-                            db.distinct(
-                                db.case((db.and_(Service.is_approved==True, Service.is_blocked==False, Service.is_active, Provider.is_approved==True, Provider.is_blocked==False), Service.id))
-                            )
-                        ), 0
-                    ).label('active_services'),
-                    db.func.coalesce(
-                        db.func.count(
-                            db.distinct(
-                                db.case((Booking.status.in_([BookingStatusEnum.ACTIVE.value, BookingStatusEnum.COMPLETE.value]), Booking.id))
-                            )
-                        ), 0
-                    ).label('total_bookings'),  
-                    db.func.coalesce(
-                        db.func.sum(
-                            db.case((Payment.status.is_(PaymentStatusEnum.PAID.value), Payment.final_admin_amount))
-                        ), 0
-                    ).label('total_revenue'),  
+                    db.func.coalesce(CategoryStats.active_providers, 0).label('active_providers'),
+                    db.func.coalesce(CategoryStats.active_services, 0).label('active_services'),
+                    db.func.coalesce(CategoryStats.total_bookings, 0).label('total_bookings'),
+                    db.func.coalesce(CategoryStats.total_revenue, 0).label('total_revenue'),
                 )
-                .outerjoin(Provider, Category.providers)
-                .outerjoin(Service, Provider.services)
-                .outerjoin(Booking, Service.bookings)
-                .outerjoin(Payment, Booking.payment)
-                .group_by(Category.id)
+                .outerjoin(CategoryStats, Category.stats)
                 .filter(Category.id == cat_id)
                 .first()
             )
@@ -183,8 +147,7 @@ class AdminCategoryAPI(Resource):
             if not category:
                 return error_response(f'Category not exist with id {cat_id}', status_code=400)
 
-            schema = CategorySchema(exclude=['providers'])
-            category = schema.dump(category)
+            category = category_schema.dump(category)
             category['active_providers'] = stats[0]
             category['active_services'] = stats[1]
             category['total_bookings'] = stats[2]
@@ -234,6 +197,7 @@ class AdminCategoryAPI(Resource):
             category.short_description = short_description 
 
             db.session.commit()
+            invalidate_category(category.id, include_services=True)
             time.sleep(5)
             return success_response(status_code=204)
         except ValidationError as err:
@@ -254,10 +218,12 @@ class AdminServiceListAPI(Resource):
         parsed_req_args = admin_service_query_args_parser.parse_args()
         page = parsed_req_args.get('page')
         status = parsed_req_args.get('status')
+        fields = parsed_req_args.get('fields')
         per_page = current_app.config.get('ITEMS_PER_PAGE', 6)
 
         try:
-            query = db.session.query(Service)
+            schema = get_schema(ServiceSchema, only=fields) if fields is not None else service_schema
+            query = db.session.query(Service).options(*service_load_options(only=fields))
 
             if status == ProviderServiceStatusEnum.APPROVE.value:
                 query = query.filter(Service.is_approved == True)
@@ -269,7 +235,6 @@ class AdminServiceListAPI(Resource):
                 page=page, per_page=per_page, error_out=False
             )
 
-            schema = ServiceSchema(exclude=[])
             services = schema.dump(paginated_data.items, many=True)
 
             data = {
@@ -282,6 +247,8 @@ class AdminServiceListAPI(Resource):
 
             return success_response(data=data)
 
+        except ValueError as e:
+            return error_response(str(e), status_code=400)
         except SQLAlchemyError as e:
             return error_response('Something went wrong while fetching services')
         except Exception as e:
@@ -314,6 +281,7 @@ class AdminServiceMgmtAPI(Resource):
                 service.is_blocked = False
 
             db.session.commit()
+            invalidate_service(service)
             return success_response(status_code=204)
         except SQLAlchemyError as e:
             return error_response('Something went wrong while updating status of service!!')
@@ -334,6 +302,7 @@ class AdminServiceMgmtAPI(Resource):
                 service.is_blocked = True
 
             db.session.commit()
+            invalidate_service(service)
             
             return success_response(status_code=204)
         except SQLAlchemyError as e:
@@ -351,21 +320,19 @@ class AdminProviderListAPI(Resource):
         parsed_req_args = admin_provider_query_args_parser.parse_args()
         page = parsed_req_args.get('page')
         status = parsed_req_args.get('status')
+        fields = parsed_req_args.get('fields')
         per_page = current_app.config.get('ITEMS_PER_PAGE', 6)
 
-        schema = ProviderSchema(exclude=['services'])
-        providers = []
-
         try:
+            only = schema_fields(fields, 'active_services', 'active_bookings')
+            schema = get_schema(ProviderSchema, exclude=['services'], only=only) if fields is not None else provider_schema
+
             if status == UserStatusEnum.PENDING.value:
                 paginated_data = (
-                    Provider.query.filter(Provider.is_approved.is_(False)).paginate(page=page, per_page=per_page, error_out=False)
+                    Provider.query.options(*provider_load_options(only=only)).filter(Provider.is_approved.is_(False)).paginate(page=page, per_page=per_page, error_out=False)
                 )
 
-                for provider_data in paginated_data:
-                    provider = schema.dump(provider_data)
-                    provider['category'] = provider.get('category').get('name')
-                    providers.append(provider)
+                providers = schema.dump(paginated_data.items, many=True)
             
             elif status == UserStatusEnum.APPROVE.value:
                 paginated_data = (
@@ -384,6 +351,7 @@ class AdminProviderListAPI(Resource):
                             )
                         ).label('active_bookings')
                     )
+                    .options(*provider_load_options(load=db.selectinload, only=only))
                     .filter(Provider.is_approved.is_(True)) 
                     .outerjoin(Service, Provider.services)
                     .outerjoin(Booking, Service.bookings)
@@ -392,12 +360,11 @@ class AdminProviderListAPI(Resource):
                     .paginate(page=page, per_page=per_page, error_out=False)
                 )
 
-                for provider_data, active_services, active_bookings in paginated_data:
-                    provider = schema.dump(provider_data)
+                providers = dump_rows(paginated_data, schema, *requested_extras(fields, 'active_services', 'active_bookings'))
+
+            for provider in providers:
+                if 'category' in provider:
                     provider['category'] = provider.get('category').get('name')
-                    provider['active_services'] = active_services
-                    provider['active_bookings'] = active_bookings
-                    providers.append(provider)
 
             data = {
                 'no_of_providers': paginated_data.total,
@@ -408,6 +375,8 @@ class AdminProviderListAPI(Resource):
             }
 
             return success_response(data=data)
+        except ValueError as e:
+            return error_response(str(e), status_code=400)
         except SQLAlchemyError as e:
             return error_response('Something went wrong while fetching providers')
         except Exception as e:
@@ -439,6 +408,8 @@ class AdminProviderMgmtAPI(Resource):
                 provider.is_blocked = False
 
             db.session.commit()
+            invalidate_provider(provider)
+            invalidate_identity(provider.user_id)
             return success_response(status_code=204)
         except SQLAlchemyError as e:
             return error_response('Something went wrong while updating status of provider!!')
@@ -459,6 +430,8 @@ class AdminProviderMgmtAPI(Resource):
                 provider.is_blocked = True
 
             db.session.commit()
+            invalidate_provider(provider)
+            invalidate_identity(provider.user_id)
             return success_response(status_code=204)
         except SQLAlchemyError as e:
             return error_response('Something went wrong while blocking provider!!')
@@ -535,6 +508,7 @@ class AdminCustomerMgmtAPI(Resource):
             if customer.is_blocked: 
                 customer.is_blocked = False
                 db.session.commit()
+                invalidate_identity(customer.user_id)
 
             return success_response(status_code=204)
         except SQLAlchemyError as e:
@@ -556,6 +530,7 @@ class AdminCustomerMgmtAPI(Resource):
             if not customer.is_blocked: 
                 customer.is_blocked = True
                 db.session.commit()
+                invalidate_identity(customer.user_id)
 
             return success_response(status_code=204)
         except SQLAlchemyError as e:
@@ -574,12 +549,22 @@ class AdminPaymentsListAPI(Resource):
         try:
             page = request.args.get('page', default=1, type=int)
             per_page = current_app.config.get('ITEMS_PER_PAGE', 6)
+            cursor = request.args.get('cursor')
+            with_total = request.args.get('with_total', default=False, type=parse_bool)
+            fields = parse_fields(request.args.get('fields'))
 
-            paginated = Payment.query.order_by(Payment.id.desc()).paginate(page=page, per_page=per_page, error_out=False)
+            schema = get_schema(PaymentSchema, only=fields) if fields is not None else payment_schema
+            query = Payment.query.options(*payment_load_options(only=fields))
 
-            schema = PaymentSchema(many=True)
+            if cursor is not None:
+                paginated = keyset_paginate(query, [Payment.id], cursor, per_page, with_total=with_total)
+            else:
+                paginated = query.order_by(Payment.id.desc()).paginate(page=page, per_page=per_page, error_out=False)
 
-            payments = schema.dump(paginated.items)
+            payments = schema.dump(paginated.items, many=True)
+
+            if cursor is not None:
+                return success_response(data=keyset_response_data(paginated, 'payments', payments, with_total))
 
             data = {
                 'no_of_payments': paginated.total,
@@ -590,8 +575,24 @@ class AdminPaymentsListAPI(Resource):
             }
 
             return success_response(data=data)
+        except ValueError as e:
+            return error_response(str(e), status_code=400)
         except SQLAlchemyError as e:
             return error_response('Something went wrong while fetching payments')
+        except Exception as e:
+            print(e)
+            return error_response('Somthing went wrong, please try again..')
+
+
+class AdminCacheStatsAPI(Resource):
+
+    @jwt_required()
+    @role_required(UserRoleEnum.ADMIN.value)
+    def get(self):
+        try:
+            backend = cache.cache
+            l1_stats = backend.l1_stats() if hasattr(backend, 'l1_stats') else {'enabled': False}
+            return success_response(data={'l1': l1_stats})
         except Exception as e:
             print(e)
             return error_response('Somthing went wrong, please try again..')
\ No newline at end of file
@@ -15,6 +15,8 @@ from application.extensions import db
 from application.auth.schemas import UserRegisterSchema, ProviderRegisterSchema, UserLoginSchema
 from application.enums import UserGenderEnum, UserRoleEnum
 from application.core.schemas import UserSchema
+from application.caching import invalidate_category
+from application.serializers import get_schema
 
 
 @auth.route('/login', methods=['POST'])
@@ -40,7 +42,7 @@ def login():
             access_token = create_access_token(identity=user)
             refresh_token = create_refresh_token(identity=user)
 
-            user_data = UserSchema().dump(user)
+            user_data = get_schema(UserSchema).dump(user)
 
             data = {
                 "user": user_data,
@@ -112,6 +114,9 @@ def register(role):
             new_user.provider = new_provider
             category_obj.providers.append(new_provider)
         db.session.commit()
+
+        if role == UserRoleEnum.PROVIDER.value:
+            invalidate_category(category_obj.id)
         time.sleep(3)
         return success_response(message='user registered successfully', status_code=201)
     except ValidationError as err:
@@ -0,0 +1,567 @@
+import gzip
+import json
+import os
+import random
+import smtplib
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import click
+import jinja2
+import sqlalchemy as sa
+from flask import current_app
+from sqlalchemy.orm import Session
+
+from application.extensions import db
+from application.core.models import User
+from application.admin.models import Admin, Category
+from application.providers.models import Provider, Service
+from application.customers.models import Booking, Customer, Payment, Review
+from application.providers.schemas import ServiceSchema, service_load_options
+from application.customers.schemas import BookingSchema, PaymentSchema, booking_load_options
+from application.serializers import get_schema, get_row_serializer, dump_rows
+from application.representations import dumps as compact_dumps
+from application.utils import format_report
+from application.exports import parquet_available, parquet_schema, write_csv_rows, write_parquet_rows
+from application.tasks import ADMIN_CLOSED_BOOKINGS_HEADER, ADMIN_CLOSED_BOOKINGS_TYPES, admin_closed_booking_row, admin_closed_booking_values
+from application.mail import SMTP_SERVER_HOST, SMTP_SERVER_PORT, SMTPConnectionPool, build_message
+from application.enums import BookingStatusEnum, PaymentStatusEnum
+
+
+# benchmarks run against a throw-away sqlite file so the configured database is never touched
+
+def _timed(fn, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+
+
+def _print_timings(label, p50, p95):
+    print(f'  {label:<40} p50 {p50:9.3f} ms   p95 {p95:9.3f} ms')
+
+
+def _create_bench_engine(db_file=None, force=False):
+    if not db_file:
+        fd, db_file = tempfile.mkstemp(prefix='bench_', suffix='.sqlite3')
+        os.close(fd)
+    elif os.path.exists(db_file) and not force:
+        # every table in it is dropped, it may well be the real database
+        raise click.ClickException(f'{db_file} already exists, pass --force to drop and reseed it')
+    engine = sa.create_engine(f'sqlite:///{db_file}')
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+    return engine, db_file
+
+
+def _secondary_indexes():
+    return [index for table in db.metadata.sorted_tables for index in table.indexes if index.name.startswith('ix__')]
+
+
+def _seed_bench_data(engine, no_of_bookings, seed=42):
+    rnd = random.Random(seed)
+    now = datetime.now()
+    no_of_providers = max(10, no_of_bookings // 100)
+    no_of_customers = max(10, no_of_bookings // 10)
+    services_per_provider = 3
+    statuses = [status.value for status in BookingStatusEnum]
+
+    def user_row(username):
+        return {
+            'username': username,
+            'email': f'{username}@bench.local',
+            'password_hash': 'bench',
+            'fs_uniquifier': uuid.uuid4().hex,
+            'created_at': now,
+            'updated_at': now,
+        }
+
+    with engine.begin() as conn:
+        conn.execute(sa.insert(User.__table__), [user_row('bench_admin')])
+        conn.execute(sa.insert(Admin.__table__), [{'user_id': 1, 'wallet': 0}])
+
+        no_of_categories = 13
+        conn.execute(sa.insert(Category.__table__), [
+            {
+                'admin_id': 1, 'name': f'category_{i}', 'base_price': 100, 'min_time_hr': 1,
+                'commission_rate': 10, 'booking_rate': 5, 'transaction_rate': 2,
+                'created_at': now, 'updated_at': now
+            }
+            for i in range(no_of_categories)
+        ])
+
+        conn.execute(sa.insert(User.__table__), [user_row(f'prov_{i}') for i in range(no_of_providers)])
+        conn.execute(sa.insert(User.__table__), [user_row(f'cust_{i}') for i in range(no_of_customers)])
+
+        conn.execute(sa.insert(Provider.__table__), [
+            {
+                'user_id': 2 + i, 'category_id': 1 + i % no_of_categories,
+                'is_approved': rnd.random() < 0.9, 'is_blocked': rnd.random() < 0.05,
+                'created_at': now, 'updated_at': now
+            }
+            for i in range(no_of_providers)
+        ])
+        conn.execute(sa.insert(Customer.__table__), [
+            {'user_id': 2 + no_of_providers + i, 'is_blocked': rnd.random() < 0.02, 'created_at': now, 'updated_at': now}
+            for i in range(no_of_customers)
+        ])
+
+        conn.execute(sa.insert(Service.__table__), [
+            {
+                'prov_id': 1 + i // services_per_provider, 'name': f'service_{i}', 'price': 500, 'time_required_hr': 2,
+                'is_approved': rnd.random() < 0.9, 'is_blocked': rnd.random() < 0.05, 'is_active': rnd.random() < 0.85,
+                'created_at': now - timedelta(minutes=i), 'updated_at': now
+            }
+            for i in range(no_of_providers * services_per_provider)
+        ])
+
+        no_of_services = no_of_providers * services_per_provider
+        batch_size = 10000
+        payment_id = 0
+        for start in range(0, no_of_bookings, batch_size):
+            bookings, payments, reviews = [], [], []
+            for booking_id in range(start + 1, min(start + batch_size, no_of_bookings) + 1):
+                status = rnd.choice(statuses)
+                cust_id = rnd.randint(1, no_of_customers)
+                book_date = now - timedelta(days=rnd.randint(0, 365))
+                is_closed = status == BookingStatusEnum.CLOSE.value
+                bookings.append({
+                    'id': booking_id, 'cust_id': cust_id, 'service_id': rnd.randint(1, no_of_services),
+                    'status': status, 'is_closed': is_closed, 'book_date': book_date,
+                    'closed_date': book_date + timedelta(days=3) if is_closed else None,
+                    'created_at': book_date, 'updated_at': book_date
+                })
+
+                if status in [BookingStatusEnum.CONFIRM.value, BookingStatusEnum.ACTIVE.value, BookingStatusEnum.COMPLETE.value, BookingStatusEnum.CLOSE.value, BookingStatusEnum.CANCEL.value]:
+                    payment_id += 1
+                    payment_status = PaymentStatusEnum.PAID.value
+                    if status == BookingStatusEnum.CONFIRM.value:
+                        payment_status = PaymentStatusEnum.PENDING.value
+                    elif status == BookingStatusEnum.CANCEL.value:
+                        payment_status = PaymentStatusEnum.CANCEL.value
+                    payments.append({
+                        'id': payment_id, 'cust_id': cust_id, 'booking_id': booking_id, 'status': payment_status,
+                        'amount': 1000, 'commission_fee': 100, 'platform_fee': 50, 'transaction_fee': 20, 'discount': 0,
+                        'created_at': book_date, 'updated_at': book_date
+                    })
+
+                if status in [BookingStatusEnum.COMPLETE.value, BookingStatusEnum.CLOSE.value] and rnd.random() < 0.5:
+                    reviews.append({
+                        'cust_id': cust_id, 'booking_id': booking_id, 'rating': rnd.randint(1, 5),
+                        'created_at': book_date, 'updated_at': book_date
+                    })
+
+            conn.execute(sa.insert(Booking.__table__), bookings)
+            if payments:
+                conn.execute(sa.insert(Payment.__table__), payments)
+            if reviews:
+                conn.execute(sa.insert(Review.__table__), reviews)
+
+    return no_of_providers, no_of_customers
+
+
+def _list_queries(per_page):
+    # mirrors the filters, joins and ordering of the list resources
+
+    active_services_filter = (
+        Provider.is_approved.is_(True),
+        Provider.is_blocked.is_(False),
+        Service.is_approved.is_(True),
+        Service.is_blocked.is_(False),
+        Service.is_active.is_(True)
+    )
+
+    return {
+        'ProviderBookingListAPI (active)': lambda prov_id, cust_id: (
+            sa.select(Booking, Service)
+            .outerjoin(Service, Booking.service)
+            .outerjoin(Provider, Service.provider)
+            .filter(
+                Booking.status.notin_([BookingStatusEnum.REJECT.value, BookingStatusEnum.PENDING.value, BookingStatusEnum.CANCEL.value]),
+                Provider.id == prov_id
+            )
+            .order_by(Booking.id.desc())
+        ),
+        'ProviderBookingListAPI (pending)': lambda prov_id, cust_id: (
+            sa.select(Booking, Service)
+            .outerjoin(Service, Booking.service)
+            .outerjoin(Provider, Service.provider)
+            .filter(
+                Booking.status.in_([BookingStatusEnum.REJECT.value, BookingStatusEnum.PENDING.value, BookingStatusEnum.CANCEL.value]),
+                Provider.id == prov_id
+            )
+            .order_by(Booking.id.desc())
+        ),
+        'CustomerBookingsListAPI (active)': lambda prov_id, cust_id: (
+            sa.select(Booking, Service)
+            .outerjoin(Customer, Booking.customer)
+            .outerjoin(Service, Booking.service)
+            .filter(
+                Booking.status.in_([BookingStatusEnum.ACTIVE.value, BookingStatusEnum.COMPLETE.value]),
+                Customer.id == cust_id
+            )
+            .order_by(Booking.id.desc())
+        ),
+        'ActiveServiceListAPI': lambda prov_id, cust_id: (
+            sa.select(
+                Service,
+                sa.func.count(
+                    sa.case(
+                        (Booking.status.notin_([BookingStatusEnum.PENDING.value, BookingStatusEnum.REJECT.value, BookingStatusEnum.CONFIRM.value]), Booking.id)
+                    )
+                ),
+                sa.func.count(Review.id),
+                sa.func.coalesce(sa.func.avg(Review.rating), 0)
+            )
+            .outerjoin(Provider, Service.provider)
+            .outerjoin(Booking, Service.bookings)
+            .outerjoin(Review, Booking.review)
+            .filter(*active_services_filter)
+            .group_by(Service.id)
+        ),
+        'ProviderServiceListAPI': lambda prov_id, cust_id: (
+            sa.select(
+                Service,
+                sa.func.count(
+                    sa.case((Booking.status.in_([BookingStatusEnum.ACTIVE.value, BookingStatusEnum.COMPLETE.value]), Booking.id))
+                ),
+                sa.func.coalesce(sa.func.avg(Review.rating), 0)
+            )
+            .filter(Service.prov_id == prov_id)
+            .outerjoin(Booking, Service.bookings)
+            .outerjoin(Review, Booking.review)
+            .group_by(Service.id)
+        ),
+        'AdminServiceListAPI (approved)': lambda prov_id, cust_id: (
+            sa.select(Service)
+            .filter(Service.is_approved == True)
+            .order_by(Service.created_at.desc())
+        ),
+        'AdminPaymentsListAPI': lambda prov_id, cust_id: (
+            sa.select(Payment).order_by(Payment.id.desc())
+        ),
+        'ProviderPaymentsListAPI': lambda prov_id, cust_id: (
+            sa.select(Payment, Service)
+            .join(Booking, Payment.booking)
+            .join(Service, Booking.service)
+            .filter(Service.prov_id == prov_id)
+            .order_by(Payment.created_at.desc())
+        ),
+        'closed bookings export': lambda prov_id, cust_id: (
+            sa.select(Booking)
+            .join(Service, Booking.service)
+            .filter(Service.prov_id == prov_id, Booking.is_closed == True)
+        ),
+    }
+
+
+def _explain(session, stmt):
+    sql = str(stmt.compile(dialect=session.bind.dialect, compile_kwargs={'literal_binds': True}))
+    return [row[-1] for row in session.execute(sa.text(f'EXPLAIN QUERY PLAN {sql}'))]
+
+
+def _run_list_queries(session, queries, no_of_providers, no_of_customers, per_page, runs, rnd):
+    results = {}
+    for label, make_stmt in queries.items():
+        stmt = make_stmt(no_of_providers // 2, no_of_customers // 2)
+        plan = _explain(session, stmt.limit(per_page))
+
+        def paginate():
+            prov_id = rnd.randint(1, no_of_providers)
+            cust_id = rnd.randint(1, no_of_customers)
+            page_stmt = make_stmt(prov_id, cust_id)
+            session.execute(page_stmt.limit(per_page).offset(per_page * 2)).all()
+            session.execute(sa.select(sa.func.count()).select_from(page_stmt.order_by(None).subquery())).scalar()
+
+        results[label] = (plan, *_timed(paginate, runs))
+    return results
+
+
+@current_app.cli.command('bench-list-queries')
+@click.option('--bookings', default=200000, type=int, help='Number of bookings to seed')
+@click.option('--runs', default=30, type=int, help='Timed runs per query')
+@click.option('--db-file', default=None, type=str, help='Sqlite file to seed, a temp file is used by default')
+@click.option('--force', is_flag=True, help='Drop and reseed --db-file even if it already exists')
+def bench_list_queries(bookings, runs, db_file, force):
+    per_page = current_app.config.get('ITEMS_PER_PAGE', 6)
+    keep_db_file = db_file is not None
+    engine, db_file = _create_bench_engine(db_file, force=force)
+    print(f'Seeding {bookings} bookings into {db_file} ...')
+
+    indexes = _secondary_indexes()
+    for index in indexes:
+        index.drop(engine, checkfirst=True)
+
+    no_of_providers, no_of_customers = _seed_bench_data(engine, bookings)
+    queries = _list_queries(per_page)
+
+    with Session(engine) as session:
+        before = _run_list_queries(session, queries, no_of_providers, no_of_customers, per_page, runs, random.Random(1))
+
+    for index in indexes:
+        index.create(engine)
+    with engine.begin() as conn:
+        conn.execute(sa.text('ANALYZE'))
+
+    with Session(engine) as session:
+        after = _run_list_queries(session, queries, no_of_providers, no_of_customers, per_page, runs, random.Random(1))
+
+    for label in queries:
+        print(f'\n== {label}')
+        for phase, results in (('before', before), ('after', after)):
+            plan, p50, p95 = results[label]
+            print(f' [{phase}]')
+            for step in plan:
+                print(f'    {step}')
+            _print_timings('page + count', p50, p95)
+
+    engine.dispose()
+    if not keep_db_file:
+        os.remove(db_file)
+    return
+
+
+def _load_booking_page(session, rows):
+    return session.execute(
+        sa.select(Booking, Service)
+        .join(Service, Booking.service)
+        .options(*booking_load_options(exclude=['review']), *service_load_options())
+        .order_by(Booking.id)
+        .limit(rows)
+    ).all()
+
+
+@current_app.cli.command('bench-serializers')
+@click.option('--rows', default=1000, type=int, help='Rows per page to serialize')
+@click.option('--runs', default=20, type=int, help='Timed runs per variant')
+def bench_serializers(rows, runs):
+    engine, db_file = _create_bench_engine()
+    _seed_bench_data(engine, max(rows * 2, 2000))
+
+    with Session(engine) as session:
+        booking_page = _load_booking_page(session, rows)
+
+        def per_row_bookings():
+            booking_schema = BookingSchema(exclude=['review'])
+            service_schema = ServiceSchema()
+            bookings = []
+            for booking_obj, service_obj in booking_page:
+                booking = booking_schema.dump(booking_obj)
+                booking['service'] = service_schema.dump(service_obj)
+                bookings.append(booking)
+            return bookings
+
+        def registry_bookings():
+            return dump_rows(booking_page, get_schema(BookingSchema, exclude=['review']), ('service', get_schema(ServiceSchema)))
+
+        assert per_row_bookings() == registry_bookings()
+
+        payment_rows = get_row_serializer(PaymentSchema, exclude=['booking'])
+
+        def per_row_payments():
+            payment_schema = PaymentSchema(exclude=['booking'])
+            payments = session.execute(sa.select(Payment).order_by(Payment.id).limit(rows)).scalars().all()
+            return [payment_schema.dump(payment) for payment in payments]
+
+        def flat_payments():
+            page = session.execute(sa.select(*payment_rows.columns).order_by(Payment.id).limit(rows)).all()
+            return payment_rows.dump(page)
+
+        assert per_row_payments() == flat_payments()
+
+        print(f'Serializing {len(booking_page)} bookings with service, provider and customer nested')
+        _print_timings('per-row schema.dump loop', *_timed(per_row_bookings, runs))
+        _print_timings('registry + many=True', *_timed(registry_bookings, runs))
+
+        print(f'Loading and serializing {rows} flat payments')
+        session.expunge_all()
+        _print_timings('entities + per-row schema.dump', *_timed(lambda: (per_row_payments(), session.expunge_all()), runs))
+        _print_timings('column tuples + RowSerializer', *_timed(flat_payments, runs))
+
+    engine.dispose()
+    os.remove(db_file)
+    return
+
+
+@current_app.cli.command('bench-json')
+@click.option('--rows', default=None, type=int, help='Bookings on the page, ITEMS_PER_PAGE by default')
+@click.option('--runs', default=200, type=int, help='Timed runs per encoder')
+def bench_json(rows, runs):
+    rows = rows or current_app.config.get('ITEMS_PER_PAGE', 6)
+    engine, db_file = _create_bench_engine()
+    _seed_bench_data(engine, max(rows * 2, 2000))
+
+    with Session(engine) as session:
+        bookings = dump_rows(_load_booking_page(session, rows), get_schema(BookingSchema, exclude=['review']), ('service', get_schema(ServiceSchema)))
+
+    payload = {'success': True, 'data': {'bookings': bookings, 'no_of_bookings': len(bookings), 'per_page': rows}}
+    encoders = {
+        'json, indent=4 (previous debug output)': lambda: (json.dumps(payload, indent=4) + '\n').encode(),
+        'json (previous output)': lambda: (json.dumps(payload) + '\n').encode(),
+        'compact representation': lambda: compact_dumps(payload),
+    }
+
+    print(f'Encoding a page of {len(bookings)} bookings ({current_app.config.get("RESTFUL_JSON_ENCODER", "orjson")} encoder configured)')
+    for label, encode in encoders.items():
+        p50, p95 = _timed(encode, runs)
+        print(f'  {label:<40} p50 {p50:9.3f} ms   p95 {p95:9.3f} ms   {len(encode()):>9} bytes')
+
+    engine.dispose()
+    os.remove(db_file)
+    return
+
+
+class _CountingHandler:
+
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return '250 OK'
+
+
+@current_app.cli.command('bench-mail')
+@click.option('--messages', default=1000, type=int, help='Messages sent per transport')
+@click.option('--host', default=SMTP_SERVER_HOST, type=str, help='Interface the aiosmtpd stand-in listens on')
+@click.option('--port', default=SMTP_SERVER_PORT, type=int, help='Port of the aiosmtpd stand-in, stop the local mail server first')
+def bench_mail(messages, host, port):
+    try:
+        from aiosmtpd.controller import Controller
+    except ImportError:
+        raise click.ClickException('bench-mail needs aiosmtpd as a local SMTP stand-in: pip install aiosmtpd')
+
+    handler = _CountingHandler()
+    controller = Controller(handler, hostname=host, port=port)
+    controller.start()
+
+    def message(i):
+        return build_message(f'customer{i}@example.com', 'monthly booking report', f'<p>report {i}</p>' * 50)
+
+    def connection_per_message():
+        # the previous transport: connect, (login), send and quit for every message
+        for i in range(messages):
+            s = smtplib.SMTP(host=host, port=port)
+            s.send_message(message(i))
+            s.quit()
+
+    pool = SMTPConnectionPool(host=host, port=port)
+
+    def pooled_send_many():
+        errors = pool.send_many(message(i) for i in range(messages))
+        assert not any(errors), errors
+
+    try:
+        print(f'Sending {messages} messages to aiosmtpd on {host}:{port}')
+        for label, send in (('connection per message', connection_per_message), ('pooled send_many', pooled_send_many)):
+            received = handler.received
+            start = time.perf_counter()
+            send()
+            elapsed = time.perf_counter() - start
+            print(f'  {label:<40} {elapsed * 1000:9.1f} ms   {messages / elapsed:9.1f} msg/s   {handler.received - received:>6} delivered')
+    finally:
+        pool.close()
+        controller.stop()
+    return
+
+
+@current_app.cli.command('bench-templates')
+@click.option('--renders', default=10000, type=int, help='Reports rendered per variant')
+@click.option('--bookings', default=20, type=int, help='Bookings listed in each report')
+def bench_templates(renders, bookings):
+    html_template = 'templates/cust_bookings_monthly_report.html'
+    now = datetime.now().isoformat()
+    data = {
+        'username': 'customer',
+        'bookings': [
+            {'id': i, 'service': f'service {i}', 'category': 'Cleaning', 'status': 'close', 'book_date': now}
+            for i in range(bookings)
+        ]
+    }
+
+    def read_and_compile():
+        # the previous format_report: read the file and compile a new Template every call
+        with open(html_template) as file:
+            return jinja2.Template(file.read()).render(data=data)
+
+    assert read_and_compile() == format_report(html_template, data=data)
+
+    print(f'Rendering {html_template} with {bookings} bookings, {renders} times')
+    for label, render in (('read + compile per render', read_and_compile), ('cached environment', lambda: format_report(html_template, data=data))):
+        start = time.perf_counter()
+        for _ in range(renders):
+            render()
+        elapsed = time.perf_counter() - start
+        print(f'  {label:<40} {elapsed * 1000:9.1f} ms   {elapsed / renders * 1e6:9.1f} us/render')
+    return
+
+
+def _admin_export_rows(no_of_rows, seed=42):
+    # rows shaped like admin_closed_bookings_query, generated so 1M rows need no database
+    rnd = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    for i in range(no_of_rows):
+        book_date = start + timedelta(minutes=i)
+        amount = rnd.randrange(100, 5000)
+        yield (
+            i + 1, f'service_{rnd.randrange(3000)}', f'category_{rnd.randrange(13)}', f'prov_{rnd.randrange(1000)}',
+            f'cust_{rnd.randrange(100000)}', book_date, book_date + timedelta(days=2), book_date + timedelta(days=2, hours=1),
+            amount // 10, amount // 20, amount // 50, amount
+        )
+
+
+@current_app.cli.command('bench-exports')
+@click.option('--rows', default=1000000, type=int, help='Closed bookings written per format')
+def bench_exports(rows):
+    if not parquet_available():
+        raise click.ClickException('bench-exports needs pyarrow for the parquet writer: pip install pyarrow')
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+
+    schema = parquet_schema(ADMIN_CLOSED_BOOKINGS_HEADER, ADMIN_CLOSED_BOOKINGS_TYPES)
+    directory = tempfile.mkdtemp(prefix='bench_exports_')
+
+    def write_csv(path, compress):
+        with (gzip.open if compress else open)(path, 'wt', newline='') as csvfile:
+            write_csv_rows(csvfile, (admin_closed_booking_row(row) for row in _admin_export_rows(rows)), header=ADMIN_CLOSED_BOOKINGS_HEADER)
+
+    def write_parquet(path):
+        write_parquet_rows(path, (admin_closed_booking_values(row) for row in _admin_export_rows(rows)), schema)
+
+    def read_csv(path):
+        # typed parse with the multithreaded arrow reader, the fastest way back from csv
+        return pa_csv.read_csv(path).num_rows
+
+    variants = [
+        ('csv', 'admin_closed_bookings.csv', lambda path: write_csv(path, False), read_csv),
+        ('csv.gz', 'admin_closed_bookings.csv.gz', lambda path: write_csv(path, True), read_csv),
+        ('parquet', 'admin_closed_bookings.parquet', write_parquet, lambda path: pq.read_table(path).num_rows),
+    ]
+
+    start = time.perf_counter()
+    for _ in _admin_export_rows(rows):
+        pass
+    generated = time.perf_counter() - start
+
+    print(f'Writing {rows} closed bookings per format (generating the rows alone takes {generated * 1000:.1f} ms)')
+    try:
+        for label, file_name, write, read in variants:
+            path = os.path.join(directory, file_name)
+            start = time.perf_counter()
+            write(path)
+            written = time.perf_counter() - start
+            start = time.perf_counter()
+            assert read(path) == rows
+            read_back = time.perf_counter() - start
+            print(f'  {label:<10} write {written * 1000:9.1f} ms   read {read_back * 1000:9.1f} ms   {os.path.getsize(path) / 1e6:9.2f} MB')
+    finally:
+        for file_name in os.listdir(directory):
+            os.remove(os.path.join(directory, file_name))
+        os.rmdir(directory)
+    return
@@ -0,0 +1,261 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from uuid import uuid4
+
+from flask_caching.backends.rediscache import RedisCache
+
+
+class LocalLRU:
+    """Bounded, thread safe in-process LRU with a per entry TTL."""
+
+    def __init__(self, maxsize=512, timeout=30):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def set(self, key, value, timeout=None):
+        timeout = self.timeout if not timeout or timeout < 0 else min(timeout, self.timeout)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'timeout': self.timeout,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class TwoTierRedisCache(RedisCache):
+    """Redis cache with an optional per-worker LRU (L1) in front of it.
+
+    Every write or delete on Redis (L2) is broadcast on a pub/sub channel and each worker drops
+    those keys from its own L1, so a bumped tag version or a deleted entry is not served from
+    memory for longer than the round trip of that message. `CACHE_L1_MAXSIZE = 0` disables L1.
+    """
+
+    def __init__(self, *args, l1_maxsize=512, l1_timeout=30, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.l1 = LocalLRU(maxsize=l1_maxsize, timeout=l1_timeout) if l1_maxsize else None
+        self.channel = f'{self.key_prefix or ""}l1-invalidate'
+        self._instance_id = uuid4().hex
+        self._listener_pid = None
+        self._listener_lock = threading.Lock()
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs.update(
+            l1_maxsize=config.get('CACHE_L1_MAXSIZE', 512),
+            l1_timeout=config.get('CACHE_L1_TIMEOUT', 30),
+        )
+        return super().factory(app, config, args, kwargs)
+
+    # -- pub/sub -------------------------------------------------------------------------------
+
+    def _ensure_listener(self):
+        if self.l1 is None or self._listener_pid == os.getpid():
+            return
+        with self._listener_lock:
+            if self._listener_pid == os.getpid():
+                return
+            # a forked worker must not trust entries inherited from its parent
+            self.l1.clear()
+            self._instance_id = uuid4().hex
+            self._listener_pid = os.getpid()
+            threading.Thread(target=self._listen, name='l1-invalidate', daemon=True).start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._write_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # messages may have been missed while (re)connecting
+                self.l1.clear()
+                for message in pubsub.listen():
+                    self._handle_invalidation(message.get('data'))
+            except Exception:
+                time.sleep(1)
+
+    def _handle_invalidation(self, data):
+        try:
+            payload = json.loads(data)
+        except (TypeError, ValueError):
+            return
+        if payload.get('origin') == self._instance_id:
+            return
+        if payload.get('clear'):
+            self.l1.clear()
+        else:
+            self.l1.delete(*payload.get('keys', []))
+
+    def _publish(self, keys=(), clear=False):
+        if self.l1 is None:
+            return
+        try:
+            payload = {'origin': self._instance_id, 'keys': list(keys), 'clear': clear}
+            self._write_client.publish(self.channel, json.dumps(payload))
+        except Exception:
+            # without the broadcast other workers still drop the entry once its L1 TTL runs out
+            pass
+
+    # -- cache api -----------------------------------------------------------------------------
+
+    def l1_stats(self):
+        if self.l1 is None:
+            return {'enabled': False}
+        return {'enabled': True, 'pid': os.getpid(), **self.l1.stats()}
+
+    def get(self, key):
+        if self.l1 is None:
+            return super().get(key)
+
+        self._ensure_listener()
+        found, value = self.l1.get(key)
+        if found:
+            return value
+
+        value = super().get(key)
+        if value is not None:
+            self.l1.set(key, value)
+        return value
+
+    def get_many(self, *keys):
+        if self.l1 is None:
+            return super().get_many(*keys)
+
+        self._ensure_listener()
+        values = {}
+        missing = []
+        for key in keys:
+            found, value = self.l1.get(key)
+            if found:
+                values[key] = value
+            else:
+                missing.append(key)
+
+        if missing:
+            for key, value in zip(missing, super().get_many(*missing)):
+                values[key] = value
+                if value is not None:
+                    self.l1.set(key, value)
+
+        return [values[key] for key in keys]
+
+    def has(self, key):
+        if self.l1 is not None:
+            found, _ = self.l1.get(key)
+            if found:
+                return True
+        return super().has(key)
+
+    def set(self, key, value, timeout=None):
+        result = super().set(key, value, timeout=timeout)
+        if self.l1 is not None:
+            self.l1.set(key, value, self._normalize_timeout(timeout))
+            self._publish([key])
+        return result
+
+    def add(self, key, value, timeout=None):
+        added = super().add(key, value, timeout=timeout)
+        if added and self.l1 is not None:
+            self.l1.set(key, value, self._normalize_timeout(timeout))
+            self._publish([key])
+        return added
+
+    def set_many(self, mapping, timeout=None):
+        result = super().set_many(mapping, timeout=timeout)
+        if self.l1 is not None:
+            for key, value in mapping.items():
+                self.l1.set(key, value, self._normalize_timeout(timeout))
+            self._publish(mapping.keys())
+        return result
+
+    def delete(self, key):
+        result = super().delete(key)
+        if self.l1 is not None:
+            self.l1.delete(key)
+            self._publish([key])
+        return result
+
+    def delete_if_equal(self, key, value):
+        """Delete `key` only while it still holds `value`, atomically (WATCH/MULTI)."""
+        full_key = f'{self._get_prefix()}{key}'
+
+        def compare_and_delete(pipe):
+            current = pipe.get(full_key)
+            if current is None or self.serializer.loads(current) != value:
+                return False
+            pipe.multi()
+            pipe.delete(full_key)
+            return True
+
+        deleted = self._write_client.transaction(compare_and_delete, full_key, value_from_callable=True)
+        if self.l1 is not None:
+            self.l1.delete(key)
+            if deleted:
+                self._publish([key])
+        return deleted
+
+    def delete_many(self, *keys):
+        result = super().delete_many(*keys)
+        if self.l1 is not None:
+            self.l1.delete(*keys)
+            self._publish(keys)
+        return result
+
+    def inc(self, key, delta=1):
+        result = super().inc(key, delta=delta)
+        if self.l1 is not None:
+            self.l1.delete(key)
+            self._publish([key])
+        return result
+
+    def dec(self, key, delta=1):
+        result = super().dec(key, delta=delta)
+        if self.l1 is not None:
+            self.l1.delete(key)
+            self._publish([key])
+        return result
+
+    def clear(self):
+        result = super().clear()
+        if self.l1 is not None:
+            self.l1.clear()
+            self._publish(clear=True)
+        return result
@@ -0,0 +1,227 @@
+import math
+import random
+import time
+from functools import wraps
+from uuid import uuid4
+from urllib.parse import urlencode
+from flask import current_app, request
+
+from application.extensions import db, cache
+from application.utils import parse_bool, with_etag
+from application.serializers import parse_fields
+from application.providers.models import Provider, Service
+
+
+# Cached catalog responses are keyed under the current version of every tag they depend on.
+# Mutations bump the versions of the affected tags, so older entries are never read again and
+# simply age out by TTL.
+
+TAG_KEY_PREFIX = 'tag:'
+
+CATEGORIES_TAG = 'categories'
+SERVICES_TAG = 'services'
+CATEGORY_TAG = 'category:{cat_id}'
+SERVICE_TAG = 'service:{service_id}'
+
+
+def normalize_page(value):
+    try:
+        return max(int(value), 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+def normalize_bool(value):
+    return parse_bool(value) if value is not None else False
+
+
+def normalize_str(value):
+    return value.strip() if value is not None else ''
+
+
+def normalize_fields(value):
+    return ','.join(parse_fields(value) or ())
+
+
+PAGE_ARGS = {'page': normalize_page}
+
+
+# Only whitelisted query arguments are part of the key and each one is normalized the same way
+# the resource reads it, e.g. `?page=abc`, `?page=1` and no page at all share one entry, while
+# `?only_names=true` never collides with a page of categories. The cached catalog responses are
+# the same for every caller, so neither the token nor the role is part of the key.
+def make_cache_key(args=None):
+    args = args or {}
+
+    def key_prefix(*_args, **_kwargs):
+        params = [(name, normalize(request.args.get(name))) for name, normalize in sorted(args.items())]
+        return f"{request.path}?{urlencode(params)}"
+    return key_prefix
+
+
+def _tag_key(tag):
+    return f'{TAG_KEY_PREFIX}{tag}'
+
+
+def get_tag_versions(tags):
+    keys = [_tag_key(tag) for tag in tags]
+    versions = list(cache.get_many(*keys))
+
+    for i, (key, version) in enumerate(zip(keys, versions)):
+        if version is None:
+            # a missing version must never fall back to one seen before, so start from a fresh one
+            cache.add(key, uuid4().hex, timeout=0)
+            versions[i] = cache.get(key)
+
+    return versions
+
+
+def bump_tags(*tags):
+    if tags:
+        cache.set_many({_tag_key(tag): uuid4().hex for tag in set(tags)}, timeout=0)
+
+
+def tagged_cache_key(*tag_templates, args=None):
+    base_key = make_cache_key(args)
+
+    def key_prefix(*_args, **_kwargs):
+        view_args = request.view_args or {}
+        tags = [template.format(**view_args) for template in tag_templates]
+        versions = get_tag_versions(tags)
+        return f"{base_key()}#{'.'.join(str(version)[:12] for version in versions)}"
+    return key_prefix
+
+
+def invalidate_category(cat_id, include_services=False):
+    tags = [CATEGORIES_TAG, CATEGORY_TAG.format(cat_id=cat_id)]
+
+    if include_services:
+        service_ids = (
+            db.session.query(Service.id)
+            .join(Provider, Service.provider)
+            .filter(Provider.category_id == cat_id)
+            .all()
+        )
+        tags.append(SERVICES_TAG)
+        tags.extend(SERVICE_TAG.format(service_id=service_id) for service_id, in service_ids)
+
+    bump_tags(*tags)
+
+
+def invalidate_service(service):
+    category_id = (
+        db.session.query(Provider.category_id)
+        .filter(Provider.id == service.prov_id)
+        .scalar()
+    )
+    bump_tags(
+        SERVICES_TAG,
+        SERVICE_TAG.format(service_id=service.id),
+        CATEGORIES_TAG,
+        CATEGORY_TAG.format(cat_id=category_id)
+    )
+
+
+def invalidate_provider(provider):
+    service_ids = db.session.query(Service.id).filter(Service.prov_id == provider.id).all()
+    bump_tags(
+        SERVICES_TAG,
+        CATEGORIES_TAG,
+        CATEGORY_TAG.format(cat_id=provider.category_id),
+        *[SERVICE_TAG.format(service_id=service_id) for service_id, in service_ids]
+    )
+
+
+def _should_refresh(entry, now, beta):
+    # probabilistic early expiration (XFetch): the closer the entry is to expiring and the more
+    # expensive it was to build, the more likely a request is to rebuild it ahead of time
+    return now - entry['delta'] * beta * math.log(random.random() or 1e-12) >= entry['expires_at']
+
+
+def _is_cacheable(rv):
+    status_code = rv[1] if isinstance(rv, tuple) and len(rv) > 1 else 200
+    return isinstance(status_code, int) and status_code < 400
+
+
+def _release_lock(lock_key, token):
+    # only the holder may delete its lock, one that expired may already belong to another request
+    delete_if_equal = getattr(cache.cache, 'delete_if_equal', None)
+    if delete_if_equal is not None:
+        delete_if_equal(lock_key, token)
+    elif cache.get(lock_key) == token:
+        # in-process backends (SimpleCache) are not shared between workers
+        cache.delete(lock_key)
+
+
+def cached_response(timeout, key_prefix, beta=1.0):
+    """Cache a resource response with single-flight rebuilds.
+
+    Entries outlive their logical `timeout` by CACHE_STALE_TIMEOUT seconds. Once an entry is due
+    (or picked for early refresh) only the request holding the `lock:<key>` entry rebuilds it,
+    the others keep serving the stale copy; when there is no copy at all they wait for the
+    rebuild for up to CACHE_LOCK_TIMEOUT seconds, or until the lock is released without an entry
+    (the response was not cacheable) and then build it themselves. The ETag of a cacheable response is computed
+    once and stored with it.
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            stale_timeout = current_app.config.get('CACHE_STALE_TIMEOUT', 300)
+            lock_timeout = current_app.config.get('CACHE_LOCK_TIMEOUT', 30)
+
+            try:
+                cache_key = key_prefix()
+                entry = cache.get(cache_key)
+            except Exception:
+                current_app.logger.exception('Cache backend unavailable, serving uncached response')
+                return f(*args, **kwargs)
+
+            now = time.time()
+            if entry is not None and not _should_refresh(entry, now, beta):
+                return entry['value']
+
+            lock_key = f'lock:{cache_key}'
+            token = uuid4().hex
+            try:
+                if not cache.add(lock_key, token, timeout=lock_timeout):
+                    if entry is not None:
+                        return entry['value']
+
+                    deadline = now + lock_timeout
+                    while time.time() < deadline:
+                        time.sleep(0.05)
+                        entry = cache.get(cache_key)
+                        if entry is not None:
+                            return entry['value']
+                        if not cache.has(lock_key):
+                            # the rebuild ended without caching anything (404, 400, an error), build it here
+                            break
+            except Exception:
+                current_app.logger.exception('Cache backend unavailable, serving uncached response')
+                return f(*args, **kwargs)
+
+            try:
+                start = time.time()
+                rv = f(*args, **kwargs)
+                if _is_cacheable(rv):
+                    rv = with_etag(rv)
+                    finished = time.time()
+                    try:
+                        cache.set(
+                            cache_key,
+                            {'value': rv, 'expires_at': finished + timeout, 'delta': finished - start},
+                            timeout=timeout + stale_timeout
+                        )
+                    except Exception:
+                        current_app.logger.exception('Cache backend unavailable, response not cached')
+                return rv
+            finally:
+                # must not hide the response (or the error) of the view
+                try:
+                    _release_lock(lock_key, token)
+                except Exception:
+                    current_app.logger.exception('Could not release cache lock %s', lock_key)
+
+        return decorated_function
+    return decorator
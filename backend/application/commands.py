@@ -27,4 +27,31 @@ def create_role(role, desc):
     )
     db.session.commit()
     print('Role created', role)
-    return 
\ No newline at end of file
+    return 
+
+@current_app.cli.command('rebuild-service-stats')
+@click.option("--dry-run", is_flag=True, default=False, help='Only report drift, do not rewrite the table')
+def rebuild_service_stats_command(dry_run):
+    from application.stats import rebuild_service_stats
+
+    drift = rebuild_service_stats(dry_run=dry_run)
+
+    for service_id, (stored, expected) in sorted(drift.items()):
+        print(f'Service {service_id} drifted: stored {stored} expected {expected}')
+
+    print(f'{len(drift)} service stats rows drifted', '(dry run)' if dry_run else 'and were rebuilt')
+    return 
+
+
+@current_app.cli.command('rebuild-category-stats')
+@click.option("--dry-run", is_flag=True, default=False, help='Only report drift, do not rewrite the table')
+def rebuild_category_stats_command(dry_run):
+    from application.stats import rebuild_category_stats
+
+    drift = rebuild_category_stats(dry_run=dry_run)
+
+    for category_id, (stored, expected) in sorted(drift.items()):
+        print(f'Category {category_id} drifted: stored {stored} expected {expected}')
+
+    print(f'{len(drift)} category stats rows drifted', '(dry run)' if dry_run else 'and were rebuilt')
+    return 
@@ -1,5 +1,6 @@
 from flask import Blueprint
 from flask_restful import Api
+from application.representations import register_json_representation
 
 core = Blueprint('core', __name__)
 
@@ -7,6 +8,7 @@ core = Blueprint('core', __name__)
 from .resources import CategoryExploreListAPI, CategoryExploreAPI, ActiveServiceListAPI, ActiveServiceAPI
 
 api = Api(core)
+register_json_representation(api)
 
 api.add_resource(CategoryExploreListAPI, '/categories')
 api.add_resource(CategoryExploreAPI, '/categories/<int:cat_id>')
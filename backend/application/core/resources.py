@@ -4,25 +4,39 @@ from flask_restful import Resource
 from sqlalchemy.exc import SQLAlchemyError
 from application.extensions import db, ma, cache
 from .models import User, Profile
-from application.admin.models import Category
-from application.providers.models import Provider, Service
+from application.admin.models import Category, CategoryStats
+from application.providers.models import Provider, Service, ServiceStats
 from application.customers.models import Booking, Review
 from application.admin.schemas import CategorySchema
-from application.providers.schemas import ProviderSchema, ServiceSchema
-from application.utils import success_response, error_response
+from application.providers.schemas import ProviderSchema, ServiceSchema, service_load_options
+from application.utils import success_response, error_response, parse_bool
+from application.decorators import conditional_response
+from application.serializers import get_schema, get_row_serializer, dump_rows, parse_fields, schema_fields, requested_extras
 from application.enums import BookingStatusEnum
-from application.utils import make_cache_key
+from application.caching import cached_response, tagged_cache_key, normalize_bool, normalize_str, normalize_fields, PAGE_ARGS, CATEGORIES_TAG, CATEGORY_TAG, SERVICES_TAG, SERVICE_TAG
 
 
    
+category_rows = get_row_serializer(CategorySchema, exclude=['providers'])
+category_schema = get_schema(CategorySchema)
+service_schema = get_schema(ServiceSchema)
+
+category_list_cache_key = tagged_cache_key(CATEGORIES_TAG, args={**PAGE_ARGS, 'only_names': normalize_bool, 'fields': normalize_fields})
+category_cache_key = tagged_cache_key(CATEGORY_TAG)
+service_list_cache_key = tagged_cache_key(SERVICES_TAG, args={**PAGE_ARGS, 'query': normalize_str, 'fields': normalize_fields})
+service_cache_key = tagged_cache_key(SERVICE_TAG)
+
+
 class CategoryExploreListAPI(Resource):
 
-    @cache.cached(timeout=300, key_prefix=make_cache_key)
+    @conditional_response()
+    @cached_response(timeout=21600, key_prefix=category_list_cache_key)
     def get(self):
         try:
             page = request.args.get('page', default=1, type=int)
             per_page = current_app.config.get('ITEMS_PER_PAGE', 6)
-            only_names = request.args.get('only_names', default=False)
+            only_names = request.args.get('only_names', default=False, type=parse_bool)
+            fields = parse_fields(request.args.get('fields'))
 
             if only_names:
                 cat_names = db.session.query(Category.name).all()
@@ -30,46 +44,22 @@ class CategoryExploreListAPI(Resource):
                 
                 return success_response(data={'categories': cat_names})
 
-            active_provs_with_active_services_subq = (
-                db.session.query(
-                    Provider, 
-                    db.func.count(
-                        db.case(
-                            (db.and_(Service.is_blocked.is_(False), Service.is_approved.is_(True), Service.is_active.is_(True)), Service.id)
-                        )
-                    ).label('active_services')
-                )
-                .outerjoin(Service, Provider.services)
-                .filter(Provider.is_blocked.is_(False), Provider.is_approved.is_(True))
-                .group_by(Provider.id)
-                .subquery() 
-            )
+            rows = category_rows
+            if fields is not None:
+                rows = get_row_serializer(CategorySchema, exclude=['providers'], only=schema_fields(fields, 'active_providers', 'active_services'))
 
             paginated_data = (
                 db.session.query(
-                    Category, 
-                    db.func.count(
-                        active_provs_with_active_services_subq.c.id
-                    ).label('active_provs'), 
-                    db.func.coalesce(
-                        db.func.sum(
-                            active_provs_with_active_services_subq.c.active_services
-                        ), 0
-                    ).label('active_services')
+                    *rows.columns, 
+                    db.func.coalesce(CategoryStats.active_providers, 0).label('active_provs'), 
+                    db.func.coalesce(CategoryStats.active_services, 0).label('active_services')
                 )
-                .outerjoin(active_provs_with_active_services_subq)
-                .group_by(Category.id)
+                .outerjoin(CategoryStats, Category.stats)
+                .order_by(Category.id)
                 .paginate(page=page, per_page=per_page, error_out=False)
             )
 
-            schema = CategorySchema(exclude=['providers'])
-            categories = []
-
-            for category_obj, active_providers, active_services in paginated_data:
-                category = schema.dump(category_obj)
-                category['active_providers'] = active_providers
-                category['active_services'] = active_services
-                categories.append(category)
+            categories = rows.dump(paginated_data, *requested_extras(fields, 'active_providers', 'active_services'))
 
             data = {
                 'no_of_categories': paginated_data.total,
@@ -81,6 +71,8 @@ class CategoryExploreListAPI(Resource):
 
             return success_response(data=data)
         
+        except ValueError as e:
+            return error_response(str(e), status_code=400)
         except SQLAlchemyError as e:
             return error_response('Something went wrong while fetching categories')
         except Exception as e:
@@ -89,7 +81,8 @@ class CategoryExploreListAPI(Resource):
 
 class CategoryExploreAPI(Resource):
 
-    @cache.cached(timeout=300, key_prefix=make_cache_key)
+    @conditional_response()
+    @cached_response(timeout=21600, key_prefix=category_cache_key)
     def get(self, cat_id):
         try:
             category_obj = Category.query.filter(Category.id.is_(cat_id)).first()
@@ -97,8 +90,7 @@ class CategoryExploreAPI(Resource):
             if not category_obj:
                 return error_response(f'No such category exits with {cat_id} id', is_restful=True, status_code=404)
               
-            schema = CategorySchema()
-            category = schema.dump(category_obj)
+            category = category_schema.dump(category_obj)
             return success_response(data=category)
         except SQLAlchemyError as e:
             return error_response('Something went wrong while fetching category')
@@ -108,31 +100,28 @@ class CategoryExploreAPI(Resource):
 
 class ActiveServiceListAPI(Resource):
 
-    @cache.cached(timeout=3000, key_prefix=make_cache_key)
+    @conditional_response()
+    @cached_response(timeout=3600, key_prefix=service_list_cache_key)
     def get(self):
         page = request.args.get('page', 1, type=int)
         per_page = current_app.config.get('ITEMS_PER_PAGE', 10)
         search_query = request.args.get('query')
+        fields = parse_fields(request.args.get('fields'))
 
         try:
+            only = schema_fields(fields, 'total_bookings', 'total_reviews', 'avg_rating')
+            schema = get_schema(ServiceSchema, only=only) if fields is not None else service_schema
+
             paginated = (
                 db.session.query(
                     Service,
-                    db.func.count(
-                        db.case(
-                            (Booking.status.notin_([BookingStatusEnum.PENDING.value, BookingStatusEnum.REJECT.value, BookingStatusEnum.CONFIRM.value]), Booking.id)
-                        )
-                    ).label('total_bookings'),
-                    db.func.count(
-                        Review.id
-                    ).label('total_reviews'),
-                    db.func.coalesce(
-                        db.func.avg(Review.rating), 0
-                    ).label('avg_rating')
+                    db.func.coalesce(ServiceStats.total_bookings, 0).label('total_bookings'),
+                    db.func.coalesce(ServiceStats.total_reviews, 0).label('total_reviews'),
+                    db.func.coalesce(ServiceStats.avg_rating, 0).label('avg_rating')
                 )
                 .outerjoin(Provider, Service.provider)
-                .outerjoin(Booking, Service.bookings)
-                .outerjoin(Review, Booking.review)
+                .outerjoin(ServiceStats, Service.stats)
+                .options(*service_load_options(only=only, joined=['provider']))
                 .filter(
                     Provider.is_approved.is_(True),
                     Provider.is_blocked.is_(False), 
@@ -140,20 +129,11 @@ class ActiveServiceListAPI(Resource):
                     Service.is_blocked.is_(False), 
                     Service.is_active.is_(True)
                 )
-                .group_by(Service.id)
+                .order_by(Service.id)
                 .paginate(page=page, per_page=per_page, error_out=False)
             )
             
-            schema = ServiceSchema()
-            services = []
-
-            for service_obj, total_bookings, total_reviews, avg_rating in paginated:
-                service = schema.dump(service_obj)
-                service['total_bookings'] = total_bookings
-                service['total_reviews'] = total_reviews
-                service['avg_rating'] = avg_rating
-
-                services.append(service)
+            services = dump_rows(paginated, schema, *requested_extras(fields, 'total_bookings', 'total_reviews', 'avg_rating'))
 
             data = {
                 'no_of_services': paginated.total,
@@ -163,6 +143,8 @@ class ActiveServiceListAPI(Resource):
                 'services': services
             }
             return success_response(data=data)
+        except ValueError as e:
+            return error_response(str(e), status_code=400)
         except SQLAlchemyError as e:
             return error_response('Something went wrong while fetching services')
         except Exception as e:
@@ -172,7 +154,8 @@ class ActiveServiceListAPI(Resource):
 
 class ActiveServiceAPI(Resource):
 
-    @cache.cached(timeout=1000, key_prefix=make_cache_key)
+    @conditional_response()
+    @cached_response(timeout=21600, key_prefix=service_cache_key)
     def get(self, service_id):
         try:
             service = (
@@ -194,7 +177,6 @@ class ActiveServiceAPI(Resource):
             if not service:
                 return error_response(f'Service not exist with {service_id}', status_code=400)
 
-            service_schema = ServiceSchema()
             service = service_schema.dump(service)
 
             return success_response(data={'service': service})
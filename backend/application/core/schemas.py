@@ -6,6 +6,7 @@ from application.extensions import ma
 from application.customers.schemas import CustomerSchema
 from application.providers.schemas import ProviderSchema
 from application.enums import UserRoleEnum
+from application.serializers import get_schema
 
 
 
@@ -23,18 +24,17 @@ class UserSchema(ma.SQLAlchemyAutoSchema):
     profile = fields.Nested('ProfileSchema')
 
     def get_role_from_relationship(self, obj):
-        roles_schema = RoleSchema(many=True)
-        roles = roles_schema.dump(obj.roles)
+        roles = get_schema(RoleSchema).dump(obj.roles, many=True)
         return roles[0].get('name')
 
     def get_provider_relationship(self, obj):
         if any(role.name == UserRoleEnum.PROVIDER.value for role in obj.roles):
-            return ProviderSchema(only=('id', 'is_approved', 'is_blocked')).dump(obj.provider)
+            return get_schema(ProviderSchema, only=('id', 'is_approved', 'is_blocked')).dump(obj.provider)
         return None
 
     def get_customer_relationship(self, obj):
         if any(role.name == UserRoleEnum.CUSTOMER.value for role in obj.roles):
-            return CustomerSchema(only=('id', 'is_blocked')).dump(obj.customer)
+            return get_schema(CustomerSchema, only=('id', 'is_blocked')).dump(obj.customer)
         return None
 
 
@@ -1,5 +1,6 @@
 from flask import Blueprint
 from flask_restful import Api
+from application.representations import register_json_representation
 
 customer = Blueprint('customer', __name__)
 
@@ -7,6 +8,7 @@ customer = Blueprint('customer', __name__)
 from .resources import CustomerBookingsListAPI, CustomerBookingMgmtAPI, CustomerPaymentHandleAPI, CustomerProfileAPI
 
 api = Api(customer)
+register_json_representation(api)
 
 api.add_resource(CustomerBookingsListAPI, "/bookings")
 
@@ -47,6 +47,16 @@ class Booking(db.Model):
     payment = db.relationship('Payment', back_populates='booking', uselist=False)
     review = db.relationship('Review', uselist=False)
 
+    __table_args__ = (
+        db.Index('ix__bookings__service_id__status', 'service_id', 'status'),
+        db.Index('ix__bookings__cust_id__status', 'cust_id', 'status'),
+        db.Index(
+            'ix__bookings__service_id__closed_date', 'service_id', 'closed_date', 
+            sqlite_where=db.text('is_closed = 1'), 
+            postgresql_where=db.text('is_closed')
+        ),
+    )
+
 
 class Payment(db.Model):
     __tablename__ = 'payments'
@@ -69,6 +79,8 @@ class Payment(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint('cust_id', 'booking_id', name='uq__payments__cust_id__booking_id'),
+        db.Index('ix__payments__booking_id', 'booking_id'),
+        db.Index('ix__payments__status', 'status'),
     )
 
     @hybrid_property
@@ -105,6 +117,7 @@ class Review(db.Model):
     __table_args__ = (
         db.UniqueConstraint('cust_id', 'booking_id', name='uq__reviews__cust_id__booking_id'),
         db.CheckConstraint('rating >= 0 AND rating <= 5', name='check_rating_between_0_and_5'),
+        db.Index('ix__reviews__booking_id', 'booking_id'),
     )
 
 
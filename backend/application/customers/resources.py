@@ -4,18 +4,25 @@ from flask_jwt_extended import jwt_required
 from flask_restful import Resource
 from sqlalchemy.exc import SQLAlchemyError
 from application.extensions import db
-from application.core.models import User
+from application.core.models import User, Profile
 from .models import Booking, Customer, Payment
 from application.providers.models import Service
 
-from .schemas import BookingSchema, CustomerSchema, PaymentSchema
-from application.providers.schemas import ServiceSchema
-from application.decorators import role_required
-from application.utils import success_response, error_response
+from .schemas import BookingSchema, CustomerSchema, PaymentSchema, booking_load_options
+from application.providers.schemas import ServiceSchema, service_load_options
+from application.decorators import role_required, conditional_response
+from application.utils import success_response, error_response, keyset_paginate, keyset_response_data, parse_bool
 from application.enums import PaymentMethodEnum, PaymentStatusEnum, UserRoleEnum, BookingStatusEnum
+from application.serializers import get_schema, dump_rows, parse_fields, schema_fields, nested_fields, requested_extras
 
-    
 
+service_schema = get_schema(ServiceSchema)
+booking_list_schema = get_schema(BookingSchema, exclude=['review'])
+payment_schema = get_schema(PaymentSchema)
+payment_booking_schema = get_schema(BookingSchema, exclude=['payment', 'review'])
+customer_schema = get_schema(CustomerSchema, exclude=['bookings'])
+
+    
 class CustomerBookingsListAPI(Resource):
     
   @jwt_required()
@@ -25,10 +32,19 @@ class CustomerBookingsListAPI(Resource):
       page = request.args.get('page', default=1, type=int)
       per_page = current_app.config.get('ITEMS_PER_PAGE', 6)
       status = request.args.get('status', default=BookingStatusEnum.ACTIVE.value)
+      cursor = request.args.get('cursor')
+      with_total = request.args.get('with_total', default=False, type=parse_bool)
+      fields = parse_fields(request.args.get('fields'))
 
       if status not in [BookingStatusEnum.ACTIVE.value, BookingStatusEnum.PENDING.value]:
         return error_response('Invalid status for resource', status_code=400)
 
+      only, service_only = schema_fields(fields, 'service'), nested_fields(fields, 'service')
+      schema, service_dump_schema = booking_list_schema, service_schema
+      if fields is not None:
+        schema = get_schema(BookingSchema, exclude=['review'], only=only)
+        service_dump_schema = get_schema(ServiceSchema, only=service_only) if service_only is not None else service_schema
+
       query = (
         db.session.query(
           Booking, 
@@ -36,6 +52,7 @@ class CustomerBookingsListAPI(Resource):
         )
         .outerjoin(Customer, Booking.customer)
         .outerjoin(Service, Booking.service)
+        .options(*booking_load_options(exclude=['review'], only=only, joined=['customer']), *service_load_options(only=service_only))
       )
 
       if status == BookingStatusEnum.ACTIVE.value:
@@ -49,20 +66,19 @@ class CustomerBookingsListAPI(Resource):
           Customer.id==cust_id
         )
 
-      paginated = (
-        query
-        .order_by(Booking.id.desc())
-        .paginate(per_page=per_page, page=page, error_out=False)
-      )
+      if cursor is not None:
+        paginated = keyset_paginate(query, [Booking.id], cursor, per_page, with_total=with_total)
+      else:
+        paginated = (
+          query
+          .order_by(Booking.id.desc())
+          .paginate(per_page=per_page, page=page, error_out=False)
+        )
 
-      bookings = []
-      booking_schema = BookingSchema(exclude=['review'])
-      service_schema = ServiceSchema()
+      bookings = dump_rows(paginated, schema, *requested_extras(fields, ('service', service_dump_schema)))
 
-      for booking_obj, service_obj in paginated:
-        booking = booking_schema.dump(booking_obj)
-        booking['service'] = service_schema.dump(service_obj)
-        bookings.append(booking)
+      if cursor is not None:
+        return success_response(data=keyset_response_data(paginated, 'bookings', bookings, with_total))
 
       data={
         'bookings': bookings,
@@ -73,6 +89,8 @@ class CustomerBookingsListAPI(Resource):
       }
 
       return success_response(data=data)
+    except ValueError as e:
+      return error_response(str(e), status_code=400)
     except SQLAlchemyError as e:
       print(e)
       return error_response('Something went wrong while fetching bookings')
@@ -182,11 +200,8 @@ class CustomerPaymentHandleAPI(Resource):
       if not booking or booking.status != BookingStatusEnum.CONFIRM.value:
         return error_response('Booking is fraud!!!', status_code=400)
       
-      payment_schema = PaymentSchema()
-      booking_schema = BookingSchema(exclude=['payment', 'review'])
-
       payment = payment_schema.dump(payment)
-      payment['booking'] = booking_schema.dump(booking)
+      payment['booking'] = payment_booking_schema.dump(booking)
 
       data = {'payment': payment}
       
@@ -272,10 +287,21 @@ class CustomerPaymentHandleAPI(Resource):
       return error_response('Somthing went wrong, please try again..')
 
 
+def customer_profile_versions(cust_id):
+  return (
+    db.session.query(Customer.updated_at, User.updated_at, Profile.updated_at)
+    .join(User, Customer.user)
+    .outerjoin(Profile, User.profile)
+    .filter(Customer.id == cust_id)
+    .first()
+  )
+
+
 class CustomerProfileAPI(Resource):
     
   @jwt_required()
   @role_required(UserRoleEnum.CUSTOMER.value)
+  @conditional_response(version=customer_profile_versions, cache_control='private, no-cache')
   def get(self, cust_id):
     try:
       customer = (
@@ -292,9 +318,7 @@ class CustomerProfileAPI(Resource):
       if not customer:
         return error_response(f'Customer does not exist with id {cust_id}', status_code=400)
 
-      schema = CustomerSchema(exclude=['bookings'])
-
-      data = {'customer': schema.dump(customer)}
+      data = {'customer': customer_schema.dump(customer)}
       return success_response(data=data)
       
     except SQLAlchemyError as e:
@@ -1,5 +1,7 @@
 from marshmallow import Schema, ValidationError, fields, validate, validates, pre_load
-from application.extensions import ma
+from application.extensions import ma, db
+from application.core.models import User
+from application.serializers import wants_field, nested_fields, load_only_options
 from .models import Customer, Booking, Payment, Review
 
 
@@ -47,3 +49,41 @@ class ReviewSchema(ma.SQLAlchemyAutoSchema):
         load_instance = True
         include_relationships = False
         include_fk = False
+
+
+# Loader options matching what the schemas above dump, `exclude` and `only` mirror the ones the
+# schema is built with. Relationships the query already joins go in `joined` (contains_eager).
+
+def customer_load_options(only=None):
+    options = []
+    if only is not None:
+        options.append(load_only_options(Customer, only, Customer.user_id))
+    if wants_field(only, 'user'):
+        options.append(db.joinedload(Customer.user).joinedload(User.profile))
+    return tuple(options)
+
+
+def booking_load_options(exclude=(), only=None, joined=()):
+    options = []
+    if only is not None:
+        options.append(load_only_options(Booking, only, Booking.cust_id, Booking.service_id))
+    if 'customer' not in exclude and wants_field(only, 'customer'):
+        customer_load = db.contains_eager if 'customer' in joined else db.joinedload
+        options.append(customer_load(Booking.customer).options(*customer_load_options(only=nested_fields(only, 'customer'))))
+    if 'payment' not in exclude and wants_field(only, 'payment'):
+        options.append(db.selectinload(Booking.payment))
+    if 'review' not in exclude and wants_field(only, 'review'):
+        options.append(db.selectinload(Booking.review))
+    return tuple(options)
+
+
+def payment_load_options(exclude=(), only=None, joined=()):
+    options = []
+    if only is not None:
+        options.append(load_only_options(Payment, only, Payment.cust_id, Payment.booking_id))
+    if 'booking' not in exclude and wants_field(only, 'booking'):
+        booking_only = nested_fields(only, 'booking')
+        booking_load = db.contains_eager if 'booking' in joined else db.joinedload
+        options.append(booking_load(Payment.booking).options(*booking_load_options(exclude=['payment', 'review'], only=booking_only)))
+    return tuple(options)
+
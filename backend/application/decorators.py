@@ -1,7 +1,10 @@
+from flask import request
 from flask_jwt_extended import current_user, get_current_user, get_jwt_identity
+from datetime import timezone
 from functools import wraps
+from werkzeug.http import http_date
 
-from application.utils import error_response
+from application.utils import error_response, make_etag, unpack_response
 from application.enums import UserRoleEnum
 
 
@@ -9,24 +12,68 @@ def role_required(role):
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            if current_user is None or role != current_user.roles[0].name:
+            # current_user is the cached UserIdentity, see application.identity
+            if current_user is None or role != current_user.role:
                 return error_response('Access denied, you are not authorized!!', status_code=403)
             
-            if current_user.roles[0].name == UserRoleEnum.PROVIDER.value:
-                provider = current_user.provider
-                if not provider and provider.id != kwargs.get('prov_id'):
+            if current_user.role == UserRoleEnum.PROVIDER.value:
+                if not current_user.provider_id and current_user.provider_id != kwargs.get('prov_id'):
                     return error_response('Access denied, you are not authorized for others resource!!', status_code=403)
-                if provider.is_blocked:
+                if current_user.is_blocked:
                     return error_response('You have been blocked', status_code=401)
 
-            if current_user.roles[0].name == UserRoleEnum.CUSTOMER.value:
-                customer = current_user.customer
-                if not customer and customer.id != kwargs.get('cust_id'):
+            if current_user.role == UserRoleEnum.CUSTOMER.value:
+                if not current_user.customer_id and current_user.customer_id != kwargs.get('cust_id'):
                     return error_response('Access denied, you are not authorized for others resource!!', status_code=403)
-                if customer.is_blocked:
+                if current_user.is_blocked:
                     return error_response('You have been blocked', status_code=401)
             return f(*args, **kwargs)
         return decorated_function
     return decorator
 
-   
\ No newline at end of file
+
+# Answers If-None-Match / If-Modified-Since with 304 Not Modified. With `version` the ETag and
+# Last-Modified come from the updated_at of the rows behind the response and are checked before
+# the handler runs, otherwise the ETag is the one cached with the payload or a hash of it.
+def conditional_response(version=None, cache_control='no-cache'):
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            headers = {'Cache-Control': cache_control}
+
+            if version is not None:
+                versions = [v for v in (version(**kwargs) or []) if v is not None]
+
+                if versions:
+                    # updated_at columns hold naive local time (datetime.now), HTTP dates are UTC
+                    last_modified = max(versions).replace(microsecond=0).astimezone(timezone.utc)
+                    headers['ETag'] = make_etag(request.path, versions)
+                    headers['Last-Modified'] = http_date(last_modified)
+
+                    if _is_not_modified(headers['ETag'], last_modified):
+                        return '', 304, headers
+
+            data, status_code, rv_headers = unpack_response(f(*args, **kwargs))
+            if status_code != 200:
+                return data, status_code, rv_headers
+
+            headers.update(rv_headers)
+            if 'ETag' not in headers:
+                headers['ETag'] = make_etag(data)
+
+            if version is None and _is_not_modified(headers['ETag']):
+                return '', 304, headers
+            return data, status_code, headers
+        return decorated_function
+    return decorator
+
+
+def _is_not_modified(etag, last_modified=None):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag.strip('"'))
+    if last_modified is not None and request.if_modified_since:
+        if_modified_since = request.if_modified_since
+        if if_modified_since.tzinfo is None:
+            if_modified_since = if_modified_since.replace(tzinfo=timezone.utc)
+        return if_modified_since >= last_modified.astimezone(timezone.utc)
+    return False
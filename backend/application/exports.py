@@ -0,0 +1,234 @@
+import csv
+import fcntl
+import glob
+import gzip
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from flask import current_app
+from application.customers.models import Booking
+from application.utils import chunks
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+
+# Closed-booking exports are kept as one artifact per export name (e.g. a provider) instead of a
+# new file per run. A sidecar records the newest closed_date written: a run with nothing closed
+# since returns the artifact as is, otherwise only the delta is appended to it. closed_date is
+# stamped in python before the commit, so a booking can become visible after one that closed
+# later was already exported. Every run therefore reads EXPORT_WATERMARK_WINDOW seconds behind the
+# watermark again and skips the ids the sidecar lists as written in that window. Artifacts nobody asked for within EXPORT_ARTIFACT_MAX_AGE_DAYS are
+# removed by the `cleanup_export_artifacts` task.
+#
+# Artifacts are csv (optionally gzipped) or, when pyarrow is installed, parquet with typed columns
+# written in EXPORT_PARQUET_ROW_GROUP_SIZE row groups. A parquet file cannot be appended to, so it
+# is rewritten whenever there is a delta (still streamed from the cursor, and swapped in
+# atomically), a refresh without new rows costs the same one-row probe as for csv.
+
+EXPORTS_FOLDER = 'static'
+EXPORTS_META_FOLDER = 'static/.exports'
+
+EXPORT_FORMATS = ('csv', 'parquet')
+
+
+def parquet_available():
+    return pq is not None
+
+
+def write_csv_rows(csvfile, rows, header=None):
+    # rows are written EXPORT_YIELD_PER at a time
+    chunk_size = current_app.config.get('EXPORT_YIELD_PER', 1000)
+    writer = csv.writer(csvfile, delimiter = ',')
+    if header is not None:
+        writer.writerow(header)
+    for chunk in chunks(rows, chunk_size):
+        writer.writerows(chunk)
+
+
+def _open_csv(path, mode, compress=False):
+    return (gzip.open if compress else open)(path, f'{mode}t', newline = "")
+
+
+def parquet_schema(header, types):
+    # types are pyarrow aliases ('int64', 'string', 'timestamp[us]'), so callers need no pyarrow import
+    return pa.schema([(name, pa.type_for_alias(type_)) for name, type_ in zip(header, types)])
+
+
+def write_parquet_rows(path, rows, schema):
+    row_group_size = current_app.config.get('EXPORT_PARQUET_ROW_GROUP_SIZE', 100000)
+    compression = current_app.config.get('EXPORT_PARQUET_COMPRESSION', 'zstd')
+    with pq.ParquetWriter(path, schema, compression=compression) as writer:
+        for chunk in chunks(rows, row_group_size):
+            columns = [pa.array(column, type=field.type) for column, field in zip(zip(*chunk), schema)]
+            writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=schema), row_group_size=row_group_size)
+
+
+class ExportArtifact:
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.compress = file_name.endswith('.gz')
+        self.parquet = file_name.endswith('.parquet')
+        self.path = os.path.join(EXPORTS_FOLDER, self.file_name)
+        self.meta_path = os.path.join(EXPORTS_META_FOLDER, f'{self.file_name}.json')
+        self.lock_path = os.path.join(EXPORTS_META_FOLDER, f'{self.file_name}.lock')
+
+    @contextmanager
+    def locked(self):
+        # one writer per artifact across worker processes
+        os.makedirs(EXPORTS_META_FOLDER, exist_ok=True)
+        with open(self.lock_path, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield self
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def read_meta(self, header, types=None):
+        try:
+            with open(self.meta_path) as file:
+                meta = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if meta.get('header') != header or meta.get('types') != types or 'recent' not in meta or not os.path.exists(self.path) or os.path.getsize(self.path) < meta.get('size', 0):
+            return None
+        return meta
+
+    def write_meta(self, meta):
+        tmp_path = f'{self.meta_path}.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(meta, file)
+        os.replace(tmp_path, self.meta_path)
+
+    def refresh(self, header, query, to_row, progress=None, types=None):
+        """Bring the artifact up to date with `query` and return the number of rows written.
+
+        `query` selects the closed bookings to export, `to_row` turns one of its result rows into
+        the csv row, or for parquet into the typed values of the `types` columns. The watermark
+        columns are added to the query here. A `ProgressReporter` passed as `progress` gets the
+        number of rows to write as total and is advanced per written row.
+        """
+        if self.parquet and pq is None:
+            raise RuntimeError('Parquet exports need pyarrow: pip install pyarrow')
+        if self.parquet and types is None:
+            raise ValueError('Parquet exports need the column types')
+
+        with self.locked():
+            meta = self.read_meta(header, types)
+            if meta is not None and not self.parquet and os.path.getsize(self.path) > meta['size']:
+                # drop whatever a crashed run appended past the recorded size
+                with open(self.path, 'r+b') as file:
+                    file.truncate(meta['size'])
+
+            query = query.add_columns(Booking.closed_date, Booking.id).order_by(Booking.closed_date, Booking.id)
+            window = timedelta(seconds=current_app.config.get('EXPORT_WATERMARK_WINDOW', 300))
+
+            if meta is not None and meta.get('closed_date') is not None:
+                since = datetime.fromisoformat(meta['closed_date']) - window
+                written = [booking_id for booking_id, _ in meta['recent']]
+                delta = query.filter(Booking.closed_date >= since, Booking.id.notin_(written))
+                if delta.order_by(None).first() is None:
+                    meta['used_at'] = datetime.now().isoformat()
+                    self.write_meta(meta)
+                    return 0
+                if self.parquet:
+                    # rewritten as a whole, with the delta
+                    meta = None
+                else:
+                    query = delta
+
+            if progress is not None:
+                progress.total = query.order_by(None).count()
+                progress.report()
+
+            mode = 'a'
+            if meta is None:
+                meta = {'header': header, 'types': types, 'closed_date': None, 'recent': [], 'rows': 0, 'size': 0}
+                mode = 'w'
+
+            appended = [0]
+            newest = datetime.fromisoformat(meta['closed_date']) if meta['closed_date'] is not None else None
+            recent = [(datetime.fromisoformat(closed_date), booking_id) for booking_id, closed_date in meta['recent']]
+
+            def rows():
+                nonlocal newest, recent
+                yield_per = current_app.config.get('EXPORT_YIELD_PER', 1000)
+                kept = len(recent)
+                for row in query.execution_options(yield_per=yield_per):
+                    *values, closed_date, booking_id = row
+                    # a late commit can sort below rows written by an earlier run
+                    newest = closed_date if newest is None else max(newest, closed_date)
+                    recent.append((closed_date, booking_id))
+                    if len(recent) > 2 * kept + yield_per:
+                        recent = [entry for entry in recent if entry[0] >= newest - window]
+                        kept = len(recent)
+                    appended[0] += 1
+                    if progress is not None:
+                        progress.advance()
+                    yield to_row(values)
+
+            if self.parquet:
+                tmp_path = f'{self.path}.tmp'
+                write_parquet_rows(tmp_path, rows(), parquet_schema(header, types))
+                os.replace(tmp_path, self.path)
+            else:
+                with _open_csv(self.path, mode, self.compress) as csvfile:
+                    write_csv_rows(csvfile, rows(), header=header if mode == 'w' else None)
+
+            if newest is not None:
+                meta['closed_date'] = newest.isoformat()
+                meta['recent'] = [[booking_id, closed_date.isoformat()] for closed_date, booking_id in recent if closed_date >= newest - window]
+            meta['rows'] += appended[0]
+            meta['size'] = os.path.getsize(self.path)
+            meta['updated_at'] = meta['used_at'] = datetime.now().isoformat()
+            self.write_meta(meta)
+            return appended[0]
+
+
+def export_artifact(name, compress=False, format='csv'):
+    if format == 'parquet':
+        # parquet compresses its column chunks itself
+        return ExportArtifact(f'{name}.parquet')
+    return ExportArtifact(f'{name}.csv' + ('.gz' if compress else ''))
+
+
+def cleanup_export_artifacts(max_age_days):
+    """Remove artifacts unused for `max_age_days`, and one-off export files older than that."""
+    cutoff = time.time() - max_age_days * 86400
+    removed = []
+
+    for meta_path in glob.glob(os.path.join(EXPORTS_META_FOLDER, '*.json')):
+        artifact = ExportArtifact(os.path.basename(meta_path)[:-len('.json')])
+
+        with artifact.locked():
+            try:
+                with open(meta_path) as file:
+                    used_at = datetime.fromisoformat(json.load(file)['used_at']).timestamp()
+            except (OSError, ValueError, KeyError):
+                used_at = os.path.getmtime(meta_path)
+            if used_at >= cutoff:
+                continue
+            # the (empty) lock file stays: a waiter that already opened it would otherwise hold a lock
+            # on an unlinked file while a new caller locks a fresh one and both write the artifact
+            for path in (artifact.path, meta_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            removed.append(artifact.file_name)
+
+    # files of the one-export-per-run era, named with a %f suffix, and parquet rewrites a crashed
+    # run left behind (a running one keeps its temporary file fresh)
+    leftovers = glob.glob(os.path.join(EXPORTS_FOLDER, '*_closed_bookings_*.csv*'))
+    leftovers += glob.glob(os.path.join(EXPORTS_FOLDER, '*.parquet.tmp'))
+    for path in leftovers:
+        if os.path.getmtime(path) < cutoff:
+            os.remove(path)
+            removed.append(os.path.basename(path))
+
+    return removed
@@ -41,8 +41,18 @@ def user_identity_lookup(user):
     return user.id  
 
 
+@jwt.additional_claims_loader
+def add_role_claims(user):
+    from application.identity import UserIdentity
+
+    if isinstance(user, UserIdentity):
+        return {'role': user.role}
+    return {'role': user.roles[0].name if user.roles else None}
+
+
 @jwt.user_lookup_loader
 def user_lookup_callback(jwt_header, jwt_data):
+    from application.identity import load_identity
+
     identity = jwt_data["sub"]
-    user = current_app.security.datastore.find_user(id=identity)
-    return user
\ No newline at end of file
+    return load_identity(identity)
\ No newline at end of file
@@ -0,0 +1,79 @@
+from flask import current_app
+
+from application.extensions import db, cache
+from application.core.models import User, Role, UserRole
+from application.providers.models import Provider
+from application.customers.models import Customer
+
+
+# Authenticated requests resolve the JWT subject to a UserIdentity snapshot instead of a User
+# row. Snapshots are kept in the app cache (per-worker L1 in front of Redis), so the user, role
+# and provider/customer lookups only hit the database on a miss. Admin block/unblock drops the
+# snapshot of the affected user, everything else simply expires after IDENTITY_CACHE_TIMEOUT.
+
+IDENTITY_KEY = 'identity:{user_id}'
+
+IDENTITY_FIELDS = ('id', 'role', 'provider_id', 'customer_id', 'is_blocked', 'fs_uniquifier')
+
+
+class UserIdentity:
+    __slots__ = IDENTITY_FIELDS
+
+    def __init__(self, id, role, provider_id=None, customer_id=None, is_blocked=False, fs_uniquifier=None):
+        self.id = id
+        self.role = role
+        self.provider_id = provider_id
+        self.customer_id = customer_id
+        self.is_blocked = is_blocked
+        self.fs_uniquifier = fs_uniquifier
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in IDENTITY_FIELDS}
+
+    def __repr__(self):
+        return f'<UserIdentity {self.id} {self.role}>'
+
+
+def _identity_key(user_id):
+    return IDENTITY_KEY.format(user_id=user_id)
+
+
+def fetch_identity(user_id):
+    row = (
+        db.session.query(
+            User.id,
+            Role.name,
+            Provider.id,
+            Customer.id,
+            db.func.coalesce(Provider.is_blocked, Customer.is_blocked, False),
+            User.fs_uniquifier
+        )
+        .outerjoin(UserRole, UserRole.user_id == User.id)
+        .outerjoin(Role, Role.id == UserRole.role_id)
+        .outerjoin(Provider, Provider.user_id == User.id)
+        .outerjoin(Customer, Customer.user_id == User.id)
+        .filter(User.id == user_id)
+        .first()
+    )
+    return UserIdentity(*row) if row else None
+
+
+def load_identity(user_id):
+    try:
+        data = cache.get(_identity_key(user_id))
+    except Exception:
+        current_app.logger.exception('Cache backend unavailable, loading identity from database')
+        return fetch_identity(user_id)
+
+    if data is not None:
+        return UserIdentity(**data)
+
+    identity = fetch_identity(user_id)
+    if identity is not None:
+        timeout = current_app.config.get('IDENTITY_CACHE_TIMEOUT', 300)
+        cache.set(_identity_key(user_id), identity.to_dict(), timeout=timeout)
+    return identity
+
+
+def invalidate_identity(user_id):
+    cache.delete(_identity_key(user_id))
@@ -0,0 +1,143 @@
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import current_app, g, request
+from sqlalchemy import event
+
+
+# Every statement executed while a request (or a celery task, see worker.py) is running is
+# recorded in a SQLStats collector held in a context variable. At the end the totals go out as a
+# `Server-Timing: db;...` header and one `sql_stats ...` log line, and each normalized statement
+# seen more than SQL_REPEATED_STATEMENT_THRESHOLD times logs a warning, which is how lazy-load
+# storms show up. It is opt-in through SQL_INSTRUMENTATION (on in DevelopmentConfig), the header
+# tells every client the DB time and query count.
+
+_current_stats = ContextVar('sql_stats', default=None)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_PLACEHOLDER = re.compile(r'%\(\w+\)s|%s|:\w+|\$\d+|\?')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_statement(statement):
+    statement = _STRING_LITERAL.sub('?', statement)
+    statement = _PLACEHOLDER.sub('?', statement)
+    statement = _NUMBER_LITERAL.sub('?', statement)
+    statement = _PLACEHOLDER_LIST.sub('(?)', statement)
+    return _WHITESPACE.sub(' ', statement).strip()
+
+
+class SQLStats:
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement = None
+        self.statements = Counter()
+
+    def record(self, statement, elapsed):
+        self.count += 1
+        self.total_time += elapsed
+        if elapsed > self.slowest_time:
+            self.slowest_time = elapsed
+            self.slowest_statement = statement
+        self.statements[normalize_statement(statement)] += 1
+
+    def repeated_statements(self, threshold):
+        return [(statement, count) for statement, count in self.statements.most_common() if count > threshold]
+
+    def server_timing(self):
+        return (
+            f'db;dur={self.total_time * 1000:.2f};desc="{self.count} queries", '
+            f'db-slowest;dur={self.slowest_time * 1000:.2f}'
+        )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats.get() is not None:
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    start_times = conn.info.get('query_start_time')
+    if stats is None or not start_times:
+        return
+    stats.record(statement, time.perf_counter() - start_times.pop())
+
+
+def report_sql_stats(label, stats, app=None):
+    app = app or current_app
+    max_length = app.config.get('SQL_LOG_STATEMENT_LENGTH', 200)
+    app.logger.info(
+        'sql_stats %s queries=%d db_ms=%.2f slowest_ms=%.2f slowest=%r',
+        label, stats.count, stats.total_time * 1000, stats.slowest_time * 1000,
+        (stats.slowest_statement or '')[:max_length]
+    )
+
+    threshold = app.config.get('SQL_REPEATED_STATEMENT_THRESHOLD', 5)
+    for statement, count in stats.repeated_statements(threshold):
+        app.logger.warning('possible N+1 %s: statement ran %d times: %s', label, count, statement[:max_length])
+
+
+@contextmanager
+def collect_sql_stats(label, app=None):
+    if not (app or current_app).config.get('SQL_INSTRUMENTATION', False):
+        # no engine listeners, nothing would be counted
+        yield None
+        return
+
+    stats = SQLStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+        report_sql_stats(label, stats, app)
+
+
+def _start_request_stats():
+    g.sql_stats = SQLStats()
+    g.sql_stats_token = _current_stats.set(g.sql_stats)
+
+
+def _finish_request_stats(response):
+    stats = g.pop('sql_stats', None)
+    if stats is None:
+        return response
+
+    if current_app.config.get('SQL_SERVER_TIMING', True):
+        server_timing = response.headers.get('Server-Timing')
+        response.headers['Server-Timing'] = f'{server_timing}, {stats.server_timing()}' if server_timing else stats.server_timing()
+
+    report_sql_stats(f'method={request.method} path={request.path} status={response.status_code}', stats)
+    return response
+
+
+def _reset_request_stats(exc=None):
+    token = g.pop('sql_stats_token', None)
+    if token is None:
+        return
+    try:
+        _current_stats.reset(token)
+    except ValueError:
+        # teardown of a streamed response may run in another context
+        _current_stats.set(None)
+
+
+def init_sql_instrumentation(app, engine):
+    if not app.config.get('SQL_INSTRUMENTATION', False):
+        return
+
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    app.before_request(_start_request_stats)
+    app.after_request(_finish_request_stats)
+    app.teardown_request(_reset_request_stats)
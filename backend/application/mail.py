@@ -1,9 +1,13 @@
+import base64
+import io
+import os
 import smtplib
+import threading
+import time
+from queue import LifoQueue, Empty, Full
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
-from email import encoders
-from jinja2 import Template
 
 
 SMTP_SERVER_HOST = "localhost"
@@ -11,8 +15,27 @@ SMTP_SERVER_PORT = 1025
 SENDER_ADDRESS = "househelpnow@donotreply.in"
 SENDER_PASSWORD = ""
 
+SMTP_TIMEOUT = 30
+SMTP_POOL_SIZE = 2                          # idle connections kept per worker process
+SMTP_MAX_MESSAGES_PER_CONNECTION = 100      # reconnect after this many messages, servers cap it
+SMTP_IDLE_CHECK_AFTER = 30                  # NOOP a pooled connection idle for longer (seconds)
+ATTACHMENT_CHUNK_SIZE = 57 * 1024           # bytes encoded at a time, a multiple of one 76 character base64 line
 
-def send_email(to_address, subject, message, content = "html", attachment_file = None):   #default content -> html
+
+# Messages go out over a per-process pool of logged in SMTP connections instead of a connect,
+# login and quit per message. A connection that dropped is replaced and the message is retried
+# once on the new one, `send_many` pushes a whole batch through one connection.
+
+def encode_attachment(path):
+    # base64 a chunk at a time, the raw file is never held in memory next to its encoding
+    encoded = io.StringIO()
+    with open(path, 'rb') as attachment:
+        for chunk in iter(lambda: attachment.read(ATTACHMENT_CHUNK_SIZE), b''):
+            encoded.write(base64.encodebytes(chunk).decode('ascii'))
+    return encoded.getvalue()
+
+
+def build_message(to_address, subject, message, content = "html", attachment_file = None):   #default content -> html
     msg = MIMEMultipart()
     msg['From'] = SENDER_ADDRESS
     msg['To'] = to_address
@@ -24,17 +47,137 @@ def send_email(to_address, subject, message, content = "html", attachment_file =
         msg.attach(MIMEText(message, "plain"))
 
     if attachment_file:
-        with open(attachment_file, 'rb') as attachment:
-            part = MIMEBase("application", "octet-stream") # Add file as application/octet-stream
-            part.set_payload(attachment.read())
-
-        encoders.encode_base64(part) # email attachments are sent as base64 encoded.
+        part = MIMEBase("application", "octet-stream") # Add file as application/octet-stream
+        part.set_payload(encode_attachment(attachment_file))
+        part['Content-Transfer-Encoding'] = 'base64' # email attachments are sent as base64 encoded.
         part.add_header("Content-Disposition", f"attachment; filename = {attachment_file}") # refer https://www.ietf.org/rtc/rtc2183.txt
         msg.attach(part) #add attachment to message
 
-    s = smtplib.SMTP(host = SMTP_SERVER_HOST, port = SMTP_SERVER_PORT)
-    s.login(SENDER_ADDRESS, SENDER_PASSWORD)
-    s.send_message(msg)
-    s.quit()
+    return msg
+
+
+class SMTPConnection:
+
+    def __init__(self, host, port, timeout):
+        self.smtp = smtplib.SMTP(host=host, port=port, timeout=timeout)
+        self.smtp.ehlo()
+        if self.smtp.has_extn('auth'):
+            self.smtp.login(SENDER_ADDRESS, SENDER_PASSWORD)
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+    def is_usable(self):
+        if self.sent >= SMTP_MAX_MESSAGES_PER_CONNECTION:
+            return False
+        if time.monotonic() - self.last_used < SMTP_IDLE_CHECK_AFTER:
+            return True
+        try:
+            return self.smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def send(self, msg):
+        self.smtp.send_message(msg)
+        self.sent += 1
+        self.last_used = time.monotonic()
+
+    def close(self):
+        try:
+            self.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self.smtp.close()
+
+
+class SMTPConnectionPool:
 
-    return True
\ No newline at end of file
+    def __init__(self, host=SMTP_SERVER_HOST, port=SMTP_SERVER_PORT, size=SMTP_POOL_SIZE, timeout=SMTP_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._idle = LifoQueue(maxsize=size)
+
+    def _connect(self):
+        return SMTPConnection(self.host, self.port, self.timeout)
+
+    def _checkout(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except Empty:
+                return self._connect()
+            if conn.is_usable():
+                return conn
+            conn.close()
+
+    def _checkin(self, conn):
+        try:
+            self._idle.put_nowait(conn)
+        except Full:
+            conn.close()
+
+    def send_many(self, messages):
+        """Send every message over pooled connections, returns one error (or None) per message."""
+        errors = []
+        conn = None
+        try:
+            for msg in messages:
+                for attempt in (1, 2):
+                    try:
+                        if conn is None or not conn.is_usable():
+                            if conn is not None:
+                                conn.close()
+                            conn = self._checkout()
+                        conn.send(msg)
+                        errors.append(None)
+                        break
+                    except (smtplib.SMTPServerDisconnected, OSError) as e:
+                        # dropped connection, retry once on a fresh one
+                        if conn is not None:
+                            conn.close()
+                        conn = None
+                        if attempt == 2:
+                            errors.append(e)
+                    except smtplib.SMTPException as e:
+                        # refused by the server, the connection itself is fine
+                        errors.append(e)
+                        break
+        finally:
+            if conn is not None:
+                self._checkin(conn)
+        return errors
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except Empty:
+                return
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    # celery prefork children must not share the parent's sockets, one pool per process
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool, _pool_pid = SMTPConnectionPool(), os.getpid()
+    return _pool
+
+
+def send_many(messages):
+    """Send `build_message` messages (or dicts of `send_email` arguments) in one go."""
+    messages = (build_message(**msg) if isinstance(msg, dict) else msg for msg in messages)
+    return get_pool().send_many(messages)
+
+
+def send_email(to_address, subject, message, content = "html", attachment_file = None):   #default content -> html
+    msg = build_message(to_address, subject, message, content=content, attachment_file=attachment_file)
+    error, = get_pool().send_many([msg])
+    if error is not None:
+        raise error
+    return True
@@ -2,6 +2,6 @@
 # main file for all models defined in our app are imported into single file
 
 from application.core.models import User, Role, Profile
-from application.admin.models import Admin, Category
-from application.providers.models import Provider, Service
+from application.admin.models import Admin, Category, CategoryStats
+from application.providers.models import Provider, Service, ServiceStats
 from application.customers.models import Customer, Booking, Payment, Review
\ No newline at end of file
@@ -1,13 +1,15 @@
 from flask import Blueprint
 from flask_restful import Api
+from application.representations import register_json_representation
 
 provider = Blueprint('provider', __name__)
 
 api = Api(provider)
+register_json_representation(api)
 
 
 
-from .resources import ProviderServiceListAPI, ProviderProfileAPI, ProviderServiceMgmtAPI, ProviderBookingListAPI, ProviderBookingMgmtAPI, ProviderClosedBookingCSVExport, ProviderClosedBookingTask, ProviderPaymentsListAPI
+from .resources import ProviderServiceListAPI, ProviderProfileAPI, ProviderServiceMgmtAPI, ProviderBookingListAPI, ProviderBookingMgmtAPI, ProviderClosedBookingCSVExport, ProviderClosedBookingTask, ProviderClosedBookingTaskEvents, ProviderPaymentsListAPI
 
 # services
 api.add_resource(ProviderServiceListAPI, '/services')
@@ -24,6 +26,8 @@ api.add_resource(ProviderClosedBookingCSVExport, '/bookings/csv-export')
 
 api.add_resource(ProviderClosedBookingTask, '/bookings/csv-export/<task_id>')
 
+api.add_resource(ProviderClosedBookingTaskEvents, '/bookings/csv-export/<task_id>/events')
+
 
 # profile
 api.add_resource(ProviderProfileAPI, '/profile')
@@ -21,6 +21,8 @@ class Provider(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint('user_id', 'category_id',  name='uq__providers__user_id__category_id'),
+        db.Index('ix__providers__category_id__is_approved__is_blocked', 'category_id', 'is_approved', 'is_blocked'),
+        db.Index('ix__providers__is_approved__is_blocked', 'is_approved', 'is_blocked'),
     )
 
     user = db.relationship('User', back_populates='provider')
@@ -47,4 +49,30 @@ class Service(db.Model):
     approved_at = db.Column(db.DateTime)
 
     provider = db.relationship('Provider', back_populates='services')
-    bookings = db.relationship('Booking', back_populates='service', lazy='dynamic')
\ No newline at end of file
+    bookings = db.relationship('Booking', back_populates='service', lazy='dynamic')
+    stats = db.relationship('ServiceStats', uselist=False, viewonly=True)
+
+    __table_args__ = (
+        db.Index('ix__services__prov_id__is_approved__is_blocked__is_active', 'prov_id', 'is_approved', 'is_blocked', 'is_active'),
+        db.Index('ix__services__is_approved__is_blocked__is_active', 'is_approved', 'is_blocked', 'is_active'),
+        db.Index('ix__services__is_approved__created_at', 'is_approved', 'created_at'),
+    )
+
+class ServiceStats(db.Model):
+    __tablename__ = 'service_stats'
+
+    service_id = db.Column(db.Integer, db.ForeignKey('services.id', name='fk__service_stats__services__service_id'), primary_key=True)
+    total_bookings = db.Column(db.Integer, nullable=False, default=0)   # served bookings, i.e. not pending, rejected or confirmed
+    active_bookings = db.Column(db.Integer, nullable=False, default=0)  # active or completed bookings
+    total_reviews = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+    @hybrid_property
+    def avg_rating(self):
+        return self.rating_sum / self.total_reviews if self.total_reviews else 0
+    
+    @avg_rating.expression
+    def avg_rating(cls):
+        return db.case((cls.total_reviews > 0, db.cast(cls.rating_sum, db.Float) / cls.total_reviews), else_=0)
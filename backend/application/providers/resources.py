@@ -5,20 +5,30 @@ from flask_restful import Resource
 from marshmallow import ValidationError
 from sqlalchemy.exc import SQLAlchemyError
 from application.extensions import db
-from .models import Service, Provider
+from .models import Service, Provider, ServiceStats
 from application.admin.models import Category
-from application.core.models import User
+from application.core.models import User, Profile
 from application.customers.models import Booking, Payment, Review
-from .schemas import ProviderSchema, ServiceSchema, CreateServiceSchema
-from application.customers.schemas import BookingSchema, CustomerSchema, PaymentSchema
+from .schemas import ProviderSchema, ServiceSchema, CreateServiceSchema, service_load_options
+from application.customers.schemas import BookingSchema, CustomerSchema, PaymentSchema, booking_load_options, payment_load_options
 from application.core.schemas import ProfileSchema, UserSchema
-from application.decorators import role_required
-from application.utils import error_response, success_response
+from application.decorators import role_required, conditional_response
+from application.caching import invalidate_service, invalidate_provider
+from application.utils import error_response, success_response, keyset_paginate, keyset_response_data, parse_bool
 from application.enums import BookingStatusEnum, PaymentStatusEnum, UserRoleEnum
 from application.tasks import provider_closed_bookings_csv_export
+from application.task_dedup import enqueue_once
+from application.task_progress import PROVIDER_OWNER, progress_response, record_task_owner, task_owner
 from celery.result import AsyncResult
+from application.serializers import get_schema, dump_rows, parse_fields, schema_fields, nested_fields, requested_extras
 
 
+service_schema = get_schema(ServiceSchema)
+booking_schema = get_schema(BookingSchema)
+booking_list_schema = get_schema(BookingSchema, exclude=['review'])
+provider_schema = get_schema(ProviderSchema, exclude=['services'])
+payment_schema = get_schema(PaymentSchema)
+
 
 class ProviderDashboardStatsAPI(Resource):
 
@@ -40,31 +50,17 @@ class ProviderServiceListAPI(Resource):
         paginated_data = (
           db.session.query(
             Service,
-            db.func.coalesce(
-              db.func.count(
-                  db.case(
-                      (Booking.status.in_([BookingStatusEnum.ACTIVE.value, BookingStatusEnum.COMPLETE.value]), Booking.id)
-                  )
-              ), 0
-            ).label('active_bookings'),
-            db.func.coalesce(
-                db.func.avg(Review.rating), 0
-            ).label('avg_rating')
+            db.func.coalesce(ServiceStats.active_bookings, 0).label('active_bookings'),
+            db.func.coalesce(ServiceStats.avg_rating, 0).label('avg_rating')
           )
           .filter(Service.prov_id == prov_id)
-          .outerjoin(Booking, Service.bookings)
-          .outerjoin(Review, Booking.review)
-          .group_by(Service.id)
+          .outerjoin(ServiceStats, Service.stats)
+          .options(*service_load_options())
+          .order_by(Service.id)
           .paginate(page=page, per_page=per_page, error_out=False)
         )
         
-        services = []
-        schema = ServiceSchema()
-        for service_obj, active_bookings, avg_rating in paginated_data:
-            service = schema.dump(service_obj)
-            service['active_bookings'] = active_bookings
-            service['avg_rating'] = avg_rating
-            services.append(service)
+        services = dump_rows(paginated_data, service_schema, 'active_bookings', 'avg_rating')
 
         data = {
             'no_of_services': paginated_data.total,
@@ -118,6 +114,7 @@ class ProviderServiceListAPI(Resource):
         )
         db.session.add(new_service)
         db.session.commit()
+        invalidate_service(new_service)
 
         return success_response(status_code=201)
     except ValidationError as err:
@@ -160,6 +157,7 @@ class ProviderServiceMgmtAPI(Resource):
 
       service.is_active = True
       db.session.commit()
+      invalidate_service(service)
       return success_response(status_code=204)         
 
     except SQLAlchemyError as e:
@@ -193,6 +191,7 @@ class ProviderServiceMgmtAPI(Resource):
 
       service.is_active = False
       db.session.commit()
+      invalidate_service(service)
       return success_response(status_code=204)         
 
     except SQLAlchemyError as e:
@@ -212,11 +211,20 @@ class ProviderBookingListAPI(Resource):
     page = request.args.get('page', default=1, type=int)
     per_page = current_app.config.get('ITEMS_PER_PAGE', 6)
     status = request.args.get('status', default=BookingStatusEnum.ACTIVE.value)
+    cursor = request.args.get('cursor')
+    with_total = request.args.get('with_total', default=False, type=parse_bool)
+    fields = parse_fields(request.args.get('fields'))
     
     if status not in [BookingStatusEnum.ACTIVE.value, BookingStatusEnum.PENDING.value]:
       return error_response('Invalid status for resource', status_code=400)
 
     try:
+      only, service_only = schema_fields(fields, 'service'), nested_fields(fields, 'service')
+      schema, service_dump_schema = booking_list_schema, service_schema
+      if fields is not None:
+        schema = get_schema(BookingSchema, exclude=['review'], only=only)
+        service_dump_schema = get_schema(ServiceSchema, only=service_only) if service_only is not None else service_schema
+
       query = (
         db.session.query(
           Booking,
@@ -224,6 +232,7 @@ class ProviderBookingListAPI(Resource):
         )
         .outerjoin(Service, Booking.service)
         .outerjoin(Provider, Service.provider)
+        .options(*booking_load_options(exclude=['review'], only=only), *service_load_options(only=service_only, joined=['provider']))
       )
 
       if status == BookingStatusEnum.ACTIVE.value:
@@ -238,20 +247,19 @@ class ProviderBookingListAPI(Resource):
           Provider.id==prov_id
         )
 
-      paginated = (
-        query
-        .order_by(Booking.id.desc())
-        .paginate(per_page=per_page, page=page, error_out=False)
-      )
+      if cursor is not None:
+        paginated = keyset_paginate(query, [Booking.id], cursor, per_page, with_total=with_total)
+      else:
+        paginated = (
+          query
+          .order_by(Booking.id.desc())
+          .paginate(per_page=per_page, page=page, error_out=False)
+        )
 
-      bookings = []
-      booking_schema = BookingSchema(exclude=['review'])
-      service_schema = ServiceSchema()
+      bookings = dump_rows(paginated, schema, *requested_extras(fields, ('service', service_dump_schema)))
 
-      for booking_obj, service_obj in paginated:
-        booking = booking_schema.dump(booking_obj)
-        booking['service'] = service_schema.dump(service_obj)
-        bookings.append(booking)
+      if cursor is not None:
+        return success_response(data=keyset_response_data(paginated, 'bookings', bookings, with_total))
 
       data={
         'bookings': bookings,
@@ -262,6 +270,8 @@ class ProviderBookingListAPI(Resource):
       }
 
       return success_response(data=data)
+    except ValueError as e:
+      return error_response(str(e), status_code=400)
     except SQLAlchemyError as e:
       print(e)
       return error_response('Something went wrong while fetching bookings')
@@ -290,8 +300,6 @@ class ProviderBookingMgmtAPI(Resource):
       if not booking:
         return error_response(f'Booking not exist with id {booking_id}', status_code=400)
       
-      booking_schema = BookingSchema()
-      service_schema = ServiceSchema()
       booking =  booking_schema.dump(booking)
       booking['service'] = service_schema.dump(service)
 
@@ -403,12 +411,12 @@ class ProviderClosedBookingCSVExport(Resource):
   @role_required(UserRoleEnum.PROVIDER.value)
   def post(self, prov_id):
     try:
-      task = provider_closed_bookings_csv_export.delay(prov_id)
+      task = enqueue_once(provider_closed_bookings_csv_export, prov_id)
+      record_task_owner(task.id, PROVIDER_OWNER.format(prov_id=prov_id))
       data = {
         'id': task.id,
         'status':  task.status 
       }
-      print(data)
       return success_response(data=data, status_code=202)
     except Exception as e:
       print(e)
@@ -421,6 +429,8 @@ class ProviderClosedBookingTask(Resource):
   @role_required(UserRoleEnum.PROVIDER.value)
   def get(self, prov_id, task_id):
     try:
+      if task_owner(task_id) != PROVIDER_OWNER.format(prov_id=prov_id):
+        return error_response('Task not found', status_code=404)
       task = AsyncResult(task_id)
 
       data = {
@@ -434,10 +444,38 @@ class ProviderClosedBookingTask(Resource):
       return error_response('Something went wrong, please try again..')
 
 
+class ProviderClosedBookingTaskEvents(Resource):
+
+  # text/event-stream of the export's progress, replaces polling ProviderClosedBookingTask
+  @jwt_required()
+  @role_required(UserRoleEnum.PROVIDER.value)
+  def get(self, prov_id, task_id):
+    try:
+      # only the provider's own exports, each stream holds a worker for up to TASK_PROGRESS_STREAM_TIMEOUT
+      if task_owner(task_id) != PROVIDER_OWNER.format(prov_id=prov_id):
+        return error_response('Task not found', status_code=404)
+      return progress_response(task_id)
+    except Exception as e:
+      print(e)
+      return error_response('Something went wrong, please try again..')
+
+
+def provider_profile_versions(prov_id):
+  return (
+    db.session.query(Provider.updated_at, User.updated_at, Profile.updated_at, Category.updated_at)
+    .join(User, Provider.user)
+    .outerjoin(Profile, User.profile)
+    .outerjoin(Category, Provider.category)
+    .filter(Provider.id == prov_id)
+    .first()
+  )
+
+
 class ProviderProfileAPI(Resource):
     
   @jwt_required()
   @role_required(UserRoleEnum.PROVIDER.value)
+  @conditional_response(version=provider_profile_versions, cache_control='private, no-cache')
   def get(self, prov_id):
     try:
       provider = (
@@ -454,9 +492,7 @@ class ProviderProfileAPI(Resource):
       if not provider:
         return error_response(f'Provider does not exist with id {prov_id}', status_code=400)
 
-      schema = ProviderSchema(exclude=['services'])
-
-      data = {'provider': schema.dump(provider)}
+      data = {'provider': provider_schema.dump(provider)}
       return success_response(data=data)
       
     except SQLAlchemyError as e:
@@ -489,6 +525,7 @@ class ProviderProfileAPI(Resource):
       profile.bio = bio
 
       db.session.commit()
+      invalidate_provider(provider)
       return success_response(status_code=201)
     except SQLAlchemyError as e:
       db.session.rollback()
@@ -506,28 +543,40 @@ class ProviderPaymentsListAPI(Resource):
   def get(self, prov_id):
     page = request.args.get('page', default=1, type=int)
     per_page = current_app.config.get('ITEMS_PER_PAGE', 6)
+    cursor = request.args.get('cursor')
+    with_total = request.args.get('with_total', default=False, type=parse_bool)
+    fields = parse_fields(request.args.get('fields'))
 
     try:
-      paginated = (
+      only = schema_fields(fields, 'service')
+      schema = get_schema(PaymentSchema, only=only) if fields is not None else payment_schema
+
+      query = (
         db.session.query(
           Payment,
-          Service,
+          Service.name,
         )
         .join(Booking, Payment.booking)
         .join(Service, Booking.service)
+        .options(*payment_load_options(only=only, joined=['booking']), db.undefer(Payment.created_at))
         .filter(
           Service.prov_id.is_(prov_id),
         )
-        .order_by(Payment.created_at.desc())
-        .paginate(page=page, per_page=per_page, error_out=False)
       )
 
-      payments = []
-      payment_schema = PaymentSchema()
-      for payment_obj, service in paginated:
-        payment = payment_schema.dump(payment_obj)
-        payment['service'] = service.name
-        payments.append(payment)
+      if cursor is not None:
+        paginated = keyset_paginate(query, [Payment.created_at, Payment.id], cursor, per_page, with_total=with_total)
+      else:
+        paginated = (
+          query
+          .order_by(Payment.created_at.desc())
+          .paginate(page=page, per_page=per_page, error_out=False)
+        )
+
+      payments = dump_rows(paginated, schema, *requested_extras(fields, 'service'))
+
+      if cursor is not None:
+        return success_response(data=keyset_response_data(paginated, 'payments', payments, with_total))
 
       data = {
         'payments':payments,
@@ -538,6 +587,8 @@ class ProviderPaymentsListAPI(Resource):
       }
 
       return success_response(data=data)
+    except ValueError as e:
+      return error_response(str(e), status_code=400)
     except SQLAlchemyError as e:
       return error_response('Something went wrong while fetching payments data!!')
     except Exception as e:
@@ -1,6 +1,8 @@
 from marshmallow import Schema, ValidationError, fields, validate, validates, pre_load
 from .models import Provider, Service
-from application.extensions import ma
+from application.extensions import ma, db
+from application.core.models import User
+from application.serializers import wants_field, nested_fields, load_only_options
 
 
 class ProviderSchema(ma.SQLAlchemyAutoSchema):
@@ -17,8 +19,7 @@ class ProviderSchema(ma.SQLAlchemyAutoSchema):
     location = fields.Method('get_location')
 
     def get_location(self, obj):
-        from application.core.schemas import ProfileSchema
-        return ProfileSchema(only=['location']).dump(obj.user.profile)['location']
+        return obj.user.profile.location if obj.user.profile else None
 
 
 class ServiceSchema(ma.SQLAlchemyAutoSchema):
@@ -33,6 +34,33 @@ class ServiceSchema(ma.SQLAlchemyAutoSchema):
     # bookings = fields.Nested('BookingSchema', dump_only=True, exclude=[])
 
 
+# Loader options matching what the schemas above dump, so a page of rows is dumped without lazy
+# loads. Pass `load=db.selectinload` when the query is grouped and cannot carry extra joins, and
+# the `only` the schema is built with to load just the columns and relationships it dumps.
+# Relationships the query already joins explicitly go in `joined`, they are filled from that join
+# (contains_eager) instead of a second, aliased one.
+
+def provider_load_options(load=db.joinedload, only=None):
+    options = []
+    if only is not None:
+        options.append(load_only_options(Provider, only, Provider.user_id, Provider.category_id))
+    if wants_field(only, 'user') or wants_field(only, 'location'):
+        options.append(load(Provider.user).joinedload(User.profile))
+    if wants_field(only, 'category'):
+        options.append(load(Provider.category))
+    return tuple(options)
+
+
+def service_load_options(load=db.joinedload, only=None, joined=()):
+    options = []
+    if only is not None:
+        options.append(load_only_options(Service, only, Service.prov_id))
+    if wants_field(only, 'provider'):
+        provider_load = db.contains_eager if 'provider' in joined else load
+        options.append(provider_load(Service.provider).options(*provider_load_options(only=nested_fields(only, 'provider'))))
+    return tuple(options)
+
+
 
 class CreateServiceSchema(Schema):
     name = fields.String(
@@ -0,0 +1,44 @@
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from flask import current_app, make_response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# JSON representation for every flask_restful Api in the app. Bodies are always compact (no
+# indentation, not even in debug), encoded with orjson when it is installed and with the
+# standard library otherwise. `RESTFUL_JSON_ENCODER = 'json'` forces the standard library.
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def _use_orjson():
+    return orjson is not None and current_app.config.get('RESTFUL_JSON_ENCODER', 'orjson') == 'orjson'
+
+
+def dumps(data):
+    if _use_orjson():
+        return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, default=_default, separators=(',', ':')).encode()
+
+
+def output_json(data, code, headers=None):
+    resp = make_response(dumps(data), code)
+    resp.headers.extend(headers or {})
+    resp.headers['Content-Type'] = 'application/json'
+    return resp
+
+
+def register_json_representation(api):
+    api.representations['application/json'] = output_json
+    return api
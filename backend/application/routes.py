@@ -1,4 +1,5 @@
-from flask import Blueprint, jsonify, render_template, send_from_directory
+from flask import Blueprint, jsonify, render_template, request, send_from_directory
+from .utils import parse_bool, error_response
 
 
 home_bp = Blueprint('home', __name__)
@@ -27,12 +28,27 @@ def serve(filename):
 # celery experiment
 
 from celery.result import AsyncResult
+from flask_jwt_extended import jwt_required
 from .tasks import provider_closed_bookings_csv_export, admin_closed_booking_batch_csv_export
+from .task_dedup import enqueue_once
+from .task_progress import PROVIDER_OWNER, progress_response, record_task_owner
+from .exports import EXPORT_FORMATS, parquet_available
+from .decorators import role_required
+from .enums import UserRoleEnum
 
 
 @home_bp.route('/admin/bookings/csv-exports')
+@jwt_required()
+@role_required(UserRoleEnum.ADMIN.value)
 def batch_export():
-  task = admin_closed_booking_batch_csv_export.delay()
+  format = request.args.get('format', 'csv')
+  if format not in EXPORT_FORMATS:
+    return error_response(f"format must be one of {', '.join(EXPORT_FORMATS)}", status_code=400)
+  if format == 'parquet' and not parquet_available():
+    return error_response('Parquet exports need pyarrow installed on the server', status_code=400)
+
+  compress = format == 'csv' and parse_bool(request.args.get('gzip', False))
+  task = enqueue_once(admin_closed_booking_batch_csv_export, compress=compress, format=format)
   return {
      'id': task.id
   }
@@ -41,8 +57,12 @@ def batch_export():
 
 
 @home_bp.route('/exports/<int:prov_id>')
+@jwt_required()
+@role_required(UserRoleEnum.ADMIN.value)
 def export_bookings_csv(prov_id):
-  task = provider_closed_bookings_csv_export.delay(prov_id)
+  task = enqueue_once(provider_closed_bookings_csv_export, prov_id)
+  # the provider may follow the export it shares with this one
+  record_task_owner(task.id, PROVIDER_OWNER.format(prov_id=prov_id))
   return {
     'id': task.id
   }
@@ -58,6 +78,13 @@ def send_csv_export(task_id):
   }
 
 
+@home_bp.route('/downloads/<task_id>/events')
+@jwt_required()
+@role_required(UserRoleEnum.ADMIN.value)
+def stream_csv_export(task_id):
+  return progress_response(task_id)
+
+
   # task = closed_bookings.delay()
   # return {
   #   'id': task.id
@@ -0,0 +1,151 @@
+import threading
+
+from marshmallow import fields
+from sqlalchemy import inspect
+from sqlalchemy.orm import load_only
+
+
+# Schemas are built once per (schema, exclude, only) combination and shared, dumping never
+# mutates a schema instance so the same one is safe to use from every request. Nested schemas
+# are resolved the first time a shared instance is used and stay cached on it afterwards.
+
+_schemas = {}
+_row_serializers = {}
+_lock = threading.Lock()
+
+# `only` comes from the `fields=` query arg, past this many combinations schemas are built per call
+MAX_REGISTERED_SCHEMAS = 256
+
+
+def _registry_key(schema_cls, exclude, only):
+    return schema_cls, tuple(sorted(exclude or ())), tuple(only) if only is not None else None
+
+
+def _get_or_build(registry, key, build):
+    value = registry.get(key)
+    if value is not None:
+        return value
+    if len(registry) >= MAX_REGISTERED_SCHEMAS:
+        return build()
+    with _lock:
+        value = registry.get(key)
+        if value is None:
+            value = registry[key] = build()
+    return value
+
+
+def get_schema(schema_cls, exclude=(), only=None):
+    return _get_or_build(
+        _schemas, _registry_key(schema_cls, exclude, only),
+        lambda: schema_cls(exclude=tuple(exclude or ()), only=only)
+    )
+
+
+def dump_rows(rows, schema, *extras):
+    """Dump result rows of `(obj, *values)` with one `many=True` call.
+
+    Each extra names the key the matching value is stored under, or is a `(key, schema)` pair
+    when that value is another entity to dump, e.g.
+    `dump_rows(page, booking_schema, ('service', service_schema))`. None skips that value.
+    """
+    rows = list(rows)
+    data = schema.dump([row[0] for row in rows], many=True)
+
+    for position, extra in enumerate(extras, start=1):
+        if extra is None:
+            continue
+        key, extra_schema = extra if isinstance(extra, tuple) else (extra, None)
+        values = [row[position] for row in rows]
+        if extra_schema is not None:
+            values = extra_schema.dump(values, many=True)
+        for item, value in zip(data, values):
+            item[key] = value
+
+    return data
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+class RowSerializer:
+    """Fast path for flat pages: select `columns` instead of the entity and `dump` the tuples.
+
+    Only schemas whose dumped fields are all plain columns qualify. The output matches
+    `schema.dump(obj)` for the same row, without building objects or going through Marshmallow.
+    """
+
+    def __init__(self, schema):
+        model = schema.opts.model
+        column_attrs = inspect(model).column_attrs
+
+        self.names = []
+        self.columns = []
+        self.converters = []
+        for name, field in schema.dump_fields.items():
+            attribute = field.attribute or name
+            if attribute not in column_attrs:
+                raise ValueError(f'{type(schema).__name__}.{name} is not a plain column of {model.__name__}')
+            self.names.append(field.data_key or name)
+            self.columns.append(getattr(model, attribute))
+            self.converters.append(_isoformat if isinstance(field, (fields.DateTime, fields.Date, fields.Time)) else None)
+
+    def dump(self, rows, *extras):
+        size = len(self.names)
+        fields_ = list(zip(range(size), self.names, self.converters))
+        extra_fields = [(i, key) for i, key in enumerate(extras, start=size) if key is not None]
+
+        data = []
+        for row in rows:
+            item = {name: converter(row[i]) if converter else row[i] for i, name, converter in fields_}
+            for i, key in extra_fields:
+                item[key] = row[i]
+            data.append(item)
+        return data
+
+
+def get_row_serializer(schema_cls, exclude=(), only=None):
+    return _get_or_build(
+        _row_serializers, _registry_key(schema_cls, exclude, only),
+        lambda: RowSerializer(schema_cls(exclude=tuple(exclude or ()), only=only))
+    )
+
+
+# Sparse fieldsets: `?fields=id,name,provider.user.username` narrows a dump to those fields, dotted
+# names reach into nested schemas. A fieldset of None means every field.
+
+def parse_fields(value):
+    if value is None:
+        return None
+    names = {name.strip() for name in value.split(',') if name.strip()}
+    return tuple(sorted(names)) if names else None
+
+
+def wants_field(fields, name):
+    return fields is None or name in fields or any(field.startswith(f'{name}.') for field in fields)
+
+
+def nested_fields(fields, name):
+    """Fieldset for the nested `name`, None when all of it is wanted."""
+    if fields is None or name in fields:
+        return None
+    return tuple(field[len(name) + 1:] for field in fields if field.startswith(f'{name}.'))
+
+
+def schema_fields(fields, *extras):
+    """`only` for the main schema of a row, i.e. the fieldset minus the extra row values."""
+    if fields is None:
+        return None
+    return tuple(field for field in fields if field.split('.', 1)[0] not in extras)
+
+
+def requested_extras(fields, *extras):
+    """The extras for dump_rows, with None in place of those the fieldset leaves out."""
+    return tuple(extra if wants_field(fields, extra if isinstance(extra, str) else extra[0]) else None for extra in extras)
+
+
+def load_only_options(model, fields, *required):
+    """load_only() for the plain columns in `fields`, plus the keys the caller's loaders need."""
+    column_attrs = inspect(model).column_attrs
+    columns = [getattr(model, field) for field in fields or () if field in column_attrs]
+    return load_only(model.id, *columns, *required)
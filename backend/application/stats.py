@@ -0,0 +1,372 @@
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from application.extensions import db
+from application.admin.models import Category, CategoryStats
+from application.providers.models import Provider, Service, ServiceStats
+from application.customers.models import Booking, Payment, Review
+from application.enums import BookingStatusEnum, PaymentStatusEnum
+
+
+# rollup tables are kept in sync by an after_flush hook, so every endpoint which moderates a provider or
+# service, changes a booking/payment status or adds a review updates the stats inside its own transaction.
+# `flask rebuild-service-stats` and `flask rebuild-category-stats` recompute them from scratch when drift
+# is suspected. Rows are written with INSERT .. ON CONFLICT DO UPDATE, so two first writes for the same
+# service or category cannot collide on the primary key.
+
+SERVICE_STATS_COUNTERS = ('total_bookings', 'active_bookings', 'total_reviews', 'rating_sum')
+CATEGORY_STATS_COUNTERS = ('active_providers', 'active_services', 'total_bookings', 'total_revenue')
+
+NOT_SERVED_BOOKING_STATUSES = [BookingStatusEnum.PENDING.value, BookingStatusEnum.REJECT.value, BookingStatusEnum.CONFIRM.value]
+ACTIVE_BOOKING_STATUSES = [BookingStatusEnum.ACTIVE.value, BookingStatusEnum.COMPLETE.value]
+
+PROVIDER_MODERATION_ATTRS = ('is_approved', 'is_blocked', 'category_id')
+SERVICE_MODERATION_ATTRS = ('is_approved', 'is_blocked', 'is_active', 'prov_id')
+
+# what the deltas of a deleted row need, loaded before the flush removes the row
+DELETED_STATS_ATTRS = {
+    Booking: ('service_id', 'status'),
+    Review: ('booking_id', 'rating'),
+    Payment: ('booking_id', 'status', 'commission_fee', 'platform_fee', 'transaction_fee'),
+}
+
+UPSERT_DIALECTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def is_served_booking(status):
+    return status is not None and status not in NOT_SERVED_BOOKING_STATUSES
+
+
+def is_active_booking(status):
+    return status in ACTIVE_BOOKING_STATUSES
+
+
+def is_paid_payment(status):
+    return status == PaymentStatusEnum.PAID.value
+
+
+def _attr_change(obj, attr):
+    history = db.inspect(obj).attrs[attr].history
+    if not history.has_changes():
+        return None
+    old_value = history.deleted[0] if history.deleted else None
+    new_value = history.added[0] if history.added else None
+    return old_value, new_value
+
+
+def _status_change(obj, is_new, default_status):
+    if is_new:
+        return None, obj.status or default_status
+
+    change = _attr_change(obj, 'status')
+    if not change or change[0] is None:
+        return None
+    return change
+
+
+def _is_moderated(obj, is_new, attrs):
+    return is_new or any(_attr_change(obj, attr) for attr in attrs)
+
+
+def _deleted_booking_services(session):
+    # bookings deleted in this flush can no longer be looked up
+    return {obj.id: obj.service_id for obj in session.deleted if isinstance(obj, Booking)}
+
+
+def _service_id_for_booking(connection, booking_id, deleted_bookings=None):
+    if deleted_bookings and booking_id in deleted_bookings:
+        return deleted_bookings[booking_id]
+    return connection.execute(
+        db.select(Booking.service_id).filter(Booking.id == booking_id)
+    ).scalar()
+
+
+def _category_id_for_service(connection, service_id):
+    return connection.execute(
+        db.select(Provider.category_id)
+        .join(Service, Provider.services)
+        .filter(Service.id == service_id)
+    ).scalar()
+
+
+def _category_id_for_booking(connection, booking_id, deleted_bookings=None):
+    if deleted_bookings and booking_id in deleted_bookings:
+        return _category_id_for_service(connection, deleted_bookings[booking_id])
+    return connection.execute(
+        db.select(Provider.category_id)
+        .join(Service, Provider.services)
+        .join(Booking, Service.bookings)
+        .filter(Booking.id == booking_id)
+    ).scalar()
+
+
+def _upsert_stats(connection, model, key, counters, values, increment=True):
+    table = model.__table__
+    now = datetime.now()
+
+    for key_value, row_values in values.items():
+        if increment:
+            row_values = {counter: value for counter, value in row_values.items() if value}
+        if not key_value or not row_values:
+            continue
+
+        row = {counter: 0 for counter in counters}
+        row.update(row_values)
+        statement = UPSERT_DIALECTS[connection.dialect.name](table).values(updated_at=now, **{key: key_value}, **row)
+        if increment:
+            update_values = {counter: table.c[counter] + statement.excluded[counter] for counter in row_values}
+        else:
+            update_values = {counter: statement.excluded[counter] for counter in row_values}
+
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=[table.c[key]],
+            set_=dict(updated_at=now, **update_values)
+        ))
+
+
+def collect_service_stats_deltas(session, connection):
+    deltas = defaultdict(lambda: defaultdict(int))
+
+    for obj, is_new in [(obj, True) for obj in session.new] + [(obj, False) for obj in session.dirty]:
+        if isinstance(obj, Booking):
+            change = _status_change(obj, is_new, BookingStatusEnum.PENDING.value)
+            if not change:
+                continue
+            old_status, new_status = change
+            delta = deltas[obj.service_id]
+            delta['total_bookings'] += int(is_served_booking(new_status)) - int(is_served_booking(old_status))
+            delta['active_bookings'] += int(is_active_booking(new_status)) - int(is_active_booking(old_status))
+
+        elif isinstance(obj, Review):
+            if is_new:
+                delta = deltas[_service_id_for_booking(connection, obj.booking_id)]
+                delta['total_reviews'] += 1
+                delta['rating_sum'] += obj.rating or 0
+            else:
+                change = _attr_change(obj, 'rating')
+                if change and change[0] is not None:
+                    deltas[_service_id_for_booking(connection, obj.booking_id)]['rating_sum'] += (change[1] or 0) - change[0]
+
+    deleted_bookings = _deleted_booking_services(session)
+    for obj in session.deleted:
+        if isinstance(obj, Booking):
+            delta = deltas[obj.service_id]
+            delta['total_bookings'] -= int(is_served_booking(obj.status))
+            delta['active_bookings'] -= int(is_active_booking(obj.status))
+
+        elif isinstance(obj, Review):
+            delta = deltas[_service_id_for_booking(connection, obj.booking_id, deleted_bookings)]
+            delta['total_reviews'] -= 1
+            delta['rating_sum'] -= obj.rating or 0
+
+    return deltas
+
+
+def collect_category_stats_changes(session, connection):
+    deltas = defaultdict(lambda: defaultdict(int))
+    moderated_category_ids = set()
+
+    for obj, is_new in [(obj, True) for obj in session.new] + [(obj, False) for obj in session.dirty]:
+        if isinstance(obj, Provider) and _is_moderated(obj, is_new, PROVIDER_MODERATION_ATTRS):
+            moderated_category_ids.add(obj.category_id)
+            category_change = _attr_change(obj, 'category_id')
+            if category_change and category_change[0]:
+                moderated_category_ids.add(category_change[0])
+
+        elif isinstance(obj, Service) and _is_moderated(obj, is_new, SERVICE_MODERATION_ATTRS):
+            moderated_category_ids.add(_category_id_for_service(connection, obj.id))
+
+        elif isinstance(obj, Booking):
+            change = _status_change(obj, is_new, BookingStatusEnum.PENDING.value)
+            if not change:
+                continue
+            old_status, new_status = change
+            delta = int(is_active_booking(new_status)) - int(is_active_booking(old_status))
+            if delta:
+                deltas[_category_id_for_service(connection, obj.service_id)]['total_bookings'] += delta
+
+        elif isinstance(obj, Payment):
+            change = _status_change(obj, is_new, PaymentStatusEnum.PENDING.value)
+            if not change:
+                continue
+            old_status, new_status = change
+            delta = int(is_paid_payment(new_status)) - int(is_paid_payment(old_status))
+            if delta:
+                deltas[_category_id_for_booking(connection, obj.booking_id)]['total_revenue'] += delta * obj.final_admin_amount
+
+    deleted_bookings = _deleted_booking_services(session)
+    for obj in session.deleted:
+        if isinstance(obj, Booking) and is_active_booking(obj.status):
+            deltas[_category_id_for_service(connection, obj.service_id)]['total_bookings'] -= 1
+
+        elif isinstance(obj, Payment) and is_paid_payment(obj.status):
+            category_id = _category_id_for_booking(connection, obj.booking_id, deleted_bookings)
+            deltas[category_id]['total_revenue'] -= obj.final_admin_amount
+
+    return deltas, moderated_category_ids
+
+
+def _active_providers_query(category_ids):
+    return (
+        db.select(Provider.category_id, db.func.count(Provider.id))
+        .filter(
+            Provider.category_id.in_(category_ids),
+            Provider.is_approved.is_(True),
+            Provider.is_blocked.is_(False)
+        )
+        .group_by(Provider.category_id)
+    )
+
+
+def _active_services_query(category_ids):
+    return (
+        db.select(Provider.category_id, db.func.count(Service.id))
+        .join(Service, Provider.services)
+        .filter(
+            Provider.category_id.in_(category_ids),
+            Provider.is_approved.is_(True),
+            Provider.is_blocked.is_(False),
+            Service.is_approved.is_(True),
+            Service.is_blocked.is_(False),
+            Service.is_active.is_(True)
+        )
+        .group_by(Provider.category_id)
+    )
+
+
+def recount_category_moderation_stats(connection, category_ids):
+    category_ids = [category_id for category_id in category_ids if category_id]
+    if not category_ids:
+        return {}
+
+    active_providers = dict(connection.execute(_active_providers_query(category_ids)).all())
+    active_services = dict(connection.execute(_active_services_query(category_ids)).all())
+
+    return {
+        category_id: {
+            'active_providers': active_providers.get(category_id, 0),
+            'active_services': active_services.get(category_id, 0)
+        }
+        for category_id in category_ids
+    }
+
+
+def _load_old_value(target, value, old_value, initiator):
+    pass
+
+
+# the deltas need the value an attribute had before, also when it is set on an expired object
+for attribute in (
+    Booking.status, Payment.status, Review.rating,
+    *[getattr(Provider, attr) for attr in PROVIDER_MODERATION_ATTRS],
+    *[getattr(Service, attr) for attr in SERVICE_MODERATION_ATTRS],
+):
+    db.event.listen(attribute, 'set', _load_old_value, active_history=True)
+
+
+@db.event.listens_for(db.session, 'before_flush')
+def load_deleted_stats_attrs(session, flush_context, instances):
+    for obj in session.deleted:
+        for attr in DELETED_STATS_ATTRS.get(type(obj), ()):
+            getattr(obj, attr)
+
+
+@db.event.listens_for(db.session, 'after_flush')
+def update_stats_after_flush(session, flush_context):
+    connection = session.connection()
+
+    service_deltas = collect_service_stats_deltas(session, connection)
+    _upsert_stats(connection, ServiceStats, 'service_id', SERVICE_STATS_COUNTERS, service_deltas)
+
+    category_deltas, moderated_category_ids = collect_category_stats_changes(session, connection)
+    _upsert_stats(connection, CategoryStats, 'category_id', CATEGORY_STATS_COUNTERS, category_deltas)
+    _upsert_stats(
+        connection, CategoryStats, 'category_id', CATEGORY_STATS_COUNTERS,
+        recount_category_moderation_stats(connection, moderated_category_ids),
+        increment=False
+    )
+
+
+def compute_service_stats():
+    rows = (
+        db.session.query(
+            Service.id,
+            db.func.count(
+                db.case((Booking.status.notin_(NOT_SERVED_BOOKING_STATUSES), Booking.id))
+            ),
+            db.func.count(
+                db.case((Booking.status.in_(ACTIVE_BOOKING_STATUSES), Booking.id))
+            ),
+            db.func.count(Review.id),
+            db.func.coalesce(db.func.sum(Review.rating), 0)
+        )
+        .outerjoin(Booking, Service.bookings)
+        .outerjoin(Review, Booking.review)
+        .group_by(Service.id)
+        .all()
+    )
+    return {service_id: dict(zip(SERVICE_STATS_COUNTERS, counters)) for service_id, *counters in rows}
+
+
+def compute_category_stats():
+    category_ids = [category_id for category_id, in db.session.query(Category.id).all()]
+    stats = recount_category_moderation_stats(db.session.connection(), category_ids)
+
+    rows = (
+        db.session.query(
+            Category.id,
+            db.func.count(
+                db.case((Booking.status.in_(ACTIVE_BOOKING_STATUSES), Booking.id))
+            ),
+            db.func.coalesce(
+                db.func.sum(
+                    db.case((Payment.status == PaymentStatusEnum.PAID.value, Payment.final_admin_amount))
+                ), 0
+            )
+        )
+        .outerjoin(Provider, Category.providers)
+        .outerjoin(Service, Provider.services)
+        .outerjoin(Booking, Service.bookings)
+        .outerjoin(Payment, Booking.payment)
+        .group_by(Category.id)
+        .all()
+    )
+    for category_id, total_bookings, total_revenue in rows:
+        stats[category_id].update(total_bookings=total_bookings, total_revenue=total_revenue)
+
+    return {category_id: {counter: counters[counter] for counter in CATEGORY_STATS_COUNTERS} for category_id, counters in stats.items()}
+
+
+def _rebuild_stats(model, key, counters, expected, dry_run):
+    stored = {
+        getattr(stats, key): {counter: getattr(stats, counter) for counter in counters}
+        for stats in model.query.all()
+    }
+    zero = {counter: 0 for counter in counters}
+
+    drift = {}
+    for key_value in expected.keys() | stored.keys():
+        expected_counters = expected.get(key_value, zero)
+        stored_counters = stored.get(key_value, zero)
+        if expected_counters != stored_counters:
+            drift[key_value] = (stored_counters, expected_counters)
+
+    if not dry_run:
+        now = datetime.now()
+        db.session.execute(model.__table__.delete())
+        rows = [dict(updated_at=now, **{key: key_value}, **values) for key_value, values in expected.items()]
+        if rows:
+            db.session.execute(model.__table__.insert(), rows)
+        db.session.commit()
+
+    return drift
+
+
+def rebuild_service_stats(dry_run=False):
+    return _rebuild_stats(ServiceStats, 'service_id', SERVICE_STATS_COUNTERS, compute_service_stats(), dry_run)
+
+
+def rebuild_category_stats(dry_run=False):
+    return _rebuild_stats(CategoryStats, 'category_id', CATEGORY_STATS_COUNTERS, compute_category_stats(), dry_run)
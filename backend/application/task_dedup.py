@@ -0,0 +1,91 @@
+import hashlib
+import json
+import os
+import uuid
+
+import redis
+from celery.result import AsyncResult
+from flask import current_app
+
+
+# Idempotent enqueue for tasks users can trigger repeatedly (exports). `enqueue_once` keys the
+# call by task name and arguments in Redis: while a run is in flight the same call gets its task
+# id back instead of a new job, and after it succeeded the result is handed out again for
+# TASK_DEDUP_RESULT_TIMEOUT. Failed runs free the key right away. The key carries its own
+# TASK_DEDUP_INFLIGHT_TIMEOUT so a worker that died mid-task cannot block the call for good.
+
+DEDUP_KEY = 'task-dedup:{name}:{digest}'
+DEDUP_HEADER = 'dedup_key'
+
+IN_FLIGHT_STATES = ('PENDING', 'RECEIVED', 'STARTED', 'RETRY', 'PROGRESS')
+
+_client = None
+_client_pid = None
+
+
+def _redis():
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        url = current_app.config.get('TASK_DEDUP_REDIS_URL') or current_app.config.get('CACHE_REDIS_URL')
+        _client, _client_pid = redis.Redis.from_url(url, decode_responses=True), os.getpid()
+    return _client
+
+
+def _delete_if_equal(client, key, task_id):
+    # WATCH/MULTI: the key is only dropped while it still names this task
+    def delete(pipe):
+        if pipe.get(key) == task_id:
+            pipe.multi()
+            pipe.delete(key)
+    client.transaction(delete, key)
+
+
+def dedup_key(task_name, args=(), kwargs=None):
+    payload = json.dumps([list(args), kwargs or {}], sort_keys=True, default=str)
+    return DEDUP_KEY.format(name=task_name, digest=hashlib.sha256(payload.encode()).hexdigest()[:32])
+
+
+def enqueue_once(task, *args, **kwargs):
+    """`task.delay(*args, **kwargs)` unless the same call is in flight or recently succeeded."""
+    key = dedup_key(task.name, args, kwargs)
+    inflight_timeout = current_app.config.get('TASK_DEDUP_INFLIGHT_TIMEOUT', 900)
+
+    try:
+        client = _redis()
+        for _ in range(3):
+            task_id = client.get(key)
+            if task_id is not None:
+                result = AsyncResult(task_id, app=task.app)
+                if result.state in IN_FLIGHT_STATES or result.state == 'SUCCESS':
+                    return result
+                # failed or revoked, let this call run it again
+                client.delete(key)
+
+            task_id = str(uuid.uuid4())
+            if client.set(key, task_id, nx=True, ex=inflight_timeout):
+                try:
+                    return task.apply_async(args, kwargs, task_id=task_id, headers={DEDUP_HEADER: key})
+                except Exception:
+                    # never enqueued, its PENDING id must not be handed out to the retries
+                    try:
+                        _delete_if_equal(client, key, task_id)
+                    except redis.RedisError:
+                        current_app.logger.exception('Could not free task dedup key %s', key)
+                    raise
+    except redis.RedisError:
+        current_app.logger.exception('Task dedup unavailable, enqueueing %s without it', task.name)
+
+    return task.apply_async(args, kwargs)
+
+
+def release_dedup_key(key, task_id, succeeded):
+    """Called once a deduplicated task finished, keeps a successful result around for reuse."""
+    result_timeout = current_app.config.get('TASK_DEDUP_RESULT_TIMEOUT', 300)
+    try:
+        client = _redis()
+        if not (succeeded and result_timeout):
+            _delete_if_equal(client, key, task_id)
+        elif client.get(key) == task_id:
+            client.set(key, task_id, xx=True, ex=result_timeout)
+    except redis.RedisError:
+        current_app.logger.exception('Could not release task dedup key %s', key)
@@ -0,0 +1,145 @@
+import json
+import os
+import time
+
+import redis
+from celery.result import AsyncResult
+from flask import Response, current_app, stream_with_context
+
+
+# Live progress for long running tasks (exports, monthly reports). A `ProgressReporter` stores the
+# progress with `update_state` (so a plain status lookup sees it too) and publishes it on the
+# task's Redis channel, at most every TASK_PROGRESS_INTERVAL seconds. FlaskTask publishes the
+# final state once the task returned. `stream_progress` turns the channel into Server-Sent Events,
+# the client keeps one open response instead of polling the status endpoint.
+
+PROGRESS_CHANNEL = 'task-progress:{task_id}'
+# who may follow a task, recorded when it is enqueued
+OWNER_KEY = 'task-owner:{task_id}'
+PROVIDER_OWNER = 'provider:{prov_id}'
+
+READY_STATES = ('SUCCESS', 'FAILURE', 'REVOKED')
+
+_client = None
+_client_pid = None
+
+
+def _redis():
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        url = current_app.config.get('TASK_PROGRESS_REDIS_URL') or current_app.config.get('CACHE_REDIS_URL')
+        _client, _client_pid = redis.Redis.from_url(url, decode_responses=True), os.getpid()
+    return _client
+
+
+def record_task_owner(task_id, owner):
+    timeout = current_app.config.get('TASK_OWNER_TIMEOUT', 86400)
+    try:
+        _redis().set(OWNER_KEY.format(task_id=task_id), owner, ex=timeout)
+    except redis.RedisError:
+        current_app.logger.warning('Could not record the owner of task %s', task_id, exc_info=True)
+
+
+def task_owner(task_id):
+    return _redis().get(OWNER_KEY.format(task_id=task_id))
+
+
+def progress_event(task_id, state, meta=None):
+    return {'id': task_id, 'status': state, 'progress': meta if state not in READY_STATES else None}
+
+
+def publish_state(task_id, state, meta=None, result=None):
+    event = progress_event(task_id, state, meta)
+    if state in READY_STATES:
+        event['result'] = result if state == 'SUCCESS' else str(result)
+    try:
+        _redis().publish(PROGRESS_CHANNEL.format(task_id=task_id), json.dumps(event, default=str))
+    except redis.RedisError:
+        current_app.logger.warning('Could not publish progress of task %s', task_id, exc_info=True)
+
+
+class ProgressReporter:
+
+    def __init__(self, task, total=None, stage=None, interval=None):
+        self.task = task
+        self.total = total
+        self.stage = stage
+        self.processed = 0
+        self.interval = current_app.config.get('TASK_PROGRESS_INTERVAL', 1.0) if interval is None else interval
+        self.started = time.monotonic()
+        self._reported = None
+
+    def meta(self, **extra):
+        elapsed = time.monotonic() - self.started
+        eta = None
+        if self.total and self.processed:
+            eta = round(elapsed / self.processed * max(self.total - self.processed, 0), 1)
+        meta = {'processed': self.processed, 'total': self.total, 'elapsed_s': round(elapsed, 1), 'eta_s': eta}
+        if self.stage:
+            meta['stage'] = self.stage
+        return {**meta, **extra}
+
+    def advance(self, count=1):
+        self.processed += count
+        if self._reported is None or time.monotonic() - self._reported >= self.interval:
+            self.report()
+
+    def report(self, **extra):
+        self._reported = time.monotonic()
+        task_id = self.task.request.id
+        if task_id is None:
+            # called directly, not as a task
+            return
+        meta = self.meta(**extra)
+        self.task.update_state(state='PROGRESS', meta=meta)
+        publish_state(task_id, 'PROGRESS', meta)
+
+
+def _sse(event):
+    return f"event: {event['status'].lower()}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+def stream_progress(task_id, timeout=None, heartbeat=None):
+    """Server-Sent Events of the task's progress, ends with its final state or after `timeout`."""
+    timeout = timeout or current_app.config.get('TASK_PROGRESS_STREAM_TIMEOUT', 600)
+    heartbeat = heartbeat or current_app.config.get('TASK_PROGRESS_HEARTBEAT', 15)
+    client = _redis()
+
+    def events():
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        try:
+            # subscribe before reading the current state, nothing published in between is lost
+            pubsub.subscribe(PROGRESS_CHANNEL.format(task_id=task_id))
+            task = AsyncResult(task_id)
+            state, info = task.state, task.info
+            event = progress_event(task_id, state, info if isinstance(info, dict) else None)
+            if state in READY_STATES:
+                event['result'] = info if state == 'SUCCESS' else str(info)
+            yield _sse(event)
+            if state in READY_STATES:
+                return
+
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                message = pubsub.get_message(timeout=min(heartbeat, max(deadline - time.monotonic(), 0)))
+                if message is None:
+                    # keeps proxies from closing an idle response
+                    yield ': keep-alive\n\n'
+                    continue
+                event = json.loads(message['data'])
+                yield _sse(event)
+                if event['status'] in READY_STATES:
+                    return
+            yield _sse({'id': task_id, 'status': 'TIMEOUT', 'progress': None})
+        finally:
+            pubsub.close()
+
+    return events()
+
+
+def progress_response(task_id):
+    return Response(
+        stream_with_context(stream_progress(task_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
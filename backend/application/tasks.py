@@ -1,157 +1,293 @@
-import csv
 import time
-from celery import shared_task
+from celery import chord, shared_task
 from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
+from flask import current_app
 from application.extensions import db
+from application.core.models import User
 from application.admin.models import Category
 from application.providers.models import Provider, Service
-from application.customers.models import Booking, Customer
-from application.customers.schemas import BookingSchema
-from application.providers.schemas import ServiceSchema
-from .mail import send_email
-from .utils import format_report
-
-
-@shared_task(ignore_result=False, name='provider_closed_bookings_csv_export')
-def provider_closed_bookings_csv_export(prov_id):
-    provider = Provider.query.filter_by(id=prov_id).first()
-    prov_services = provider.services.all()
-    prov_closed_bookings = []
-    booking_schema = BookingSchema(exclude=['review'])
-
-    for service in prov_services:
-        service_name = service.name
-        service_bookings = service.bookings.all()
-
-        for booking in service_bookings:
-            if booking.is_closed:
-                closed_booking = booking_schema.dump(booking)
-                closed_booking['service'] = service_name
-                prov_closed_bookings.append(closed_booking)
-    
-    csv_file_name = f"ProvID_{prov_id}_closed_bookings_{datetime.now().strftime('%f')}.csv" 
-
-    with open(f'static/{csv_file_name}', 'w', newline = "") as csvfile:
-
-        closed_booking_csv = csv.writer(csvfile, delimiter = ',')
-        closed_booking_csv.writerow(['Booking ID','Service','Customer','Booking Date','Closed Date','Commission','Booking Amount','Final Amount'])
-
-        for booking in prov_closed_bookings:
-            booking_id = booking.get('id')
-            service_name = booking.get('service')
-            customer = booking.get('customer').get('user').get('username')
-            booking_date = booking.get('book_date')
-            closed_date = booking.get('closed_date')
-            commission = booking.get('payment').get('commission_fee')
-            booking_amount = booking.get('payment').get('amount')
-            final_amount = booking_amount - commission
-   
-            closed_booking_csv.writerow([booking_id, service_name, customer, booking_date, closed_date, commission, booking_amount, final_amount])
-    
-    prov_email = provider.user.email
-    message = format_report('templates/prov_closed_bookings.html')
+from application.customers.models import Booking, Customer, Payment
+from .mail import send_email, send_many
+from .utils import format_report, chunks
+from .exports import export_artifact, cleanup_export_artifacts
+from .task_progress import ProgressReporter
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+PROVIDER_CLOSED_BOOKINGS_HEADER = ['Booking ID','Service','Customer','Booking Date','Closed Date','Commission','Booking Amount','Final Amount']
+
+ADMIN_CLOSED_BOOKINGS_HEADER = ['Booking ID','Service','Category','Provider','Customer','Booking Date','Closed Date','Payment Date','Commission Fee','Platform Fee','Transaction Fee','Booking Amount','Final Amount']
+
+# column types of the parquet admin export, the payment amounts are integer columns
+ADMIN_CLOSED_BOOKINGS_TYPES = ['int64','string','string','string','string','timestamp[us]','timestamp[us]','timestamp[us]','int64','int64','int64','int64','int64']
 
-    send_email(
-        to_address=prov_email,
-        subject='closed booking csv export',
-        message=message,
-        attachment_file=f'static/{csv_file_name}'
+
+# One pass over the provider's closed bookings: a single join projecting just the CSV columns,
+# streamed from the cursor in EXPORT_YIELD_PER batches straight into the export artifact, which
+# only receives the bookings closed since its last refresh (see exports.py).
+def provider_closed_bookings_query(prov_id):
+    return (
+        db.session.query(
+            Booking.id,
+            Service.name,
+            User.username,
+            Booking.book_date,
+            Booking.closed_date,
+            Payment.commission_fee,
+            Payment.amount
+        )
+        .join(Service, Booking.service)
+        .join(Customer, Booking.customer)
+        .join(User, Customer.user)
+        .outerjoin(Payment, Booking.payment)
+        .filter(
+            Service.prov_id == prov_id,
+            Booking.is_closed.is_(True)
+        )
     )
-    time.sleep(20)
-    return csv_file_name
 
 
+def provider_closed_booking_row(row):
+    booking_id, service_name, customer, booking_date, closed_date, commission, booking_amount = row
+    final_amount = booking_amount - commission if booking_amount is not None else None
+    return [booking_id, service_name, customer, _isoformat(booking_date), _isoformat(closed_date), commission, booking_amount, final_amount]
 
-@shared_task(ignore_result=True, name='customer_bookings_monthly_report')
-def customer_bookings_monthly_report():
-    customers = Customer.query.filter_by(is_blocked=False).all()
 
-    booking_schema = BookingSchema(exclude=['customer', 'review'])
-    for customer in customers:
-        cust_bookings = []
+@shared_task(bind=True, ignore_result=False, name='provider_closed_bookings_csv_export')
+def provider_closed_bookings_csv_export(self, prov_id):
+    prov_email = (
+        db.session.query(User.email)
+        .join(Provider, Provider.user_id == User.id)
+        .filter(Provider.id == prov_id)
+        .scalar()
+    )
+    artifact = export_artifact(f'ProvID_{prov_id}_closed_bookings')
+    progress = ProgressReporter(self, stage='export')
+    appended = artifact.refresh(PROVIDER_CLOSED_BOOKINGS_HEADER, provider_closed_bookings_query(prov_id), provider_closed_booking_row, progress)
+    current_app.logger.info('export %s: %d new rows', artifact.file_name, appended)
+    csv_file_name = artifact.file_name
+
+    progress.stage = 'mail'
+    progress.report()
+    message = format_report('templates/prov_closed_bookings.html')
 
-        cust_bookings_data = (
-            db.session.query(
-                Booking, Service.name, Category.name
-            )
-            .outerjoin(Service, Booking.service)
-            .outerjoin(Provider, Service.provider)
-            .outerjoin(Category, Provider.category)
-            .filter(
-                Booking.cust_id==customer.id
-            )
-            .all()
+    # held while the attachment is read, so no refresh or cleanup swaps the file underneath it
+    with artifact.locked():
+        send_email(
+            to_address=prov_email,
+            subject='closed booking csv export',
+            message=message,
+            attachment_file=artifact.path
         )
+    return csv_file_name
 
-        if len(cust_bookings_data) > 0:
-            for booking_obj, service_name, category_name in cust_bookings_data:
-                booking = booking_schema.dump(booking_obj)
-                booking['service'] = service_name
-                booking['category'] = category_name
-                cust_bookings.append(booking)
 
-            cust_user_details = customer.user
-            cust_username = cust_user_details.username
-            cust_email = cust_user_details.email
 
-            data = {
-                'username': cust_username,
-                'bookings': cust_bookings
-            }
+# Monthly report: the beat task finds the unblocked customers with bookings in the report month
+# with one query and fans them out as a chord of MONTHLY_REPORT_BATCH_SIZE batches. Each batch
+# streams the bookings of its customers in one query ordered by customer, mails one report per
+# customer and returns its summary, the chord callback adds the summaries up.
 
-            message = format_report('templates/cust_bookings_monthly_report.html', data=data)
+def _month_range(month=None):
+    start = datetime.strptime(month, '%Y-%m') if month else datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start, end
 
-            send_email(
-                to_address=cust_email,
-                subject='monthly booking report',
-                message=message
-            )
 
-    return 'Monthly Report sent to all customers.....'
+@shared_task(bind=True, ignore_result=False, name='customer_bookings_monthly_report')
+def customer_bookings_monthly_report(self, month=None):
+    start, end = _month_range(month)
+    month = start.strftime('%Y-%m')
+    batch_size = current_app.config.get('MONTHLY_REPORT_BATCH_SIZE', 500)
 
+    cust_ids = (
+        db.session.query(Booking.cust_id)
+        .join(Customer, Booking.customer)
+        .filter(
+            Customer.is_blocked.is_(False),
+            Booking.created_at >= start,
+            Booking.created_at < end
+        )
+        .distinct()
+        .order_by(Booking.cust_id)
+        .execution_options(yield_per=current_app.config.get('EXPORT_YIELD_PER', 1000))
+    )
 
-@shared_task(ignore_result=True, name='admin_closed_booking_batch_csv_export')
-def admin_closed_booking_batch_csv_export():
-    closed_bookings = Booking.query.filter_by(is_closed=True).all()
-    booking_schema = BookingSchema(exclude=['review'])
-    service_schema = ServiceSchema()
+    batches = [
+        customer_bookings_monthly_report_batch.s(chunk, month)
+        for chunk in chunks((cust_id for cust_id, in cust_ids), batch_size)
+    ]
+    no_of_customers = sum(len(batch.args[0]) for batch in batches)
+
+    if batches:
+        chord(batches)(customer_bookings_monthly_report_summary.s(month))
+
+    current_app.logger.info('monthly_report %s customers=%d batches=%d', month, no_of_customers, len(batches))
+    return {'month': month, 'customers': no_of_customers, 'batches': len(batches)}
+
+
+@shared_task(bind=True, ignore_result=False, name='customer_bookings_monthly_report_batch')
+def customer_bookings_monthly_report_batch(self, cust_ids, month):
+    start, end = _month_range(month)
+    summary = {'month': month, 'customers': len(cust_ids), 'bookings': 0, 'sent': 0, 'failed': 0}
+    started = time.perf_counter()
+
+    rows = (
+        db.session.query(
+            Booking.cust_id,
+            User.username,
+            User.email,
+            Booking.id,
+            Booking.status,
+            Booking.book_date,
+            Service.name,
+            Category.name
+        )
+        .join(Customer, Booking.customer)
+        .join(User, Customer.user)
+        .outerjoin(Service, Booking.service)
+        .outerjoin(Provider, Service.provider)
+        .outerjoin(Category, Provider.category)
+        .filter(
+            Booking.cust_id.in_(cust_ids),
+            Customer.is_blocked.is_(False),
+            Booking.created_at >= start,
+            Booking.created_at < end
+        )
+        .order_by(Booking.cust_id, Booking.id)
+        .execution_options(yield_per=current_app.config.get('EXPORT_YIELD_PER', 1000))
+    )
+
+    progress = ProgressReporter(self, total=len(cust_ids), stage='render')
+    sent_cust_ids, reports = [], []
+    for cust_id, cust_rows in groupby(rows, key=itemgetter(0)):
+        cust_bookings = []
+        for _, cust_username, cust_email, booking_id, status, book_date, service_name, category_name in cust_rows:
+            cust_bookings.append({
+                'id': booking_id,
+                'service': service_name,
+                'category': category_name,
+                'status': status,
+                'book_date': _isoformat(book_date)
+            })
+
+        data = {
+            'username': cust_username,
+            'bookings': cust_bookings
+        }
+
+        sent_cust_ids.append(cust_id)
+        reports.append({
+            'to_address': cust_email,
+            'subject': 'monthly booking report',
+            'message': format_report('templates/cust_bookings_monthly_report.html', data=data)
+        })
+        summary['bookings'] += len(cust_bookings)
+        progress.advance()
+
+    progress.stage = 'mail'
+    progress.report(month=month, rendered=len(reports))
+
+    for cust_id, error in zip(sent_cust_ids, send_many(reports)):
+        if error is None:
+            summary['sent'] += 1
+        else:
+            current_app.logger.warning('monthly_report %s: could not mail customer %s: %s', month, cust_id, error)
+            summary['failed'] += 1
+
+    summary['duration_s'] = round(time.perf_counter() - started, 3)
+    current_app.logger.info('monthly_report_batch %s %s', month, summary)
+    return summary
+
+
+@shared_task(ignore_result=False, name='customer_bookings_monthly_report_summary')
+def customer_bookings_monthly_report_summary(batch_summaries, month):
+    summary = {'month': month, 'batches': len(batch_summaries)}
+    for key in ('customers', 'bookings', 'sent', 'failed'):
+        summary[key] = sum(batch.get(key, 0) for batch in batch_summaries)
+
+    current_app.logger.info('monthly_report_summary %s', summary)
+    return summary
+
+
+# Same for every closed booking, provider and customer usernames come from two aliases of users.
+def admin_closed_bookings_query():
+    provider_user, customer_user = db.aliased(User), db.aliased(User)
+    return (
+        db.session.query(
+            Booking.id,
+            Service.name,
+            Category.name,
+            provider_user.username,
+            customer_user.username,
+            Booking.book_date,
+            Booking.closed_date,
+            Payment.updated_at,
+            Payment.commission_fee,
+            Payment.platform_fee,
+            Payment.transaction_fee,
+            Payment.amount
+        )
+        .join(Service, Booking.service)
+        .join(Provider, Service.provider)
+        .outerjoin(Category, Provider.category)
+        .join(provider_user, Provider.user)
+        .join(Customer, Booking.customer)
+        .join(customer_user, Customer.user)
+        .outerjoin(Payment, Booking.payment)
+        .filter(Booking.is_closed.is_(True))
+    )
 
-    csv_file_name = f"admin_closed_bookings_{datetime.now().strftime('%f')}.csv" 
 
-    with open(f'static/{csv_file_name}', 'w', newline = "") as csvfile:
+def admin_closed_booking_values(row):
+    (booking_id, service_name, category_name, provider_name, customer_name, booking_date, closed_date,
+     payment_date, commission_fee, platform_fee, transaction_fee, booking_amount) = row
+    final_amount = booking_amount + platform_fee + transaction_fee if booking_amount is not None else None
+    return [booking_id, service_name, category_name, provider_name, customer_name, booking_date, closed_date,
+            payment_date, commission_fee, platform_fee, transaction_fee, booking_amount, final_amount]
 
-        closed_booking_csv = csv.writer(csvfile, delimiter = ',')
-        closed_booking_csv.writerow(['Booking ID','Service','Category','Provider','Customer','Booking Date','Closed Date','Payment Date','Commission Fee','Platform Fee','Transaction Fee','Booking Amount','Final Amount'])
 
-        for booking_obj in closed_bookings:
-            service = service_schema.dump(booking_obj.service)
-            booking = booking_schema.dump(booking_obj)
+def admin_closed_booking_row(row):
+    values = admin_closed_booking_values(row)
+    values[5:8] = [_isoformat(value) for value in values[5:8]]
+    return values
 
-            booking_id = booking.get('id')
-            service_name = service.get('name')
-            category_name = service.get('provider').get('category').get('name')
-            provider_name = service.get('provider').get('user').get('username')
-            customer_name = booking.get('customer').get('user').get('username')
-            booking_date = booking.get('book_date')
-            closed_date = booking.get('closed_date')
-            payment_date = booking.get('payment').get('updated_at')
-            commission_fee = booking.get('payment').get('commission_fee')
-            platform_fee = booking.get('payment').get('platform_fee')
-            transaction_fee = booking.get('payment').get('transaction_fee')
-            booking_amount = booking.get('payment').get('amount')
-            final_amount = booking_amount + platform_fee + transaction_fee
 
-            closed_booking_csv.writerow([booking_id,service_name,category_name,provider_name,customer_name,booking_date,closed_date,payment_date,commission_fee,platform_fee,transaction_fee,booking_amount,final_amount])
+@shared_task(bind=True, ignore_result=False, name='admin_closed_booking_batch_csv_export')
+def admin_closed_booking_batch_csv_export(self, compress=False, format='csv'):
+    artifact = export_artifact('admin_closed_bookings', compress=compress, format=format)
+    progress = ProgressReporter(self, stage='export')
+    if artifact.parquet:
+        appended = artifact.refresh(ADMIN_CLOSED_BOOKINGS_HEADER, admin_closed_bookings_query(), admin_closed_booking_values, progress,
+                                    types=ADMIN_CLOSED_BOOKINGS_TYPES)
+    else:
+        appended = artifact.refresh(ADMIN_CLOSED_BOOKINGS_HEADER, admin_closed_bookings_query(), admin_closed_booking_row, progress)
+    current_app.logger.info('export %s: %d new rows', artifact.file_name, appended)
+    csv_file_name = artifact.file_name
+
+    progress.stage = 'mail'
+    progress.report()
 
     message = format_report('templates/prov_closed_bookings.html')
 
-    send_email(
-        to_address='admin@househelpnow.com',
-        subject='batch closed booking csv export',
-        message=message,
-        attachment_file=f'static/{csv_file_name}'
-    )
+    with artifact.locked():
+        send_email(
+            to_address='admin@househelpnow.com',
+            subject='batch closed booking csv export',
+            message=message,
+            attachment_file=artifact.path
+        )
 
     return csv_file_name
 
 
+@shared_task(ignore_result=False, name='cleanup_export_artifacts')
+def cleanup_export_artifacts_task():
+    removed = cleanup_export_artifacts(current_app.config.get('EXPORT_ARTIFACT_MAX_AGE_DAYS', 7))
+    current_app.logger.info('export cleanup: removed %d files', len(removed))
+    return removed
@@ -1,9 +1,16 @@
 from flask import jsonify, request
-from urllib.parse import urlencode
+from datetime import datetime
+from sqlalchemy import DateTime, tuple_
+from sqlalchemy.engine import Row
+import base64
+import hashlib
+import json
+import os
 import re
 import time
+from itertools import islice
 
-from jinja2 import Template
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 
 
 EMAIL_REGEX = r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$'
@@ -12,19 +19,14 @@ def is_valid_email(email):
     return re.match(EMAIL_REGEX, email)
 
 
-# Helper function to generate cache key based on endpoint and parameters
-def make_cache_key(*args, **kwrags):
-    # print(args, kwrags)
-    # print(dir(args))
-    args = request.args
-    return f"{request.path}?page={args.get('page')}"
+def parse_bool(value):
+    return str(value).lower() in ('true', '1', 'yes')
 
 
-# Helper function to generate cache key based on all query parameters
-def make_cache_key_with_query_params():
-    args = request.args
-    query_params = {key: args.get(key) for key in sorted(args)}
-    return f"{request.path}?{urlencode(query_params)}"             
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
 
 
 def success_response(data={}, message='', is_restful=True, sleep=False, sleep_time_in_sec=1, status_code=200):
@@ -44,6 +46,24 @@ def success_response(data={}, message='', is_restful=True, sleep=False, sleep_ti
     return jsonify(resp), status_code
 
 
+def unpack_response(rv):
+    if not isinstance(rv, tuple):
+        return rv, 200, {}
+    data, status_code, headers = (tuple(rv) + (None, None))[:3]
+    return data, status_code or 200, dict(headers or {})
+
+
+def make_etag(*parts):
+    payload = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return f'"{hashlib.sha256(payload.encode()).hexdigest()[:32]}"'
+
+
+def with_etag(rv):
+    data, status_code, headers = unpack_response(rv)
+    headers.setdefault('ETag', make_etag(data))
+    return data, status_code, headers
+
+
 def error_response(err_message='', errors={}, status_code=500):
     resp = {
         "success": False,
@@ -54,9 +74,109 @@ def error_response(err_message='', errors={}, status_code=500):
     return resp, status_code
 
 
+# One jinja Environment per template directory and process. Compiled templates stay in the
+# environment and, through the bytecode cache, on disk for the next worker process, a template
+# is only recompiled when its file changes (auto_reload compares the mtime).
+_template_envs = {}
+
+
+def get_template_env(directory):
+    directory = os.path.abspath(directory)
+    env = _template_envs.get(directory)
+    if env is None:
+        env = _template_envs.setdefault(directory, Environment(
+            loader=FileSystemLoader(directory),
+            bytecode_cache=FileSystemBytecodeCache(),
+            auto_reload=True
+        ))
+    return env
+
+
 def format_report(html_template, data = None):
-    with open(html_template) as file:
-        template = Template(file.read())
-        if not data:
-            return template.render()
-        return template.render(data = data)
\ No newline at end of file
+    directory, name = os.path.split(html_template)
+    template = get_template_env(directory or '.').get_template(name)
+    if not data:
+        return template.render()
+    return template.render(data = data)
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor, per_page, total=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.per_page = per_page
+        self.total = total
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+def encode_cursor(values):
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode()).decode()
+
+
+def decode_cursor(cursor, order_columns):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+    if not isinstance(values, list) or len(values) != len(order_columns):
+        raise ValueError('Invalid cursor')
+
+    try:
+        return [_cursor_value(column, value) for column, value in zip(order_columns, values)]
+    except (TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def _cursor_value(column, value):
+    if isinstance(column.expression.type, DateTime):
+        return datetime.fromisoformat(value)
+    if not isinstance(value, (int, float, str)):
+        raise TypeError(f'{value!r} is not a {column.key} value')
+    return value
+
+
+def _keyset_values(row, order_columns):
+    entities = tuple(row) if isinstance(row, Row) else (row,)
+    values = []
+    for column in order_columns:
+        entity = next(entity for entity in entities if isinstance(entity, column.class_))
+        values.append(getattr(entity, column.key))
+    return values
+
+
+# Seek pagination on descending (order column, ..., id). Unlike `.paginate()` no OFFSET is scanned
+# and the total COUNT(*) is only run when asked for, so every page costs the same.
+def keyset_paginate(query, order_columns, cursor, per_page, with_total=False):
+    total = query.order_by(None).count() if with_total else None
+
+    if cursor:
+        values = decode_cursor(cursor, order_columns)
+        if len(order_columns) == 1:
+            query = query.filter(order_columns[0] < values[0])
+        else:
+            query = query.filter(tuple_(*order_columns) < tuple_(*values))
+
+    rows = query.order_by(None).order_by(*[column.desc() for column in order_columns]).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(_keyset_values(rows[-1], order_columns))
+
+    return KeysetPage(rows, next_cursor, per_page, total)
+
+
+def keyset_response_data(paginated, name, items, with_total=False):
+    """Response data of a `keyset_paginate` page, the items go under `name`."""
+    data = {
+        name: items,
+        'next_cursor': paginated.next_cursor,
+        'per_page': paginated.per_page
+    }
+    if with_total:
+        data[f'no_of_{name}'] = paginated.total
+    return data
@@ -1,14 +1,26 @@
 from celery import Celery, Task
 from flask import Flask 
 from configs import CeleryConfig
+from application.instrumentation import collect_sql_stats
+from application.task_dedup import DEDUP_HEADER, release_dedup_key
+from application.task_progress import publish_state
 
 
 def celery_init_app(app: Flask, celery_config: CeleryConfig) -> Celery:
     class FlaskTask(Task):
         def __call__(self, *args: object, **kwargs: object) -> object:
-            with app.app_context():
+            with app.app_context(), collect_sql_stats(f'task={self.name}', app):
                 return self.run(*args, **kwargs)
 
+        def after_return(self, status, retval, task_id, args, kwargs, einfo):
+            # custom headers land on the request in a worker, under `headers` when run eagerly
+            dedup_key = getattr(self.request, DEDUP_HEADER, None) or (self.request.headers or {}).get(DEDUP_HEADER)
+            with app.app_context():
+                if dedup_key:
+                    release_dedup_key(dedup_key, task_id, status == 'SUCCESS')
+                # ends the progress streams of this task
+                publish_state(task_id, status, result=retval)
+
     celery_app = Celery(app.name, task_cls=FlaskTask)
     celery_app.config_from_object(celery_config)
     celery_app.set_default()
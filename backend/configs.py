@@ -34,10 +34,34 @@ class Config:
     ADMIN_EMAIL = os.environ.get('ADMIN_EMAIL')
     ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD')
     ALLOWED_ORIGINS = os.getenv('ALLOWED_ORIGINS', '*') 
-    CACHE_TYPE = 'RedisCache'
+    CACHE_TYPE = 'application.cache_backends.TwoTierRedisCache'
     CACHE_DEFAULT_TIMEOUT = 300
     CACHE_KEY_PREFIX = 'mycache'
     CACHE_REDIS_URL = 'redis://localhost:6379/2'
+    CACHE_L1_MAXSIZE = int(os.environ.get('CACHE_L1_MAXSIZE', 512))  # 0 disables the in-process cache tier
+    CACHE_L1_TIMEOUT = int(os.environ.get('CACHE_L1_TIMEOUT', 30))
+    CACHE_STALE_TIMEOUT = 300  # how long an expired catalog entry may still be served while it is rebuilt
+    CACHE_LOCK_TIMEOUT = 30
+    IDENTITY_CACHE_TIMEOUT = 300  # jwt user snapshots, dropped early when an admin blocks/unblocks the user
+    EXPORT_YIELD_PER = 1000  # rows fetched per round trip while streaming csv exports
+    MONTHLY_REPORT_BATCH_SIZE = 500  # customers per monthly report subtask
+    EXPORT_PARQUET_ROW_GROUP_SIZE = 100000  # rows per parquet row group (and per arrow batch held in memory)
+    EXPORT_PARQUET_COMPRESSION = 'zstd'
+    EXPORT_ARTIFACT_MAX_AGE_DAYS = 7  # export artifacts nobody asked for in this long are garbage-collected
+    EXPORT_WATERMARK_WINDOW = 300  # seconds re-read behind the export watermark, longer than any close takes to commit
+    TASK_DEDUP_REDIS_URL = 'redis://localhost:6379/3'
+    TASK_DEDUP_INFLIGHT_TIMEOUT = 900  # upper bound on one deduplicated run, frees the key if a worker died
+    TASK_DEDUP_RESULT_TIMEOUT = 300  # how long a finished export is handed out again for the same call
+    TASK_PROGRESS_REDIS_URL = 'redis://localhost:6379/3'  # pub/sub channels of the task progress streams
+    TASK_PROGRESS_INTERVAL = 1.0  # seconds between two progress updates of a running task
+    TASK_PROGRESS_STREAM_TIMEOUT = 600  # an event stream is closed after this long even if the task is still running
+    TASK_PROGRESS_HEARTBEAT = 15  # keep-alive comment on an idle event stream
+    TASK_OWNER_TIMEOUT = 86400  # how long a task's owner is kept, as long as celery keeps its result
+    SQL_INSTRUMENTATION = os.environ.get('SQL_INSTRUMENTATION', 'false').lower() == 'true'  # Server-Timing db header and per-request sql logs
+    SQL_SERVER_TIMING = True
+    SQL_REPEATED_STATEMENT_THRESHOLD = 5  # warn when one normalized statement runs more often in a request/task
+    SQL_LOG_STATEMENT_LENGTH = 200
+    RESTFUL_JSON_ENCODER = 'orjson'  # 'json' for the standard library encoder, output is compact either way
 
 
 class CeleryConfig():
@@ -45,11 +69,30 @@ class CeleryConfig():
     result_backend = 'redis://localhost:6379/1'
     broker_connection_retry_on_startup = True
     Timezone = 'Asia/Kolkata'
+    # exports a user is polling, batch reports and bulk mail each get their own queue (and worker
+    # profile in local_worker.sh) so a monthly report run never delays an interactive export
+    task_default_queue = 'celery'
+    task_routes = {
+        'provider_closed_bookings_csv_export': {'queue': 'interactive_exports', 'priority': 0},
+        'admin_closed_booking_batch_csv_export': {'queue': 'bulk_reports', 'priority': 3},
+        'customer_bookings_monthly_report': {'queue': 'bulk_reports', 'priority': 6},
+        'customer_bookings_monthly_report_summary': {'queue': 'bulk_reports', 'priority': 6},
+        'cleanup_export_artifacts': {'queue': 'bulk_reports', 'priority': 9},
+        'customer_bookings_monthly_report_batch': {'queue': 'mail', 'priority': 6},
+    }
+    task_default_priority = 5
+    task_annotations = {
+        'customer_bookings_monthly_report_batch': {'rate_limit': '6/m'},  # per worker, a batch mails up to MONTHLY_REPORT_BATCH_SIZE customers
+    }
+    # redis: 0 is the highest priority, a worker on several queues drains them in -Q order
+    broker_transport_options = {'priority_steps': list(range(10)), 'sep': ':', 'queue_order_strategy': 'priority'}
+    worker_prefetch_multiplier = 1
 
 
 class DevelopmentConfig(Config, CeleryConfig):
     FLASK_ENV = 'development'
     DEBUG = True
+    SQL_INSTRUMENTATION = os.environ.get('SQL_INSTRUMENTATION', 'true').lower() == 'true'
   
     
 class ProductionConfig(Config, CeleryConfig):
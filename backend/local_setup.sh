@@ -5,7 +5,7 @@ echo "Welcome to flask Devlopment. This"
 echo "is local setup bash script which"
 echo "will checks or create .env and then"
 echo "install all the required libraries"
-echo "from requirements.txt file."
+echo "from requirements-dev.txt file."
 echo "You can rerun this without any issue."
 echo "^()^ Happy learning ^()^"
 
@@ -19,6 +19,6 @@ fi
 
 . .venv/bin/activate
 
-pip install -r requirements.txt
+pip install -r requirements-dev.txt
 echo "work done deactivating .venv"
 deactivate
\ No newline at end of file
@@ -9,6 +9,31 @@ else
 fi
 
 
+# ./local_worker.sh [all|interactive|bulk|mail]
+#   interactive  provider exports users are polling, several slots and no prefetch so a job never waits behind another
+#   bulk         monthly report fan-out, admin exports and cleanup, few slots, fair scheduling for long tasks
+#   mail         monthly report batches, rate limited in CeleryConfig.task_annotations
+#   all          one worker for every queue (default, local development), interactive exports drained first
+PROFILE=${1:-all}
+
 . .venv/bin/activate
-celery -A main.celery worker -l info
-deactivate
\ No newline at end of file
+case $PROFILE in
+    interactive)
+        celery -A main.celery worker -l info -n interactive@%h -Q interactive_exports,celery -c 4 --prefetch-multiplier 1
+        ;;
+    bulk)
+        celery -A main.celery worker -l info -n bulk@%h -Q bulk_reports -c 2 --prefetch-multiplier 1 -O fair
+        ;;
+    mail)
+        celery -A main.celery worker -l info -n mail@%h -Q mail -c 2 --prefetch-multiplier 1
+        ;;
+    all)
+        celery -A main.celery worker -l info -Q interactive_exports,celery,mail,bulk_reports
+        ;;
+    *)
+        echo "Unknown worker profile $PROFILE, use all, interactive, bulk or mail"
+        deactivate
+        exit 1
+        ;;
+esac
+deactivate
@@ -16,7 +16,7 @@ celery = celery_init_app(app, CeleryConfig)
 celery.autodiscover_tasks()
 
 
-from application.tasks import customer_bookings_monthly_report
+from application.tasks import customer_bookings_monthly_report, cleanup_export_artifacts_task
 from celery.schedules import crontab
 
 
@@ -29,6 +29,12 @@ def setup_periodic_tasks(sender: Celery, **kwargs):
         name='customer monthly report for bookings every 2 minutes'
     )
 
+    sender.add_periodic_task(
+        crontab(hour=3, minute=0), 
+        cleanup_export_artifacts_task.s(), 
+        name='remove export artifacts nobody asked for lately, every night'
+    )
+
     # sender.add_periodic_task(
     #     crontab(day_of_month=1, hour=5, minute=30), 
     #     customer_bookings_monthly_report.s(), 
@@ -0,0 +1,66 @@
+"""add indexes for list endpoint filters
+
+Revision ID: 4c7e2a91f3b8
+Revises: d389abf029d6
+Create Date: 2026-10-18 10:12:41.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c7e2a91f3b8'
+down_revision = 'd389abf029d6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('bookings', schema=None) as batch_op:
+        batch_op.create_index('ix__bookings__service_id__status', ['service_id', 'status'], unique=False)
+        batch_op.create_index('ix__bookings__cust_id__status', ['cust_id', 'status'], unique=False)
+        batch_op.create_index(
+            'ix__bookings__service_id__closed_date', ['service_id', 'closed_date'], unique=False,
+            sqlite_where=sa.text('is_closed = 1'),
+            postgresql_where=sa.text('is_closed')
+        )
+
+    with op.batch_alter_table('payments', schema=None) as batch_op:
+        batch_op.create_index('ix__payments__booking_id', ['booking_id'], unique=False)
+        batch_op.create_index('ix__payments__status', ['status'], unique=False)
+
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.create_index('ix__reviews__booking_id', ['booking_id'], unique=False)
+
+    with op.batch_alter_table('providers', schema=None) as batch_op:
+        batch_op.create_index('ix__providers__category_id__is_approved__is_blocked', ['category_id', 'is_approved', 'is_blocked'], unique=False)
+        batch_op.create_index('ix__providers__is_approved__is_blocked', ['is_approved', 'is_blocked'], unique=False)
+
+    with op.batch_alter_table('services', schema=None) as batch_op:
+        batch_op.create_index('ix__services__prov_id__is_approved__is_blocked__is_active', ['prov_id', 'is_approved', 'is_blocked', 'is_active'], unique=False)
+        batch_op.create_index('ix__services__is_approved__is_blocked__is_active', ['is_approved', 'is_blocked', 'is_active'], unique=False)
+        batch_op.create_index('ix__services__is_approved__created_at', ['is_approved', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('services', schema=None) as batch_op:
+        batch_op.drop_index('ix__services__is_approved__created_at')
+        batch_op.drop_index('ix__services__is_approved__is_blocked__is_active')
+        batch_op.drop_index('ix__services__prov_id__is_approved__is_blocked__is_active')
+
+    with op.batch_alter_table('providers', schema=None) as batch_op:
+        batch_op.drop_index('ix__providers__is_approved__is_blocked')
+        batch_op.drop_index('ix__providers__category_id__is_approved__is_blocked')
+
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.drop_index('ix__reviews__booking_id')
+
+    with op.batch_alter_table('payments', schema=None) as batch_op:
+        batch_op.drop_index('ix__payments__status')
+        batch_op.drop_index('ix__payments__booking_id')
+
+    with op.batch_alter_table('bookings', schema=None) as batch_op:
+        batch_op.drop_index('ix__bookings__service_id__closed_date')
+        batch_op.drop_index('ix__bookings__cust_id__status')
+        batch_op.drop_index('ix__bookings__service_id__status')
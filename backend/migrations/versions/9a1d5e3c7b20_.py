@@ -0,0 +1,63 @@
+"""add service_stats rollup table
+
+Revision ID: 9a1d5e3c7b20
+Revises: 4c7e2a91f3b8
+Create Date: 2026-10-18 11:03:27.918340
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a1d5e3c7b20'
+down_revision = '4c7e2a91f3b8'
+branch_labels = None
+depends_on = None
+
+# booking statuses as of this revision, see application/stats.py
+NOT_SERVED_BOOKING_STATUSES = ['pending', 'rejected', 'confirmed']
+ACTIVE_BOOKING_STATUSES = ['active', 'completed']
+
+
+def upgrade():
+    op.create_table('service_stats',
+    sa.Column('service_id', sa.Integer(), nullable=False),
+    sa.Column('total_bookings', sa.Integer(), nullable=False),
+    sa.Column('active_bookings', sa.Integer(), nullable=False),
+    sa.Column('total_reviews', sa.Integer(), nullable=False),
+    sa.Column('rating_sum', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['service_id'], ['services.id'], name='fk__service_stats__services__service_id'),
+    sa.PrimaryKeyConstraint('service_id')
+    )
+
+    # existing history, the same aggregate as `flask rebuild-service-stats`
+    services = sa.table('services', sa.column('id'))
+    bookings = sa.table('bookings', sa.column('id'), sa.column('service_id'), sa.column('status'))
+    reviews = sa.table('reviews', sa.column('id'), sa.column('booking_id'), sa.column('rating'))
+    service_stats = sa.table(
+        'service_stats', sa.column('service_id'), sa.column('total_bookings'), sa.column('active_bookings'),
+        sa.column('total_reviews'), sa.column('rating_sum'), sa.column('updated_at')
+    )
+    op.execute(service_stats.insert().from_select(
+        ['service_id', 'total_bookings', 'active_bookings', 'total_reviews', 'rating_sum', 'updated_at'],
+        sa.select(
+            services.c.id,
+            sa.func.count(sa.case((bookings.c.status.notin_(NOT_SERVED_BOOKING_STATUSES), bookings.c.id))),
+            sa.func.count(sa.case((bookings.c.status.in_(ACTIVE_BOOKING_STATUSES), bookings.c.id))),
+            sa.func.count(reviews.c.id),
+            sa.func.coalesce(sa.func.sum(reviews.c.rating), 0),
+            sa.func.current_timestamp()
+        )
+        .select_from(
+            services
+            .outerjoin(bookings, bookings.c.service_id == services.c.id)
+            .outerjoin(reviews, reviews.c.booking_id == bookings.c.id)
+        )
+        .group_by(services.c.id)
+    ))
+
+
+def downgrade():
+    op.drop_table('service_stats')
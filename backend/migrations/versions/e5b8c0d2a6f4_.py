@@ -0,0 +1,96 @@
+"""add category_stats rollup table
+
+Revision ID: e5b8c0d2a6f4
+Revises: 9a1d5e3c7b20
+Create Date: 2026-10-18 11:48:05.330172
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b8c0d2a6f4'
+down_revision = '9a1d5e3c7b20'
+branch_labels = None
+depends_on = None
+
+# booking statuses as of this revision, see application/stats.py
+ACTIVE_BOOKING_STATUSES = ['active', 'completed']
+
+
+def upgrade():
+    op.create_table('category_stats',
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('active_providers', sa.Integer(), nullable=False),
+    sa.Column('active_services', sa.Integer(), nullable=False),
+    sa.Column('total_bookings', sa.Integer(), nullable=False),
+    sa.Column('total_revenue', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.id'], name='fk__category_stats__categories__category_id'),
+    sa.PrimaryKeyConstraint('category_id')
+    )
+
+    # existing history, the same aggregate as `flask rebuild-category-stats`
+    categories = sa.table('categories', sa.column('id'))
+    providers = sa.table(
+        'providers', sa.column('id'), sa.column('category_id'),
+        sa.column('is_approved', sa.Boolean), sa.column('is_blocked', sa.Boolean)
+    )
+    services = sa.table(
+        'services', sa.column('id'), sa.column('prov_id'),
+        sa.column('is_approved', sa.Boolean), sa.column('is_blocked', sa.Boolean), sa.column('is_active', sa.Boolean)
+    )
+    bookings = sa.table('bookings', sa.column('id'), sa.column('service_id'), sa.column('status'))
+    payments = sa.table(
+        'payments', sa.column('booking_id'), sa.column('status'),
+        sa.column('commission_fee'), sa.column('platform_fee'), sa.column('transaction_fee')
+    )
+    category_stats = sa.table(
+        'category_stats', sa.column('category_id'), sa.column('active_providers'), sa.column('active_services'),
+        sa.column('total_bookings'), sa.column('total_revenue'), sa.column('updated_at')
+    )
+
+    active_provider = sa.and_(
+        providers.c.category_id == categories.c.id,
+        providers.c.is_approved.is_(True),
+        providers.c.is_blocked.is_(False)
+    )
+    active_providers = sa.select(sa.func.count(providers.c.id)).where(active_provider).scalar_subquery()
+    active_services = (
+        sa.select(sa.func.count(services.c.id))
+        .select_from(providers.join(services, services.c.prov_id == providers.c.id))
+        .where(
+            active_provider,
+            services.c.is_approved.is_(True),
+            services.c.is_blocked.is_(False),
+            services.c.is_active.is_(True)
+        )
+        .scalar_subquery()
+    )
+    category_bookings = (
+        providers
+        .join(services, services.c.prov_id == providers.c.id)
+        .join(bookings, bookings.c.service_id == services.c.id)
+    )
+    total_bookings = (
+        sa.select(sa.func.count(bookings.c.id))
+        .select_from(category_bookings)
+        .where(providers.c.category_id == categories.c.id, bookings.c.status.in_(ACTIVE_BOOKING_STATUSES))
+        .scalar_subquery()
+    )
+    total_revenue = (
+        sa.select(sa.func.coalesce(sa.func.sum(payments.c.commission_fee + payments.c.platform_fee + payments.c.transaction_fee), 0))
+        .select_from(category_bookings.join(payments, payments.c.booking_id == bookings.c.id))
+        .where(providers.c.category_id == categories.c.id, payments.c.status == 'paid')
+        .scalar_subquery()
+    )
+
+    op.execute(category_stats.insert().from_select(
+        ['category_id', 'active_providers', 'active_services', 'total_bookings', 'total_revenue', 'updated_at'],
+        sa.select(categories.c.id, active_providers, active_services, total_bookings, total_revenue, sa.func.current_timestamp())
+    ))
+
+
+def downgrade():
+    op.drop_table('category_stats')
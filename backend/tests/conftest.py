@@ -0,0 +1,81 @@
+import os
+
+# configs.py reads these at import time, a local .env still wins
+os.environ.setdefault('FLASK_SECRET_KEY', 'test-secret-key-' + 'x' * 16)
+os.environ.setdefault('JWT_SECRET_KEY', 'test-jwt-secret-' + 'y' * 16)
+os.environ.setdefault('JWT_ACCESS_TOKEN_EXPIRES', '1')
+os.environ.setdefault('JWT_REFRESH_TOKEN_EXPIRES', '1')
+os.environ.setdefault('SECURITY_PASSWORD_SALT', 'test-salt')
+os.environ.setdefault('SECURITY_PASSWORD_HASH', 'plaintext')
+
+# templates/ and static/ are resolved relative to the backend folder
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fakeredis
+import pytest
+from flask_jwt_extended import create_access_token
+
+from configs import TestingConfig
+
+
+class UnitTestConfig(TestingConfig):
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SECURITY_PASSWORD_HASH = 'plaintext'
+    CACHE_TYPE = 'SimpleCache'
+    ADMIN_EMAIL = 'admin@househelpnow.com'
+    ADMIN_PASSWORD = 'admin'
+    SQL_INSTRUMENTATION = True
+
+
+@pytest.fixture(scope='session')
+def app():
+    from application import create_app
+    return create_app('main', UnitTestConfig)
+
+
+@pytest.fixture(autouse=True)
+def database(app):
+    from application.extensions import db, cache
+    from application.seed import create_initial_data
+
+    db.drop_all()
+    db.create_all()
+    create_initial_data(UnitTestConfig)
+    cache.clear()
+    yield db
+    db.session.rollback()
+    db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def redis_server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def fake_redis(redis_server):
+    # the task dedup and progress clients decode responses
+    return fakeredis.FakeRedis(server=redis_server, decode_responses=True)
+
+
+def two_tier_cache(redis_server, **kwargs):
+    from application.cache_backends import TwoTierRedisCache
+    return TwoTierRedisCache(host=fakeredis.FakeRedis(server=redis_server), key_prefix='test:', **kwargs)
+
+
+@pytest.fixture
+def redis_cache(app, redis_server, monkeypatch):
+    """The app cache on a TwoTierRedisCache over fakeredis instead of SimpleCache."""
+    from application.extensions import cache
+    backend = two_tier_cache(redis_server)
+    monkeypatch.setitem(app.extensions['cache'], cache, backend)
+    return backend
+
+
+def auth_headers(user):
+    return {'Authorization': f'Bearer {create_access_token(identity=user)}'}
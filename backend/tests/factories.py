@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from application.extensions import db
+from application.admin.models import Category
+from application.core.models import Profile
+from application.providers.models import Provider, Service
+from application.customers.models import Booking, Customer, Payment, Review
+from application.enums import BookingStatusEnum, PaymentStatusEnum
+
+
+def create_provider(username='provider', category=None, no_of_services=0):
+    category = category or Category.query.first()
+    user = current_app.security.datastore.create_user(
+        username=username, email=f'{username}@example.com', password_hash='x', roles=['provider']
+    )
+    user.profile = Profile(location=f'{username} street')
+    user.provider = Provider(is_approved=True, category_id=category.id)
+    db.session.commit()
+
+    for i in range(no_of_services):
+        db.session.add(Service(
+            name=f'{username} service {i}', price=500, time_required_hr=1, prov_id=user.provider.id,
+            is_approved=True, is_active=True
+        ))
+    db.session.commit()
+    return user
+
+
+def create_customer(username='customer'):
+    user = current_app.security.datastore.create_user(
+        username=username, email=f'{username}@example.com', password_hash='x', roles=['customer']
+    )
+    user.profile = Profile(location=f'{username} street')
+    user.customer = Customer()
+    db.session.commit()
+    return user
+
+
+def create_bookings(services, customers, count, closed=True):
+    """`count` bookings spread over the services and customers, each with a payment and review."""
+    now = datetime.now()
+    bookings = []
+    for i in range(count):
+        service, customer = services[i % len(services)], customers[i % len(customers)]
+        booking = Booking(
+            cust_id=customer.id, service_id=service.id, book_date=now - timedelta(days=1, minutes=i),
+            status=BookingStatusEnum.CLOSE.value if closed else BookingStatusEnum.PENDING.value,
+            is_closed=closed, closed_date=now - timedelta(minutes=i) if closed else None
+        )
+        db.session.add(booking)
+        db.session.flush()
+        db.session.add(Payment(
+            cust_id=customer.id, booking_id=booking.id, amount=500, status=PaymentStatusEnum.PAID.value
+        ))
+        if closed:
+            db.session.add(Review(cust_id=customer.id, booking_id=booking.id, rating=4))
+        bookings.append(booking)
+    db.session.commit()
+    return bookings
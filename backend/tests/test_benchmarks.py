@@ -0,0 +1,18 @@
+def test_bench_refuses_an_existing_db_file(app, tmp_path):
+    db_file = tmp_path / 'app.sqlite3'
+    db_file.write_bytes(b'real data')
+
+    result = app.test_cli_runner().invoke(args=['bench-list-queries', '--db-file', str(db_file), '--bookings', '10', '--runs', '1'])
+
+    assert result.exit_code != 0
+    assert '--force' in result.output
+    assert db_file.read_bytes() == b'real data'
+
+
+def test_bench_seeds_a_new_db_file(app, tmp_path):
+    db_file = tmp_path / 'bench.sqlite3'
+
+    result = app.test_cli_runner().invoke(args=['bench-list-queries', '--db-file', str(db_file), '--bookings', '10', '--runs', '1'])
+
+    assert result.exit_code == 0, result.output
+    assert db_file.exists()
@@ -0,0 +1,134 @@
+import time
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+
+from application import cache_backends
+from application.cache_backends import LocalLRU
+from conftest import two_tier_cache
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def subscribers(redis_server, channel):
+    return dict(fakeredis.FakeRedis(server=redis_server).pubsub_numsub(channel)).get(channel.encode(), 0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_backends, 'time', SimpleNamespace(monotonic=lambda: now[0], sleep=time.sleep))
+    return now
+
+
+def test_lru_entry_expires_after_its_ttl(clock):
+    lru = LocalLRU(maxsize=4, timeout=30)
+    lru.set('short', 1, timeout=5)
+    lru.set('capped', 2, timeout=300)
+
+    clock[0] += 5
+    assert lru.get('short') == (True, 1)
+    clock[0] += 1
+    assert lru.get('short') == (False, None)
+
+    # never kept longer than the L1 timeout, whatever the entry's own timeout
+    clock[0] += 24
+    assert lru.get('capped') == (True, 2)
+    clock[0] += 1
+    assert lru.get('capped') == (False, None)
+    assert lru.stats()['size'] == 0
+
+
+def test_lru_evicts_the_least_recently_used(clock):
+    lru = LocalLRU(maxsize=2, timeout=30)
+    lru.set('a', 1)
+    lru.set('b', 2)
+    lru.get('a')
+    lru.set('c', 3)
+
+    assert lru.get('b') == (False, None)
+    assert lru.get('a') == (True, 1) and lru.get('c') == (True, 3)
+    assert lru.stats()['evictions'] == 1
+
+
+def test_l1_serves_reads_without_redis(redis_server):
+    backend = two_tier_cache(redis_server, l1_maxsize=16)
+    # the listener clears L1 once it subscribed
+    backend.get('warm-up')
+    assert wait_for(lambda: subscribers(redis_server, backend.channel) == 1)
+    backend.set('key', {'value': 1}, timeout=60)
+
+    # gone from redis behind the cache's back, still in this worker's L1
+    fakeredis.FakeRedis(server=redis_server).flushall()
+    assert backend.get('key') == {'value': 1}
+    assert backend.l1_stats()['hits'] == 1
+
+
+@pytest.fixture
+def two_workers(redis_server):
+    first, second = (two_tier_cache(redis_server, l1_maxsize=16) for _ in range(2))
+    for backend in (first, second):
+        backend.get('warm-up')
+    # both invalidation listeners are subscribed
+    assert wait_for(lambda: subscribers(redis_server, first.channel) == 2)
+    return first, second
+
+
+def test_write_in_one_worker_drops_the_entry_from_the_others_l1(two_workers):
+    first, second = two_workers
+    first.set('key', 'old', timeout=60)
+    assert second.get('key') == 'old'
+
+    first.set('key', 'new', timeout=60)
+    assert wait_for(lambda: second.get('key') == 'new')
+
+
+@pytest.mark.parametrize('invalidate', [
+    lambda backend: backend.delete('key'),
+    lambda backend: backend.delete_many('key'),
+    lambda backend: backend.clear(),
+])
+def test_deletes_reach_the_other_workers(two_workers, invalidate):
+    first, second = two_workers
+    first.set('key', 'value', timeout=60)
+    assert second.get('key') == 'value'
+
+    invalidate(first)
+    assert wait_for(lambda: second.get('key') is None)
+
+
+def test_own_invalidations_are_ignored(two_workers):
+    first, _ = two_workers
+    first.set('key', 'value', timeout=60)
+    first._handle_invalidation(f'{{"origin": "{first._instance_id}", "keys": ["key"], "clear": false}}')
+    assert first.l1.get('key') == (True, 'value')
+
+
+def test_delete_if_equal_keeps_a_lock_taken_over_by_another_request(redis_server):
+    backend = two_tier_cache(redis_server, l1_maxsize=0)
+    assert backend.add('lock:key', 'first', timeout=30)
+
+    # the first holder's lock expired and a second request took it
+    backend.delete('lock:key')
+    assert backend.add('lock:key', 'second', timeout=30)
+
+    assert backend.delete_if_equal('lock:key', 'first') is False
+    assert backend.get('lock:key') == 'second'
+    assert backend.delete_if_equal('lock:key', 'second') is True
+    assert backend.get('lock:key') is None
+
+
+def test_delete_if_equal_drops_the_local_copy(redis_server):
+    backend = two_tier_cache(redis_server, l1_maxsize=16)
+    backend.add('lock:key', 'token', timeout=30)
+    assert backend.delete_if_equal('lock:key', 'token') is True
+    assert backend.l1.get('lock:key') == (False, None)
+    assert not backend.has('lock:key')
@@ -0,0 +1,66 @@
+import pytest
+
+from application.caching import bump_tags, CATEGORIES_TAG
+from application.core.resources import category_list_cache_key, service_list_cache_key, category_cache_key
+from conftest import auth_headers
+from factories import create_customer, create_provider
+
+
+def cache_key(app, key_prefix, url, headers=None):
+    with app.test_request_context(url, headers=headers):
+        return key_prefix()
+
+
+@pytest.mark.parametrize('key_prefix, first, second', [
+    (category_list_cache_key, '/api/v1/categories?only_names=true', '/api/v1/categories?page=1'),
+    (category_list_cache_key, '/api/v1/categories?page=1', '/api/v1/categories?page=2'),
+    (category_list_cache_key, '/api/v1/categories?fields=id,name', '/api/v1/categories?fields=id'),
+    (category_list_cache_key, '/api/v1/categories', '/api/v1/categories?fields=id,name'),
+    (service_list_cache_key, '/api/v1/active-services?query=a', '/api/v1/active-services?query=b'),
+    (service_list_cache_key, '/api/v1/active-services?query=a', '/api/v1/active-services'),
+    (service_list_cache_key, '/api/v1/active-services?fields=id,name', '/api/v1/active-services?fields=id,price'),
+    (service_list_cache_key, '/api/v1/active-services?page=2', '/api/v1/active-services?page=3'),
+    (category_cache_key, '/api/v1/categories/1', '/api/v1/categories/2'),
+])
+def test_distinct_responses_get_distinct_keys(app, key_prefix, first, second):
+    assert cache_key(app, key_prefix, first) != cache_key(app, key_prefix, second)
+
+
+@pytest.mark.parametrize('key_prefix, first, second', [
+    (category_list_cache_key, '/api/v1/categories?page=2&only_names=false', '/api/v1/categories?only_names=false&page=2'),
+    (category_list_cache_key, '/api/v1/categories?page=1', '/api/v1/categories'),
+    (category_list_cache_key, '/api/v1/categories?page=abc', '/api/v1/categories'),
+    (category_list_cache_key, '/api/v1/categories?only_names=TRUE', '/api/v1/categories?only_names=1'),
+    (category_list_cache_key, '/api/v1/categories?page=1&utm_source=mail&_=123', '/api/v1/categories'),
+    (category_list_cache_key, '/api/v1/categories?fields=name,id', '/api/v1/categories?fields=id,%20name,id'),
+    (service_list_cache_key, '/api/v1/active-services?query=%20a%20', '/api/v1/active-services?query=a'),
+    (service_list_cache_key, '/api/v1/active-services?query=a&page=2&sort=price', '/api/v1/active-services?page=2&query=a'),
+])
+def test_equivalent_requests_share_a_key(app, key_prefix, first, second):
+    assert cache_key(app, key_prefix, first) == cache_key(app, key_prefix, second)
+
+
+def test_catalog_keys_do_not_depend_on_the_caller(app):
+    # the cached catalog is public and identical for every role, one entry serves everybody
+    provider, customer = create_provider('keyprovider'), create_customer('keycustomer')
+    url = '/api/v1/active-services?page=1'
+    anonymous = cache_key(app, service_list_cache_key, url)
+    assert cache_key(app, service_list_cache_key, url, auth_headers(provider)) == anonymous
+    assert cache_key(app, service_list_cache_key, url, auth_headers(customer)) == anonymous
+
+
+def test_tag_bump_moves_the_key(app):
+    before = cache_key(app, category_list_cache_key, '/api/v1/categories?page=1')
+    bump_tags(CATEGORIES_TAG)
+    assert cache_key(app, category_list_cache_key, '/api/v1/categories?page=1') != before
+
+
+def test_cached_responses_are_not_mixed_up(client):
+    names = client.get('/api/v1/categories?only_names=true').get_json()['data']
+    page = client.get('/api/v1/categories?page=1').get_json()['data']
+    assert 'categories' in names and 'no_of_categories' not in names
+    assert page['current_page'] == 1 and isinstance(page['categories'][0], dict)
+
+    # served from the cache now, still each its own payload
+    assert client.get('/api/v1/categories?only_names=true').get_json()['data'] == names
+    assert client.get('/api/v1/categories?page=1').get_json()['data'] == page
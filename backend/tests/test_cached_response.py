@@ -0,0 +1,77 @@
+import threading
+import time
+
+from application.caching import cached_response
+from application.extensions import cache
+
+
+def delayed(seconds, fn):
+    thread = threading.Timer(seconds, fn)
+    thread.start()
+    return thread
+
+
+def test_waiter_builds_itself_when_the_rebuild_is_not_cacheable(app):
+    calls = []
+
+    @cached_response(timeout=60, key_prefix=lambda: 'test:not-found')
+    def view():
+        calls.append(1)
+        return {'success': False}, 404
+
+    # another request holds the lock and ends with a 404, nothing is ever cached
+    cache.add('lock:test:not-found', 'other', timeout=30)
+    release = delayed(0.2, lambda: cache.delete('lock:test:not-found'))
+
+    start = time.time()
+    with app.test_request_context('/'):
+        assert view() == ({'success': False}, 404)
+    release.join()
+
+    assert time.time() - start < 2, 'waited for CACHE_LOCK_TIMEOUT instead of the lock'
+    assert calls == [1]
+
+
+def test_waiter_returns_the_entry_built_by_the_lock_holder(app):
+    calls = []
+
+    @cached_response(timeout=60, key_prefix=lambda: 'test:shared')
+    def view():
+        calls.append(1)
+        return {'success': True, 'data': 'built here'}
+
+    cache.add('lock:test:shared', 'other', timeout=30)
+
+    def build():
+        # what the lock holder leaves behind once its rebuild finished
+        value = ({'success': True, 'data': 'built by the holder'}, 200, {'ETag': '"holder"'})
+        cache.set('test:shared', {'value': value, 'expires_at': time.time() + 60, 'delta': 0.1}, timeout=60)
+        cache.delete('lock:test:shared')
+
+    builder = delayed(0.1, build)
+    with app.test_request_context('/'):
+        data, status_code, headers = view()
+    builder.join()
+
+    assert data['data'] == 'built by the holder' and status_code == 200 and 'ETag' in headers
+    assert calls == []
+
+
+def failing(*args, **kwargs):
+    raise ConnectionError('cache backend down')
+
+
+def test_backend_failures_serve_the_uncached_response(app, monkeypatch):
+    @cached_response(timeout=60, key_prefix=lambda: 'test:down')
+    def view():
+        return {'success': True, 'data': 'fresh'}
+
+    for method in ('add', 'set', 'delete'):
+        with monkeypatch.context() as patch:
+            # SimpleCache releases the lock with get + delete
+            patch.setattr(cache, method, failing)
+            cache.clear()
+            with app.test_request_context('/'):
+                rv = view()
+            data = rv[0] if isinstance(rv, tuple) else rv
+            assert data == {'success': True, 'data': 'fresh'}, method
@@ -0,0 +1,49 @@
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from werkzeug.http import http_date, parse_date
+
+from conftest import auth_headers
+from factories import create_provider
+
+
+@pytest.fixture
+def kolkata_time():
+    # updated_at is written with the local datetime.now(), run as a host 5:30 ahead of UTC would
+    previous = os.environ.get('TZ')
+    os.environ['TZ'] = 'Asia/Kolkata'
+    time.tzset()
+    yield
+    if previous is None:
+        os.environ.pop('TZ')
+    else:
+        os.environ['TZ'] = previous
+    time.tzset()
+
+
+def profile_url(user):
+    return f'/api/v1/providers/{user.provider.id}/profile'
+
+
+def test_last_modified_is_utc(client, kolkata_time):
+    user = create_provider('tzprovider')
+    resp = client.get(profile_url(user), headers=auth_headers(user))
+
+    assert resp.status_code == 200
+    last_modified = parse_date(resp.headers['Last-Modified'])
+    assert abs(datetime.now(timezone.utc) - last_modified) < timedelta(minutes=1)
+
+
+def test_if_modified_since_compares_in_utc(client, kolkata_time):
+    user = create_provider('tzprovider')
+    headers = auth_headers(user)
+    last_modified = client.get(profile_url(user), headers=headers).headers['Last-Modified']
+
+    resp = client.get(profile_url(user), headers={**headers, 'If-Modified-Since': last_modified})
+    assert resp.status_code == 304
+
+    an_hour_before = http_date(parse_date(last_modified) - timedelta(hours=1))
+    resp = client.get(profile_url(user), headers={**headers, 'If-Modified-Since': an_hour_before})
+    assert resp.status_code == 200
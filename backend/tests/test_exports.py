@@ -0,0 +1,113 @@
+import fcntl
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from application import exports, tasks
+from application.extensions import db
+from application.exports import ExportArtifact, cleanup_export_artifacts
+from factories import create_bookings, create_customer, create_provider
+
+
+@pytest.fixture(autouse=True)
+def exports_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(exports, 'EXPORTS_FOLDER', str(tmp_path))
+    monkeypatch.setattr(exports, 'EXPORTS_META_FOLDER', str(tmp_path / '.exports'))
+    return tmp_path
+
+
+def old_artifact(file_name, days=30):
+    artifact = ExportArtifact(file_name)
+    with artifact.locked():
+        with open(artifact.path, 'w') as file:
+            file.write('id\n')
+        artifact.write_meta({'used_at': (datetime.now() - timedelta(days=days)).isoformat()})
+    return artifact
+
+
+def test_cleanup_removes_the_artifact_and_its_sidecar():
+    artifact = old_artifact('ProvID_1_closed_bookings.csv')
+
+    assert cleanup_export_artifacts(7) == [artifact.file_name]
+    for path in (artifact.path, artifact.meta_path):
+        assert not os.path.exists(path), path
+
+
+def test_cleanup_keeps_the_lock_file_a_waiter_may_hold():
+    artifact = old_artifact('ProvID_1_closed_bookings.csv')
+    with open(artifact.lock_path) as waiter:
+        cleanup_export_artifacts(7)
+        # a new caller has to lock the very file the waiter opened
+        assert os.path.exists(artifact.lock_path)
+        assert os.stat(artifact.lock_path).st_ino == os.fstat(waiter.fileno()).st_ino
+
+
+def test_cleanup_keeps_artifacts_in_use():
+    artifact = old_artifact('ProvID_1_closed_bookings.csv', days=1)
+
+    assert cleanup_export_artifacts(7) == []
+    for path in (artifact.path, artifact.meta_path, artifact.lock_path):
+        assert os.path.exists(path), path
+
+
+def test_attachment_is_read_under_the_artifact_lock(monkeypatch):
+    provider, customer = create_provider('exportprovider', no_of_services=1), create_customer('exportcustomer')
+    create_bookings(provider.provider.services.all(), [customer.customer], 3)
+    artifact = ExportArtifact(f'ProvID_{provider.provider.id}_closed_bookings.csv')
+
+    def send_email(attachment_file, **kwargs):
+        with open(artifact.lock_path) as lock_file:
+            with pytest.raises(BlockingIOError):
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        with open(attachment_file) as file:
+            assert len(file.readlines()) == 4
+
+    monkeypatch.setattr(tasks, 'send_email', send_email)
+    assert tasks.provider_closed_bookings_csv_export(provider.provider.id) == artifact.file_name
+    with open(artifact.meta_path) as file:
+        assert json.load(file)['rows'] == 3
+
+
+def test_booking_committed_after_a_later_one_was_exported_is_not_lost(monkeypatch):
+    monkeypatch.setattr(tasks, 'send_email', lambda **kwargs: None)
+    provider, customer = create_provider('exportprovider', no_of_services=1), create_customer('exportcustomer')
+    services = provider.provider.services.all()
+    create_bookings(services, [customer.customer], 3)
+    prov_id = provider.provider.id
+    artifact = ExportArtifact(f'ProvID_{prov_id}_closed_bookings.csv')
+    tasks.provider_closed_bookings_csv_export(prov_id)
+
+    # stamped closed a minute before the newest exported booking, but only committed now
+    late, = create_bookings(services, [customer.customer], 1)
+    late.closed_date = datetime.now() - timedelta(minutes=1)
+    db.session.commit()
+    tasks.provider_closed_bookings_csv_export(prov_id)
+
+    with open(artifact.path) as file:
+        exported = [line.split(',')[0] for line in file.readlines()[1:]]
+    assert sorted(exported) == sorted(str(booking.id) for booking in services[0].bookings)
+    assert len(exported) == 4
+
+    # ids already written inside the window are skipped, nothing is appended twice
+    tasks.provider_closed_bookings_csv_export(prov_id)
+    with open(artifact.meta_path) as file:
+        assert json.load(file)['rows'] == 4
+
+
+def test_cleanup_removes_stale_parquet_rewrites(exports_folder):
+    stale, running = exports_folder / 'admin_closed_bookings.parquet.tmp', exports_folder / 'other.parquet.tmp'
+    stale.write_bytes(b'PAR1')
+    running.write_bytes(b'PAR1')
+    month_ago = (datetime.now() - timedelta(days=30)).timestamp()
+    os.utime(stale, (month_ago, month_ago))
+
+    assert cleanup_export_artifacts(7) == [stale.name]
+    assert running.exists()
+
+
+def test_parquet_refresh_without_pyarrow_says_so(monkeypatch):
+    monkeypatch.setattr(exports, 'pq', None)
+    with pytest.raises(RuntimeError, match='pyarrow'):
+        ExportArtifact('admin_closed_bookings.parquet').refresh(['id'], None, None, types=['int64'])
@@ -0,0 +1,101 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from application.extensions import db
+from application.core.models import User
+from application.enums import UserRoleEnum
+from application.identity import IDENTITY_KEY, load_identity
+from conftest import auth_headers
+from factories import create_customer, create_provider
+
+
+@pytest.fixture(autouse=True)
+def identity_cache(redis_cache):
+    return redis_cache
+
+
+@contextmanager
+def count_statements():
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+
+def admin_headers():
+    return auth_headers(User.query.filter_by(email='admin@househelpnow.com').first())
+
+
+def test_identity_is_loaded_from_the_cache(app):
+    provider = create_provider('identityprovider')
+    with app.app_context():
+        identity = load_identity(provider.id)
+        assert (identity.id, identity.role, identity.provider_id, identity.customer_id, identity.is_blocked) == \
+            (provider.id, UserRoleEnum.PROVIDER.value, provider.provider.id, None, False)
+
+        with count_statements() as statements:
+            cached = load_identity(provider.id)
+        assert statements == []
+        assert cached.to_dict() == identity.to_dict()
+
+
+def test_unknown_user_is_not_cached(app, identity_cache):
+    with app.app_context():
+        assert load_identity(12345) is None
+    assert not identity_cache.has(IDENTITY_KEY.format(user_id=12345))
+
+
+def test_blocking_a_provider_drops_its_cached_identity(client):
+    provider = create_provider('identityprovider')
+    url = f'/api/v1/providers/{provider.provider.id}/payments'
+    assert client.get(url, headers=auth_headers(provider)).status_code == 200
+
+    assert client.delete(f'/api/v1/admin/providers/{provider.provider.id}', headers=admin_headers()).status_code == 204
+    assert client.get(url, headers=auth_headers(provider)).status_code == 401
+
+    assert client.patch(f'/api/v1/admin/providers/{provider.provider.id}', headers=admin_headers()).status_code == 204
+    assert client.get(url, headers=auth_headers(provider)).status_code == 200
+
+
+def test_blocking_a_customer_drops_its_cached_identity(client):
+    customer = create_customer('identitycustomer')
+    url = f'/api/v1/customers/{customer.customer.id}/bookings'
+    assert client.get(url, headers=auth_headers(customer)).status_code == 200
+
+    assert client.delete(f'/api/v1/admin/customers/{customer.customer.id}', headers=admin_headers()).status_code == 204
+    assert client.get(url, headers=auth_headers(customer)).status_code == 401
+
+    assert client.patch(f'/api/v1/admin/customers/{customer.customer.id}', headers=admin_headers()).status_code == 204
+    assert client.get(url, headers=auth_headers(customer)).status_code == 200
+
+
+def test_cached_role_is_checked(client):
+    provider, customer = create_provider('identityprovider'), create_customer('identitycustomer')
+    url = f'/api/v1/providers/{provider.provider.id}/payments'
+    resp = client.get(url, headers=auth_headers(customer))
+    assert resp.status_code == 403
+
+
+def test_cached_snapshot_decides_without_the_database(client, identity_cache):
+    provider = create_provider('identityprovider')
+    url = f'/api/v1/providers/{provider.provider.id}/payments'
+    headers = auth_headers(provider)
+    client.get(url, headers=headers)
+
+    # blocked behind the app's back: the snapshot still says active
+    key = IDENTITY_KEY.format(user_id=provider.id)
+    snapshot = identity_cache.get(key)
+    provider.provider.is_blocked = True
+    db.session.commit()
+    assert client.get(url, headers=headers).status_code == 200
+
+    identity_cache.set(key, {**snapshot, 'is_blocked': True}, timeout=60)
+    with count_statements() as statements:
+        resp = client.get(url, headers=headers)
+    assert resp.status_code == 401
+    assert statements == []
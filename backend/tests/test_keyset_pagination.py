@@ -0,0 +1,82 @@
+import base64
+import json
+from datetime import datetime
+
+import pytest
+
+from application.extensions import db
+from application.customers.models import Payment
+from application.utils import decode_cursor, encode_cursor
+from conftest import auth_headers
+from factories import create_bookings, create_customer, create_provider
+
+
+def raw_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+def test_cursor_round_trip():
+    values = [datetime(2024, 5, 1, 10, 30, 15, 250), 42]
+    assert decode_cursor(encode_cursor(values), [Payment.created_at, Payment.id]) == values
+
+
+@pytest.mark.parametrize('cursor', [
+    '!!not base64!!',
+    raw_cursor({'id': 5}),
+    raw_cursor([5]),
+    raw_cursor(['2024-05-01T10:30:00', 5, 6]),
+    raw_cursor([123, 5]),
+    raw_cursor(['yesterday', 5]),
+    raw_cursor(['2024-05-01T10:30:00', [5]]),
+])
+def test_tampered_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        decode_cursor(cursor, [Payment.created_at, Payment.id])
+
+
+@pytest.fixture
+def provider_payments(app):
+    provider, customer = create_provider('pageprovider', no_of_services=1), create_customer('pagecustomer')
+    create_bookings(provider.provider.services.all(), [customer.customer], 7)
+    # every payment with the same timestamp, only the id breaks the tie
+    Payment.query.update({Payment.created_at: datetime(2024, 5, 1, 10, 30)})
+    db.session.commit()
+    return provider
+
+
+def test_keyset_pages_walk_ties_on_equal_timestamps(app, client, monkeypatch, provider_payments):
+    monkeypatch.setitem(app.config, 'ITEMS_PER_PAGE', 3)
+    url = f'/api/v1/providers/{provider_payments.provider.id}/payments'
+    headers = auth_headers(provider_payments)
+
+    seen, cursor = [], ''
+    while cursor is not None:
+        resp = client.get(url, query_string={'cursor': cursor}, headers=headers)
+        assert resp.status_code == 200
+        data = resp.get_json()['data']
+        assert len(data['payments']) <= 3 and data['per_page'] == 3
+        seen.extend(payment['id'] for payment in data['payments'])
+        cursor = data['next_cursor']
+
+    assert seen == sorted((payment_id for payment_id, in db.session.query(Payment.id)), reverse=True)
+
+
+def test_keyset_page_reports_the_total_on_request(client, provider_payments):
+    url = f'/api/v1/providers/{provider_payments.provider.id}/payments'
+    data = client.get(url, query_string={'cursor': '', 'with_total': 'true'}, headers=auth_headers(provider_payments)).get_json()['data']
+    assert data['no_of_payments'] == 7
+
+
+@pytest.mark.parametrize('cursor', [raw_cursor([123, 5]), raw_cursor(['2024-05-01', {'id': 5}]), 'garbage'])
+def test_tampered_cursor_is_a_bad_request(client, provider_payments, cursor):
+    url = f'/api/v1/providers/{provider_payments.provider.id}/payments'
+    resp = client.get(url, query_string={'cursor': cursor}, headers=auth_headers(provider_payments))
+    assert resp.status_code == 400
+    assert resp.get_json()['err_message'] == 'Invalid cursor'
+
+
+def test_booking_cursor_rejects_a_non_scalar_id(client):
+    customer = create_customer('pagecustomer')
+    url = f'/api/v1/customers/{customer.customer.id}/bookings'
+    resp = client.get(url, query_string={'cursor': raw_cursor([[1]])}, headers=auth_headers(customer))
+    assert resp.status_code == 400
@@ -0,0 +1,21 @@
+import os
+from email import encoders
+from email.mime.base import MIMEBase
+
+from application.mail import ATTACHMENT_CHUNK_SIZE, build_message
+
+
+def test_attachment_is_encoded_in_chunks_like_the_whole_file(tmp_path):
+    path = tmp_path / 'export.csv'
+    content = os.urandom(2 * ATTACHMENT_CHUNK_SIZE + 123)
+    path.write_bytes(content)
+
+    part = build_message('to@example.com', 'export', 'hi', attachment_file=str(path)).get_payload()[1]
+
+    assert part['Content-Transfer-Encoding'] == 'base64'
+    assert part.get_payload(decode=True) == content
+
+    whole = MIMEBase('application', 'octet-stream')
+    whole.set_payload(content)
+    encoders.encode_base64(whole)
+    assert part.get_payload() == whole.get_payload()
@@ -0,0 +1,131 @@
+import os
+import re
+
+import pytest
+from sqlalchemy import event
+
+from application.extensions import db
+from application.caching import bump_tags, CATEGORIES_TAG, SERVICES_TAG
+from application.core.models import User
+from application.customers.models import Booking, Payment
+from application.enums import BookingStatusEnum, PaymentStatusEnum
+from application.providers.models import Service
+from conftest import auth_headers
+from factories import create_customer, create_provider
+
+
+# Every list endpoint has to run a fixed number of statements, however many rows are on the page.
+# Each endpoint is called with N and 3N rows seeded and a page as large as that, the SELECT count
+# (from the Server-Timing header of the SQL instrumentation) must be the same constant both times.
+
+N = 4
+
+# endpoint: (url, role, expected statements), AdminCustomerListAPI does not return its page yet
+LIST_ENDPOINTS = {
+    'ActiveServiceListAPI': ('/api/v1/active-services', None, 2),
+    'CategoryExploreListAPI': ('/api/v1/categories', None, 2),
+    'AdminServiceListAPI': ('/api/v1/admin/services', 'admin', 2),
+    'AdminProviderListAPI': ('/api/v1/admin/providers?status=approved', 'admin', 4),
+    'AdminPaymentsListAPI': ('/api/v1/admin/payments', 'admin', 2),
+    'AdminPaymentsListAPI (cursor)': ('/api/v1/admin/payments?cursor=', 'admin', 1),
+    'AdminCategoryListAPI': ('/api/v1/admin/categories', 'admin', 2),
+    'ProviderServiceListAPI': ('/api/v1/providers/{prov_id}/services', 'provider', 2),
+    'ProviderBookingListAPI': ('/api/v1/providers/{prov_id}/bookings', 'provider', 3),
+    'ProviderPaymentsListAPI': ('/api/v1/providers/{prov_id}/payments', 'provider', 2),
+    'CustomerBookingsListAPI': ('/api/v1/customers/{cust_id}/bookings', 'customer', 3),
+}
+
+
+def add_rows(count, provider, customer, offset=0):
+    """`count` more rows for every list: providers with a service, customers, bookings, payments."""
+    own_service = Service.query.filter_by(prov_id=provider.provider.id).first()
+    for i in range(offset, offset + count):
+        db.session.add(Service(name=f'own service {i}', price=500, time_required_hr=1, prov_id=provider.provider.id, is_approved=True, is_active=True))
+        other_provider = create_provider(f'provider{i}', no_of_services=1)
+        other_customer = create_customer(f'customer{i}')
+        other_service = Service.query.filter_by(prov_id=other_provider.provider.id).first()
+
+        # one booking of another customer on the provider's service, one of the customer elsewhere
+        for cust_id, service in ((other_customer.customer.id, own_service), (customer.customer.id, other_service)):
+            booking = Booking(cust_id=cust_id, service_id=service.id, status=BookingStatusEnum.ACTIVE.value)
+            db.session.add(booking)
+            db.session.flush()
+            db.session.add(Payment(cust_id=cust_id, booking_id=booking.id, amount=500, status=PaymentStatusEnum.PAID.value))
+    db.session.commit()
+
+
+def statement_count(client, url, headers):
+    """Statements run for the page and the number of rows on it."""
+    # cached catalog pages have to be rebuilt for the count to mean anything
+    bump_tags(CATEGORIES_TAG, SERVICES_TAG)
+    resp = client.get(url, headers=headers)
+    assert resp.status_code == 200, resp.get_json()
+    rows = max(len(value) for value in resp.get_json()['data'].values() if isinstance(value, list))
+    return int(re.search(r'desc="(\d+) queries"', resp.headers['Server-Timing']).group(1)), rows
+
+
+@pytest.fixture
+def accounts():
+    provider = create_provider('listprovider', no_of_services=1)
+    customer = create_customer('listcustomer')
+    admin = User.query.filter_by(email='admin@househelpnow.com').first()
+    return {'provider': provider, 'customer': customer, 'admin': admin}
+
+
+@pytest.mark.parametrize('endpoint', list(LIST_ENDPOINTS))
+def test_list_endpoint_query_count_does_not_grow_with_the_page(app, client, accounts, monkeypatch, endpoint):
+    url, role, expected = LIST_ENDPOINTS[endpoint]
+    url = url.format(prov_id=accounts['provider'].provider.id, cust_id=accounts['customer'].customer.id)
+    headers = auth_headers(accounts[role]) if role else {}
+
+    add_rows(N, accounts['provider'], accounts['customer'])
+    # the identity of the token is cached by the first request
+    client.get(url, headers=headers)
+
+    counts = []
+    for rows, offset in ((N, 0), (2 * N, N)):
+        if offset:
+            add_rows(rows, accounts['provider'], accounts['customer'], offset=offset)
+        monkeypatch.setitem(app.config, 'ITEMS_PER_PAGE', offset + rows)
+        count, rows_on_page = statement_count(client, url, headers)
+        assert rows_on_page == offset + rows, f'{endpoint}: the page is not full'
+        counts.append(count)
+
+    assert counts == [expected, expected], f'{endpoint}: {counts[0]} statements with {N} rows, {counts[1]} with {3 * N}'
+
+
+# endpoint: (the table its page is selected from, the table it joins explicitly and also dumps)
+JOINED_ENDPOINTS = {
+    'ActiveServiceListAPI': ('services', 'providers'),
+    'ProviderBookingListAPI': ('bookings', 'providers'),
+    'ProviderPaymentsListAPI': ('payments', 'bookings'),
+    'CustomerBookingsListAPI': ('bookings', 'customers'),
+}
+
+
+@pytest.mark.parametrize('endpoint', list(JOINED_ENDPOINTS))
+def test_joined_relationships_are_not_joined_twice(app, client, accounts, endpoint):
+    url, role, _ = LIST_ENDPOINTS[endpoint]
+    url = url.format(prov_id=accounts['provider'].provider.id, cust_id=accounts['customer'].customer.id)
+    headers = auth_headers(accounts[role]) if role else {}
+    add_rows(N, accounts['provider'], accounts['customer'])
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        assert client.get(url, headers=headers).status_code == 200
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+    root, table = JOINED_ENDPOINTS[endpoint]
+    # the identity lookup of the token is a LIMIT query as well, the page is the one from `root`
+    page_statement = next(s for s in statements if f'FROM {root} ' in s and 'LIMIT' in s)
+    assert f'{table}_1' not in page_statement, f'{endpoint} joins {table} a second time'
+
+
+@pytest.mark.skipif('SQL_INSTRUMENTATION' in os.environ, reason='set explicitly in the environment')
+def test_instrumentation_is_off_unless_enabled():
+    from configs import Config, DevelopmentConfig, ProductionConfig
+    assert not Config.SQL_INSTRUMENTATION and not ProductionConfig.SQL_INSTRUMENTATION
+    assert DevelopmentConfig.SQL_INSTRUMENTATION
@@ -0,0 +1,163 @@
+import pytest
+
+from application.extensions import db
+from application.admin.models import CategoryStats
+from application.customers.models import Booking, Payment, Review
+from application.enums import BookingStatusEnum, PaymentStatusEnum
+from application.providers.models import ServiceStats
+from application.stats import rebuild_category_stats, rebuild_service_stats
+from factories import create_customer, create_provider
+
+
+# Every transition has to leave the rollups where a rebuild from scratch would put them.
+
+def service_stats(service):
+    stats = db.session.get(ServiceStats, service.id)
+    return (stats.total_bookings, stats.active_bookings, stats.total_reviews, stats.rating_sum) if stats else (0, 0, 0, 0)
+
+
+def category_stats(category_id):
+    stats = db.session.get(CategoryStats, category_id)
+    return (stats.active_providers, stats.active_services, stats.total_bookings, stats.total_revenue) if stats else (0, 0, 0, 0)
+
+
+def assert_in_sync():
+    assert rebuild_service_stats(dry_run=True) == {}
+    assert rebuild_category_stats(dry_run=True) == {}
+
+
+@pytest.fixture
+def service():
+    provider = create_provider('statsprovider', no_of_services=1)
+    return provider.provider.services.first()
+
+
+@pytest.fixture
+def customer():
+    return create_customer('statscustomer').customer
+
+
+def book(service, customer, status=BookingStatusEnum.PENDING.value):
+    booking = Booking(cust_id=customer.id, service_id=service.id, status=status)
+    db.session.add(booking)
+    db.session.commit()
+    return booking
+
+
+def set_status(obj, status):
+    obj.status = status
+    db.session.commit()
+
+
+def test_booking_create(service, customer):
+    book(service, customer)
+    assert service_stats(service) == (0, 0, 0, 0)
+
+    book(service, customer, BookingStatusEnum.ACTIVE.value)
+    assert service_stats(service) == (1, 1, 0, 0)
+    assert category_stats(service.provider.category_id)[2] == 1
+    assert_in_sync()
+
+
+@pytest.mark.parametrize('status, served, active', [
+    (BookingStatusEnum.CONFIRM.value, 0, 0),
+    (BookingStatusEnum.ACTIVE.value, 1, 1),
+    (BookingStatusEnum.COMPLETE.value, 1, 1),
+    (BookingStatusEnum.CLOSE.value, 1, 0),
+    (BookingStatusEnum.CANCEL.value, 1, 0),
+    (BookingStatusEnum.REJECT.value, 0, 0),
+])
+def test_booking_status_change(service, customer, status, served, active):
+    booking = book(service, customer)
+    set_status(booking, BookingStatusEnum.ACTIVE.value)
+    set_status(booking, status)
+
+    assert service_stats(service)[:2] == (served, active)
+    assert category_stats(service.provider.category_id)[2] == active
+    assert_in_sync()
+
+
+def test_booking_delete(service, customer):
+    kept = book(service, customer, BookingStatusEnum.ACTIVE.value)
+    deleted = book(service, customer, BookingStatusEnum.COMPLETE.value)
+    db.session.add(Review(cust_id=customer.id, booking_id=deleted.id, rating=4))
+    db.session.add(Payment(cust_id=customer.id, booking_id=deleted.id, amount=500, commission_fee=50, status=PaymentStatusEnum.PAID.value))
+    db.session.commit()
+    assert service_stats(service) == (2, 2, 1, 4)
+
+    db.session.expire_all()
+    for obj in (deleted.review, deleted.payment, deleted):
+        db.session.delete(obj)
+    db.session.commit()
+
+    assert service_stats(service) == (1, 1, 0, 0)
+    assert category_stats(service.provider.category_id)[2:] == (1, 0)
+    assert kept.status == BookingStatusEnum.ACTIVE.value
+    assert_in_sync()
+
+
+def test_review_create_and_delete(service, customer):
+    booking = book(service, customer, BookingStatusEnum.CLOSE.value)
+    review = Review(cust_id=customer.id, booking_id=booking.id, rating=3)
+    db.session.add(review)
+    db.session.commit()
+    assert service_stats(service)[2:] == (1, 3)
+
+    review.rating = 5
+    db.session.commit()
+    assert service_stats(service)[2:] == (1, 5)
+
+    db.session.delete(review)
+    db.session.commit()
+    assert service_stats(service)[2:] == (0, 0)
+    assert_in_sync()
+
+
+def test_payment_status_change(service, customer):
+    booking = book(service, customer, BookingStatusEnum.ACTIVE.value)
+    payment = Payment(cust_id=customer.id, booking_id=booking.id, amount=500, commission_fee=50, platform_fee=10, transaction_fee=5)
+    db.session.add(payment)
+    db.session.commit()
+    assert category_stats(service.provider.category_id)[3] == 0
+
+    set_status(payment, PaymentStatusEnum.PAID.value)
+    assert category_stats(service.provider.category_id)[3] == 65
+
+    set_status(payment, PaymentStatusEnum.CANCEL.value)
+    assert category_stats(service.provider.category_id)[3] == 0
+    assert_in_sync()
+
+
+def test_provider_moderation(service):
+    provider = service.provider
+    assert category_stats(provider.category_id)[:2] == (1, 1)
+
+    provider.is_blocked = True
+    db.session.commit()
+    assert category_stats(provider.category_id)[:2] == (0, 0)
+
+    provider.is_blocked = False
+    provider.is_approved = False
+    db.session.commit()
+    assert category_stats(provider.category_id)[:2] == (0, 0)
+    assert_in_sync()
+
+
+def test_provider_category_change(service):
+    provider = service.provider
+    old_category_id = provider.category_id
+    new_category_id = old_category_id + 1
+
+    provider.category_id = new_category_id
+    db.session.commit()
+    assert category_stats(old_category_id)[:2] == (0, 0)
+    assert category_stats(new_category_id)[:2] == (1, 1)
+    assert_in_sync()
+
+
+@pytest.mark.parametrize('attr, value', [('is_blocked', True), ('is_active', False), ('is_approved', False)])
+def test_service_moderation(service, attr, value):
+    setattr(service, attr, value)
+    db.session.commit()
+    assert category_stats(service.provider.category_id)[:2] == (1, 0)
+    assert_in_sync()
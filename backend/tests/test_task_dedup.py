@@ -0,0 +1,62 @@
+import os
+
+import pytest
+from kombu.exceptions import OperationalError
+
+from application import task_dedup
+from application.task_dedup import dedup_key, enqueue_once, release_dedup_key
+
+
+@pytest.fixture
+def dedup_redis(fake_redis, monkeypatch):
+    monkeypatch.setattr(task_dedup, '_client', fake_redis)
+    monkeypatch.setattr(task_dedup, '_client_pid', os.getpid())
+    return fake_redis
+
+
+class Task:
+    name = 'export'
+    app = None
+
+    def __init__(self, broker_down=False, before_failing=None):
+        self.broker_down, self.before_failing, self.enqueued = broker_down, before_failing, []
+
+    def apply_async(self, args, kwargs, task_id=None, headers=None):
+        if self.broker_down:
+            if self.before_failing:
+                self.before_failing()
+            raise OperationalError('broker unreachable')
+        self.enqueued.append(task_id)
+        return task_id
+
+
+def test_failed_enqueue_frees_the_call(app, dedup_redis):
+    with app.app_context():
+        with pytest.raises(OperationalError):
+            enqueue_once(Task(broker_down=True), 1)
+        assert dedup_redis.get(dedup_key('export', (1,))) is None
+
+        # the retry enqueues a fresh run instead of getting the dead PENDING id
+        task = Task()
+        task_id = enqueue_once(task, 1)
+        assert task.enqueued == [task_id]
+        assert dedup_redis.get(dedup_key('export', (1,))) == task_id
+
+
+def test_failed_enqueue_keeps_a_key_another_call_took(app, dedup_redis):
+    key = dedup_key('export', (1,))
+    with app.app_context():
+        task = Task(broker_down=True, before_failing=lambda: dedup_redis.set(key, 'other'))
+        with pytest.raises(OperationalError):
+            enqueue_once(task, 1)
+    assert dedup_redis.get(key) == 'other'
+
+
+def test_release_only_frees_its_own_run(app, dedup_redis):
+    key = dedup_key('export', (1,))
+    dedup_redis.set(key, 'other')
+    with app.app_context():
+        release_dedup_key(key, 'mine', succeeded=False)
+        assert dedup_redis.get(key) == 'other'
+        release_dedup_key(key, 'other', succeeded=False)
+    assert dedup_redis.get(key) is None
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from application import task_progress
+from application.providers import resources
+from conftest import auth_headers
+from factories import create_provider
+
+
+class Enqueued:
+    id = 'export-task'
+    status = 'PENDING'
+
+
+@pytest.fixture(autouse=True)
+def progress_redis(fake_redis, monkeypatch):
+    monkeypatch.setattr(task_progress, '_client', fake_redis)
+    monkeypatch.setattr(task_progress, '_client_pid', os.getpid())
+    monkeypatch.setattr(resources, 'enqueue_once', lambda task, *args, **kwargs: Enqueued())
+    monkeypatch.setattr(resources, 'progress_response', lambda task_id: ({'streaming': task_id}, 200))
+    return fake_redis
+
+
+def events_url(user, task_id='export-task'):
+    return f'/api/v1/providers/{user.provider.id}/bookings/csv-export/{task_id}/events'
+
+
+def test_provider_streams_its_own_export(client):
+    owner = create_provider('owner')
+    resp = client.post(f'/api/v1/providers/{owner.provider.id}/bookings/csv-export', headers=auth_headers(owner))
+    assert resp.status_code == 202
+
+    resp = client.get(events_url(owner), headers=auth_headers(owner))
+    assert resp.get_json() == {'streaming': 'export-task'}
+
+
+@pytest.mark.parametrize('path', ['/events', ''])
+def test_provider_cannot_follow_another_providers_export(client, path):
+    owner, other = create_provider('owner'), create_provider('other')
+    client.post(f'/api/v1/providers/{owner.provider.id}/bookings/csv-export', headers=auth_headers(owner))
+
+    url = f'/api/v1/providers/{other.provider.id}/bookings/csv-export/export-task{path}'
+    resp = client.get(url, headers=auth_headers(other))
+    assert resp.status_code == 404
+
+
+def test_unrecorded_task_is_not_streamed(client):
+    # e.g. the admin export, enqueued without a provider owner
+    provider = create_provider('owner')
+    resp = client.get(events_url(provider, 'admin-export'), headers=auth_headers(provider))
+    assert resp.status_code == 404
@@ -427,52 +427,63 @@ export async function exportClosedBookingData(provId) {
     }
 
     const taskId = respData.data.id
-    let pollingCount = 0
 
-    const intervalId = setInterval(async () => {
+    // progress arrives as server-sent events on one response, instead of polling the task status
+    const watchExport = async () => {
       try {
-
-        console.log('polling count', pollingCount);
-        if (pollingCount > 20) {
-          throw new Error('Export failed, server not responding!!')
-        }
-        pollingCount = pollingCount + 1
-
-        const taskResp = await fetch(`/api/v1/providers/${provId}/bookings/csv-export/${taskId}`, {
+        const eventsResp = await fetch(`/api/v1/providers/${provId}/bookings/csv-export/${taskId}/events`, {
           method: 'GET',
           headers: {
             Authorization: `Bearer ${authStore.authToken}`,
-            'Content-Type': 'application/json',
+            Accept: 'text/event-stream',
           },
         })
-        
-        const taskData = await taskResp.json()
 
-        if (!taskResp.ok) {
+        if (!eventsResp.ok || !eventsResp.body) {
           throw new Error('Export failed')
         }
 
-        const status = taskData.data?.status
-
-        if (!status) {
-          throw new Error('Export failed, missing parameter status')
-        }
-
-        if (status === 'SUCCESS') {
-          console.log('export success')
-          toast.success('Export success, check your mail')
-          clearInterval(intervalId)
-
-        } else if (status === 'FAILURE') {
-          clearInterval(intervalId)
-          throw new Error('Export failed!!')
+        const reader = eventsResp.body.pipeThrough(new TextDecoderStream()).getReader()
+        let buffer = ''
+
+        while (true) {
+          const { value, done } = await reader.read()
+          if (done) {
+            throw new Error('Export failed, server not responding!!')
+          }
+          buffer += value
+
+          let boundary
+          while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary)
+            buffer = buffer.slice(boundary + 2)
+
+            const dataLine = rawEvent.split('\n').find((line) => line.startsWith('data: '))
+            if (!dataLine) {
+              continue
+            }
+            const taskData = JSON.parse(dataLine.slice(6))
+            const status = taskData.status
+
+            if (status === 'PROGRESS' && taskData.progress) {
+              const { processed, total, eta_s } = taskData.progress
+              console.log('export progress', processed, total, eta_s)
+            } else if (status === 'SUCCESS') {
+              console.log('export success')
+              toast.success('Export success, check your mail')
+              reader.cancel()
+              return
+            } else if (status === 'FAILURE' || status === 'REVOKED' || status === 'TIMEOUT') {
+              reader.cancel()
+              throw new Error('Export failed!!')
+            }
+          }
         }
-
       } catch (error) {
-        clearInterval(intervalId)
         toast.error(error.message || 'Export failed!!')
-      } 
-    }, 2000)
+      }
+    }
+    watchExport()
 
     return { taskId }
   } catch (error) {